@@ -0,0 +1,74 @@
+"""基准测试公共工具
+
+基准测试脚本以独立进程运行，需要在插件目录的上级目录可导入的环境中执行（即 AstrBot 的
+plugins 目录，或安装了 requirements.txt 依赖的开发环境）。
+"""
+
+import importlib
+import sys
+import timeit
+from pathlib import Path
+from typing import Any, Callable
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def import_plugin_module(name: str) -> Any:
+    """以包的形式导入插件模块，保证模块内的相对导入可用
+
+    Args:
+        name: 相对于插件根目录的模块名，例如 "core.rate_limiter"
+
+    Returns:
+        导入的模块
+    """
+    parent = str(ROOT.parent)
+    if parent not in sys.path:
+        sys.path.insert(0, parent)
+    return importlib.import_module(f"{ROOT.name}.{name}")
+
+
+def measure(func: Callable[[], Any], repeat: int = 5, min_time: float = 0.2) -> float:
+    """测量单次调用耗时，取多轮中的最小值以减少调度抖动
+
+    Args:
+        func: 被测函数（无参数）
+        repeat: 测量轮数
+        min_time: 每轮的最短测量时间（秒）
+
+    Returns:
+        单次调用耗时（纳秒）
+    """
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    if elapsed < min_time:
+        number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return best / number * 1e9
+
+
+def percentile(values: list[float], q: float) -> float:
+    """计算分位数（最近秩法）
+
+    Args:
+        values: 样本
+        q: 分位数（0-1）
+
+    Returns:
+        分位数，没有样本时返回 0
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def peak_rss_mb() -> float:
+    """返回进程的峰值常驻内存（MB），不支持的平台返回 0"""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
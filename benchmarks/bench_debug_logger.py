@@ -0,0 +1,73 @@
+"""Debug 日志开销基准
+
+对比旧的 f-string 写法与延迟格式化的 DebugLogger 在关闭和开启时的单次调用耗时。
+
+用法: python -m <插件目录名>.benchmarks.bench_debug_logger（在插件目录的上级目录执行）
+"""
+
+import logging
+
+from ._common import import_plugin_module, measure
+
+PROMPT = "一只在雪地里奔跑的橘猫，电影感光影，超高细节，8k，广角镜头" * 4
+USER_ID = "123456789"
+
+
+class _LegacyLogger:
+    """旧写法：调用方先构造 f-string，再由方法判断 debug_mode"""
+
+    def __init__(self, debug_mode: bool) -> None:
+        self.debug_mode = debug_mode
+
+    def debug_log(self, message: str) -> None:
+        if self.debug_mode:
+            logging.getLogger("bench").debug(f"[Bench] {message}")
+
+
+def _noop(*args: object) -> None:
+    """参照组：只有参数求值和一次函数调用的开销"""
+
+
+def main() -> None:
+    debug_logger = import_plugin_module("core.debug_logger")
+    # 开启时的消息写入空处理器，只测量格式化和分发开销
+    astrbot_logger = logging.getLogger("astrbot")
+    astrbot_logger.handlers = [logging.NullHandler()]
+    astrbot_logger.propagate = False
+    astrbot_logger.setLevel(logging.DEBUG)
+
+    legacy_off = _LegacyLogger(False)
+    lazy_off = debug_logger.DebugLogger("Bench", False)
+    lazy_on = debug_logger.DebugLogger("Bench", True)
+    size = (1024, 1024)
+
+    cases = {
+        "f-string（关闭）": lambda: legacy_off.debug_log(
+            f"收到生图请求: user_id={USER_ID}, prompt={PROMPT[:50]}..., size={size}, "
+            f"length={len(PROMPT)}"
+        ),
+        "DebugLogger（关闭）": lambda: lazy_off(
+            "收到生图请求: user_id=%s, prompt=%.50s..., size=%s, length=%s",
+            USER_ID, PROMPT, size, len(PROMPT),
+        ),
+        "DebugLogger.sampled（关闭）": lambda: lazy_off.sampled(
+            "防抖通过: request_id=%s", USER_ID
+        ),
+        "相同参数的空函数（参照）": lambda: _noop(
+            "收到生图请求: user_id=%s, prompt=%.50s..., size=%s, length=%s",
+            USER_ID, PROMPT, size, len(PROMPT),
+        ),
+        "DebugLogger（开启）": lambda: lazy_on(
+            "收到生图请求: user_id=%s, prompt=%.50s..., size=%s, length=%s",
+            USER_ID, PROMPT, size, len(PROMPT),
+        ),
+        "DebugLogger.sampled（开启）": lambda: lazy_on.sampled(
+            "防抖通过: request_id=%s", USER_ID
+        ),
+    }
+    for name, func in cases.items():
+        print(f"{name:<28} {measure(func):8.1f} ns/次")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""插件加载耗时基准
+
+在新的解释器进程中以 ``python -X importtime`` 导入插件，报告插件加载的总耗时、
+耗时最多的模块，以及加载时是否提前导入了 openai、httpx、aiohttp、aiofiles 等重量级依赖。
+AstrBot 启动时已经导入的模块（asyncio、logging、astrbot.api 等）会先行导入，不计入插件耗时。
+
+用法: python -m <插件目录名>.benchmarks.bench_import_time [--repeat 5] [--top 15]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+from ._common import ROOT
+
+# AstrBot 加载插件前已经导入的模块
+PRELOAD = ("asyncio", "json", "logging", "astrbot.api", "astrbot.api.event", "astrbot.api.star")
+# 应当延迟到首次使用时才导入的依赖
+HEAVY_MODULES = ("openai", "httpx", "aiohttp", "aiofiles")
+
+
+def import_time_once(module: str) -> list[tuple[str, int, int]]:
+    """在子进程中导入模块并解析 -X importtime 的输出
+
+    Args:
+        module: 相对于插件根目录的模块名
+
+    Returns:
+        (模块名, 自身耗时微秒, 累计耗时微秒) 列表，按导入完成顺序排列
+    """
+    target = f"{ROOT.name}.{module}"
+    code = "; ".join(f"import {name}" for name in PRELOAD)
+    code += f"; import sys; sys.stderr.write('#MARK\\n'); import {target}"
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(ROOT.parent)] + [p for p in env.get("PYTHONPATH", "").split(os.pathsep) if p]
+    )
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    entries = []
+    marked = False
+    for line in completed.stderr.splitlines():
+        if line == "#MARK":
+            marked = True
+            continue
+        if not marked or not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def measure_import(module: str = "main", repeat: int = 5) -> tuple[int, list[tuple[str, int, int]]]:
+    """多次导入，取累计耗时最小的一次
+
+    Args:
+        module: 相对于插件根目录的模块名
+        repeat: 导入次数
+
+    Returns:
+        (插件模块的累计耗时微秒, 该次导入的全部记录)
+    """
+    target = f"{ROOT.name}.{module}"
+    best: tuple[int, list[tuple[str, int, int]]] = (0, [])
+    for _ in range(max(1, repeat)):
+        entries = import_time_once(module)
+        total = next((cumulative for name, _, cumulative in entries if name == target), 0)
+        if not best[1] or total < best[0]:
+            best = (total, entries)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="插件加载耗时基准")
+    parser.add_argument("--module", default="main", help="导入的插件模块，默认 main")
+    parser.add_argument("--repeat", type=int, default=5, help="导入次数，取最小值")
+    parser.add_argument("--top", type=int, default=15, help="列出的模块数")
+    args = parser.parse_args()
+
+    total, entries = measure_import(args.module, args.repeat)
+    loaded = {name for name, _, _ in entries}
+    print(f"插件加载耗时: {total / 1000:.1f} ms（{len(entries)} 个模块，{args.repeat} 次取最小值）")
+    heavy = [name for name in HEAVY_MODULES if name in loaded]
+    print(f"提前导入的重量级依赖: {', '.join(heavy) if heavy else '无'}")
+
+    print(f"\n自身耗时最多的 {args.top} 个模块:")
+    for name, self_us, cumulative_us in sorted(entries, key=lambda e: e[1], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:8.2f} ms  累计 {cumulative_us / 1000:8.2f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
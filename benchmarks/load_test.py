@@ -0,0 +1,241 @@
+"""端到端压测工具
+
+启动本地 Gitee AI 模拟服务，使用模拟的 AstrMessageEvent 以指定并发驱动插件命令，
+报告吞吐量、延迟分位数和内存占用。全程离线运行，不消耗真实 API 配额。
+
+用法: python -m <插件目录名>.benchmarks.load_test --requests 500 --concurrency 50 --command generate
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Optional
+
+from astrbot.api.message_components import Image
+
+from ._common import import_plugin_module, peak_rss_mb, percentile
+from .mock_server import add_server_arguments, server_from_args
+
+PROMPTS = [
+    "一只在雪地里奔跑的橘猫，电影感光影",
+    "赛博朋克城市夜景，霓虹灯，雨夜",
+    "水墨山水画，远山，小舟",
+    "宇航员在月球表面弹吉他，超现实主义",
+]
+RATIOS = ["", "1:1", "16:9", "9:16", "4:3"]
+
+
+class LoadTestEvent:
+    """压测用的消息事件，只实现插件用到的接口"""
+
+    def __init__(self, user_id: str, group_id: str = "", images: Optional[list[Any]] = None) -> None:
+        """初始化事件
+
+        Args:
+            user_id: 发送者 ID
+            group_id: 群组 ID
+            images: 消息中的图片组件
+        """
+        self.user_id = user_id
+        self.group_id = group_id
+        self.message_obj = SimpleNamespace(message=images or [])
+        self.sent: list[Any] = []
+
+    def get_sender_id(self) -> str:
+        return self.user_id
+
+    def get_group_id(self) -> str:
+        return self.group_id
+
+    def plain_result(self, text: str) -> tuple[str, Any]:
+        return ("plain", text)
+
+    def chain_result(self, chain: list[Any]) -> tuple[str, Any]:
+        return ("chain", chain)
+
+    async def send(self, result: Any) -> None:
+        self.sent.append(result)
+
+
+def build_plugin(base_url: str, args: argparse.Namespace) -> Any:
+    """创建指向模拟服务的插件实例，关闭限流和负载削减以测量插件本身的开销
+
+    Args:
+        base_url: 模拟服务地址
+        args: 命令行参数
+
+    Returns:
+        插件实例
+    """
+    main = import_plugin_module("main")
+    config = {
+        "base_url": base_url,
+        "api_key": [f"mock-key-{i}" for i in range(args.keys)],
+        "user_rate_limit": "",
+        "group_rate_limit": "",
+        "global_rate_limit": "",
+        "max_estimated_wait": 0,
+        "job_concurrency": args.job_concurrency,
+        "per_key_concurrency": args.per_key_concurrency,
+        "max_concurrency": args.max_concurrency,
+        "max_jobs_per_user": 1000,
+        "metrics_export_interval": 0,
+        "trace_sample_rate": 0,
+    }
+    if args.job_queue_workers > 0:
+        config.update(job_queue_mode=True, job_queue_workers=args.job_queue_workers)
+    return main.AIImage(None, config)
+
+
+async def run_command(
+    plugin: Any,
+    command: str,
+    event: LoadTestEvent,
+    index: int,
+    style_name: str = "",
+    edit_image: str = "",
+) -> str:
+    """执行一次命令并返回结果分类
+
+    Args:
+        plugin: 插件实例
+        command: 命令名称
+        event: 消息事件
+        index: 请求序号
+        style_name: 风格命令使用的风格名称
+        edit_image: 编辑命令使用的本地图片路径
+
+    Returns:
+        ok 表示收到图片，failed 表示只收到文本回复（被拒绝或失败）
+    """
+    commands = import_plugin_module("commands")
+    prompt = f"{PROMPTS[index % len(PROMPTS)]} {RATIOS[index % len(RATIOS)]}".strip()
+    if command == "draw":
+        llm_tools = import_plugin_module("llm_tools")
+        text = await llm_tools.draw_image_tool(plugin, event, prompt)
+        return "ok" if text.startswith("图片已生成") else "failed"
+
+    if command == "generate":
+        results = commands.generate_image_command(plugin, event, prompt)
+    elif command == "style":
+        results = commands.style_command(plugin, event, style_name, prompt)
+    else:
+        event.message_obj.message = [Image(file=edit_image)]
+        results = commands.ai_edit_image_command(plugin, event, prompt)
+
+    outcome = "failed"
+    async for kind, _ in results:
+        if kind == "chain":
+            outcome = "ok"
+    return outcome
+
+
+async def run_load(args: argparse.Namespace) -> dict[str, Any]:
+    """运行压测
+
+    Args:
+        args: 命令行参数
+
+    Returns:
+        压测结果
+    """
+    server = server_from_args(args)
+    base_url = await server.start()
+    plugin = build_plugin(base_url, args)
+    await plugin.initialize()
+    edit_image = plugin.api_client.image_manager.get_save_path(".png")
+    Path(edit_image).write_bytes(server.image)
+    style_name = args.style
+    if args.command == "style" and not style_name:
+        style_name = next(iter(plugin.style_catalog.names), "")
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+    outcomes: dict[str, int] = {}
+    users = args.users or args.requests
+
+    async def one(index: int) -> None:
+        async with semaphore:
+            event = LoadTestEvent(f"user-{index % users}", f"group-{index % args.groups}")
+            start = time.perf_counter()
+            try:
+                outcome = await run_command(
+                    plugin, args.command, event, index, style_name, edit_image
+                )
+            except Exception:
+                outcome = "error"
+            elapsed = time.perf_counter() - start
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            if outcome == "ok":
+                latencies.append(elapsed)
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    wall = time.perf_counter() - wall_start
+
+    traced_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else 0
+    if args.tracemalloc:
+        tracemalloc.stop()
+    await plugin.close()
+    await server.stop()
+
+    return {
+        "command": args.command,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "latency_model": args.latency,
+        "mode": args.mode,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(outcomes.get("ok", 0) / wall, 2) if wall else 0.0,
+        "p50": round(percentile(latencies, 0.50), 4),
+        "p95": round(percentile(latencies, 0.95), 4),
+        "p99": round(percentile(latencies, 0.99), 4),
+        "outcomes": outcomes,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "traced_peak_mb": round(traced_peak / 1024 / 1024, 1),
+        "server": server.stats,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="插件端到端压测（离线）")
+    parser.add_argument("--command", choices=("generate", "draw", "style", "edit"), default="generate")
+    parser.add_argument("--style", default="", help="风格命令使用的风格名称，默认取第一个")
+    parser.add_argument("--requests", type=int, default=200, help="请求总数")
+    parser.add_argument("--concurrency", type=int, default=20, help="同时进行的请求数")
+    parser.add_argument("--users", type=int, default=0, help="模拟用户数，默认每个请求一个用户（避免防抖）")
+    parser.add_argument("--groups", type=int, default=10, help="模拟群组数")
+    parser.add_argument("--keys", type=int, default=4, help="API Key 数量")
+    parser.add_argument("--job-concurrency", type=int, default=16, help="任务调度器并发上限")
+    parser.add_argument("--per-key-concurrency", type=int, default=8, help="单个 Key 的并发上限")
+    parser.add_argument("--max-concurrency", type=int, default=32, help="上游总并发上限")
+    parser.add_argument(
+        "--job-queue-workers", type=int, default=0, help="开启任务队列模式并启动的工作进程数，0 表示不开启"
+    )
+    parser.add_argument("--tracemalloc", action="store_true", help="统计 Python 对象分配峰值（有额外开销）")
+    parser.add_argument("--json", default="", help="将结果写入 JSON 文件")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    result = asyncio.run(run_load(args))
+    print(
+        f"{result['command']}: {result['requests']} 个请求, 并发 {result['concurrency']}, "
+        f"耗时 {result['wall_seconds']}s"
+    )
+    print(f"吞吐量: {result['throughput_rps']} req/s")
+    print(f"延迟: p50 {result['p50']}s, p95 {result['p95']}s, p99 {result['p99']}s")
+    print(f"结果: {result['outcomes']}")
+    print(f"内存: 峰值 RSS {result['peak_rss_mb']} MB, tracemalloc 峰值 {result['traced_peak_mb']} MB")
+    print(f"模拟服务请求: {result['server']}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""热点函数微基准
+
+覆盖请求路径上的几个热点函数，结果可以保存为 JSON 基线，之后与基线比较并标出
+超过阈值的退化，便于在改动前后或 CI 中发现性能回归。
+
+用法（在插件目录的上级目录执行）:
+    python -m <插件目录名>.benchmarks.microbench --save baseline.json
+    python -m <插件目录名>.benchmarks.microbench --compare baseline.json --threshold 0.15
+
+基线与机器相关，只应与同一台机器上保存的基线比较。
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from ._common import import_plugin_module, measure
+from .bench_import_time import measure_import
+
+# 每组基准返回 {用例名: 单次耗时（纳秒）}
+BenchGroup = Callable[[argparse.Namespace], dict[str, float]]
+GROUPS: dict[str, BenchGroup] = {}
+
+
+def bench_group(name: str) -> Callable[[BenchGroup], BenchGroup]:
+    """注册一组基准
+
+    Args:
+        name: 组名，用例名以 "组名." 开头，--filter 按组名或用例名前缀筛选
+    """
+
+    def decorator(func: BenchGroup) -> BenchGroup:
+        GROUPS[name] = func
+        return func
+
+    return decorator
+
+
+def _best_of(func: Callable[[], float], repeat: int) -> float:
+    """执行多轮自计时的测量，取最小值
+
+    Args:
+        func: 返回单次耗时（纳秒）的测量函数
+        repeat: 测量轮数
+
+    Returns:
+        最小的单次耗时（纳秒）
+    """
+    return min(func() for _ in range(max(1, repeat)))
+
+
+@bench_group("parse_prompt_and_size")
+def bench_parse_prompt_and_size(args: argparse.Namespace) -> dict[str, float]:
+    command_utils = import_plugin_module("core.command_utils")
+    plugin = argparse.Namespace(api_client=argparse.Namespace(default_size="1024x1024"))
+    prompt = "一只在雪地里奔跑的橘猫，电影感光影，超高细节，8k，广角镜头"
+    parse = command_utils.parse_prompt_and_size
+    return {
+        "parse_prompt_and_size.plain": measure(lambda: parse(plugin, prompt)),
+        "parse_prompt_and_size.ratio": measure(lambda: parse(plugin, f"{prompt} 16:9")),
+        "parse_prompt_and_size.long": measure(lambda: parse(plugin, prompt * 40 + " 9:16")),
+    }
+
+
+@bench_group("check_debounce")
+def bench_check_debounce(args: argparse.Namespace) -> dict[str, float]:
+    rate_limiter = import_plugin_module("core.rate_limiter")
+    batch = 50_000
+    new_ids = [f"new-{i}" for i in range(batch)]
+    results = {}
+
+    for users in args.debounce_users:
+        existing = [f"user-{i}" for i in range(users)]
+
+        def make_limiter() -> Any:
+            limiter = rate_limiter.RateLimiter()
+            now = time.time()
+            for request_id in existing:
+                limiter.last_operations[request_id] = now
+            return limiter
+
+        def run_pass() -> float:
+            # 新用户：未命中防抖，插入记录并移动到尾部
+            limiter = make_limiter()
+            check = limiter.check_debounce
+            start = time.perf_counter_ns()
+            for request_id in new_ids:
+                check(request_id)
+            return (time.perf_counter_ns() - start) / batch
+
+        def run_reject() -> float:
+            # 已有用户：命中防抖直接拒绝
+            limiter = make_limiter()
+            check = limiter.check_debounce
+            targets = existing[:batch]
+            start = time.perf_counter_ns()
+            for request_id in targets:
+                check(request_id)
+            return (time.perf_counter_ns() - start) / len(targets)
+
+        results[f"check_debounce.pass.{users}"] = _best_of(run_pass, args.repeat)
+        results[f"check_debounce.reject.{users}"] = _best_of(run_reject, args.repeat)
+    return results
+
+
+@bench_group("extension")
+def bench_extension(args: argparse.Namespace) -> dict[str, float]:
+    image_manager = import_plugin_module("core.image_manager")
+    detect = image_manager.ImageManager._get_extension_from_url_or_content_type
+    url = "https://example.com/files/1234567890abcdef/image.webp?token=abc"
+    return {
+        "extension.content_type": measure(lambda: detect(url, "image/png; charset=binary")),
+        "extension.url": measure(lambda: detect("https://example.com/a/b/c.bmp", None)),
+        "extension.fallback": measure(lambda: detect(url, "application/octet-stream")),
+    }
+
+
+@bench_group("save_base64_image")
+def bench_save_base64_image(args: argparse.Namespace) -> dict[str, float]:
+    image_manager = import_plugin_module("core.image_manager")
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="gitee-ai-bench-") as tmp:
+        manager = image_manager.ImageManager()
+        manager._image_dir = Path(tmp)
+        loop = asyncio.new_event_loop()
+        try:
+            for size_mb in args.image_mb:
+                payload = "data:image/png;base64," + base64.b64encode(
+                    os.urandom(size_mb * 1024 * 1024)
+                ).decode()
+
+                def run() -> float:
+                    start = time.perf_counter_ns()
+                    path = loop.run_until_complete(manager.save_base64_image(payload))
+                    elapsed = time.perf_counter_ns() - start
+                    os.unlink(path)
+                    return elapsed
+
+                results[f"save_base64_image.{size_mb}mb"] = _best_of(run, args.repeat)
+        finally:
+            loop.close()
+    return results
+
+
+@bench_group("cleanup_old_images")
+def bench_cleanup_old_images(args: argparse.Namespace) -> dict[str, float]:
+    image_manager = import_plugin_module("core.image_manager")
+    results = {}
+    for count in args.cleanup_files:
+        tmp = Path(tempfile.mkdtemp(prefix="gitee-ai-bench-"))
+        try:
+            manager = image_manager.ImageManager()
+            manager._image_dir = tmp
+            names = [tmp / f"{i:06d}.jpg" for i in range(count)]
+            base_mtime = time.time() - count
+
+            def run() -> float:
+                # 补齐上一轮删除的文件（不计时），每个文件的修改时间不同
+                for i, path in enumerate(names):
+                    if not path.exists():
+                        path.touch()
+                        os.utime(path, (base_mtime + i, base_mtime + i))
+                start = time.perf_counter_ns()
+                manager._sync_cleanup_old_images()
+                return time.perf_counter_ns() - start
+
+            results[f"cleanup_old_images.{count}"] = _best_of(run, args.repeat)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+
+@bench_group("import")
+def bench_import(args: argparse.Namespace) -> dict[str, float]:
+    # 新进程中导入插件的累计耗时，详细报告见 bench_import_time
+    total_us, _ = measure_import("main", args.repeat)
+    return {"import.plugin": total_us * 1000.0}
+
+
+def format_ns(value: float) -> str:
+    """将纳秒格式化为合适的单位"""
+    if value >= 1e9:
+        return f"{value / 1e9:.2f} s"
+    if value >= 1e6:
+        return f"{value / 1e6:.2f} ms"
+    if value >= 1e3:
+        return f"{value / 1e3:.2f} µs"
+    return f"{value:.1f} ns"
+
+
+def run_groups(args: argparse.Namespace) -> dict[str, float]:
+    """执行筛选后的基准组
+
+    Args:
+        args: 命令行参数
+
+    Returns:
+        {用例名: 单次耗时（纳秒）}
+    """
+    results: dict[str, float] = {}
+    for name, group in GROUPS.items():
+        # 过滤条件可以是组名前缀，也可以是某个用例名前缀（如 check_debounce.pass）
+        if args.filter and not any(name.startswith(f) or f.startswith(name) for f in args.filter):
+            continue
+        for case, value in group(args).items():
+            if args.filter and not any(
+                case.startswith(f) or name.startswith(f) for f in args.filter
+            ):
+                continue
+            results[case] = value
+            print(f"{case:<40} {format_ns(value):>12}")
+    return results
+
+
+def compare(
+    results: dict[str, float], baseline: dict[str, float], threshold: float
+) -> list[str]:
+    """与基线比较并打印差异
+
+    Args:
+        results: 本次结果
+        baseline: 基线结果
+        threshold: 判定为退化或改进的相对变化
+
+    Returns:
+        退化的用例名列表
+    """
+    regressions = []
+    print(f"\n与基线比较（阈值 ±{threshold:.0%}）:")
+    for case, value in results.items():
+        base = baseline.get(case)
+        if not base:
+            print(f"  {case:<40} {'新增':>10}")
+            continue
+        change = value / base - 1
+        if change > threshold:
+            mark = "退化"
+            regressions.append(case)
+        elif change < -threshold:
+            mark = "改进"
+        else:
+            mark = ""
+        print(f"  {case:<40} {format_ns(base):>12} -> {format_ns(value):>12} {change:+7.1%} {mark}")
+    for case in baseline:
+        if case not in results:
+            print(f"  {case:<40} {'未运行':>10}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="热点函数微基准")
+    parser.add_argument("--filter", nargs="*", default=[], help="只运行指定前缀的组或用例")
+    parser.add_argument("--repeat", type=int, default=5, help="自计时用例的测量轮数")
+    parser.add_argument(
+        "--debounce-users", type=int, nargs="+", default=[10_000, 100_000],
+        help="check_debounce 预置的用户数",
+    )
+    parser.add_argument(
+        "--image-mb", type=int, nargs="+", default=[1, 4, 16], help="save_base64_image 的图片大小",
+    )
+    parser.add_argument(
+        "--cleanup-files", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+        help="_sync_cleanup_old_images 的目录文件数",
+    )
+    parser.add_argument("--save", help="将结果保存为 JSON 基线")
+    parser.add_argument("--compare", help="与指定的 JSON 基线比较")
+    parser.add_argument(
+        "--threshold", type=float, default=0.15, help="判定为退化的相对变化，默认 0.15（15%%）"
+    )
+    args = parser.parse_args()
+
+    results = run_groups(args)
+    if args.save:
+        document = {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "unit": "ns",
+            "results": results,
+        }
+        Path(args.save).write_text(
+            json.dumps(document, indent=2, ensure_ascii=False) + "\n", encoding="utf-8"
+        )
+        print(f"\n基线已保存: {args.save}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline.get("results", {}), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} 个用例退化超过 {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
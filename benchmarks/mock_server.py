@@ -0,0 +1,290 @@
+"""本地 Gitee AI 模拟服务
+
+基于 aiohttp 实现 /images/generations、/models、/async/images/edits 和 /task/{id}，
+支持可配置的延迟分布、429/500 错误注入以及 Base64/URL 两种返回方式，
+用于在不消耗真实 API 配额、不联网的情况下压测插件。
+
+用法: python -m <插件目录名>.benchmarks.mock_server --port 8900 --latency lognormal:1.0,0.4
+"""
+
+import argparse
+import asyncio
+import base64
+import itertools
+import math
+import os
+import random
+import time
+from typing import Any, Optional
+
+from aiohttp import web
+
+# 最小的合法 PNG 文件头，后面填充随机字节到指定大小
+_PNG_HEADER = bytes.fromhex("89504e470d0a1a0a0000000d4948445200000001000000010806000000")
+
+
+class LatencyModel:
+    """延迟分布
+
+    支持的格式:
+        fixed:0.5               固定 0.5 秒
+        uniform:0.2,1.0         0.2 到 1.0 秒均匀分布
+        exp:0.8                 均值 0.8 秒的指数分布
+        lognormal:1.0,0.4       中位数 1.0 秒、形状参数 0.4 的对数正态分布
+    """
+
+    def __init__(self, spec: str = "fixed:0") -> None:
+        """解析延迟分布
+
+        Args:
+            spec: 分布描述字符串
+
+        Raises:
+            ValueError: 无法识别的分布
+        """
+        kind, _, params = spec.partition(":")
+        values = [float(v) for v in params.split(",") if v.strip()] if params else []
+        self.kind = kind.strip().lower()
+        self.spec = spec
+        if self.kind == "fixed" and len(values) == 1:
+            self._sample = lambda: values[0]
+        elif self.kind == "uniform" and len(values) == 2:
+            self._sample = lambda: random.uniform(values[0], values[1])
+        elif self.kind == "exp" and len(values) == 1:
+            self._sample = lambda: random.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+        elif self.kind == "lognormal" and len(values) == 2:
+            mu = math.log(values[0]) if values[0] > 0 else 0.0
+            self._sample = lambda: random.lognormvariate(mu, values[1])
+        else:
+            raise ValueError(f"无法识别的延迟分布: {spec}")
+
+    def sample(self) -> float:
+        """采样一次延迟（秒）"""
+        return max(0.0, self._sample())
+
+
+class MockGiteeServer:
+    """Gitee AI 模拟服务"""
+
+    def __init__(
+        self,
+        latency: str = "fixed:0",
+        error_429: float = 0.0,
+        error_500: float = 0.0,
+        mode: str = "b64",
+        image_bytes: int = 64 * 1024,
+        pending_polls: int = 0,
+        seed: Optional[int] = None,
+    ) -> None:
+        """初始化模拟服务
+
+        Args:
+            latency: 生成和编辑请求的延迟分布
+            error_429: 返回 429 的概率
+            error_500: 返回 500 的概率
+            mode: 生成接口的返回方式，b64 或 url
+            image_bytes: 返回图片的字节数
+            pending_polls: 编辑任务在成功前返回 running 的轮询次数
+            seed: 随机数种子，便于复现
+        """
+        if seed is not None:
+            random.seed(seed)
+        self.latency = LatencyModel(latency)
+        self.error_429 = error_429
+        self.error_500 = error_500
+        self.mode = mode
+        self.pending_polls = pending_polls
+        self.image = _PNG_HEADER + os.urandom(max(0, image_bytes - len(_PNG_HEADER)))
+        self.image_b64 = base64.b64encode(self.image).decode()
+        self.base_url = ""
+        self.stats: dict[str, int] = {}
+        self._tasks: dict[str, dict[str, Any]] = {}
+        self._task_ids = itertools.count(1)
+        self._runner: Optional[web.AppRunner] = None
+
+    def _count(self, key: str) -> None:
+        self.stats[key] = self.stats.get(key, 0) + 1
+
+    def _inject_error(self) -> Optional[web.Response]:
+        """按概率返回错误响应"""
+        roll = random.random()
+        if roll < self.error_429:
+            self._count("429")
+            return web.json_response(
+                {"error": {"message": "Too many requests", "type": "rate_limit"}}, status=429
+            )
+        if roll < self.error_429 + self.error_500:
+            self._count("500")
+            return web.json_response(
+                {"error": {"message": "Internal server error", "type": "server_error"}}, status=500
+            )
+        return None
+
+    async def _generations(self, request: web.Request) -> web.Response:
+        self._count("generations")
+        body = await request.json()
+        error = self._inject_error()
+        if error is not None:
+            return error
+        await asyncio.sleep(self.latency.sample())
+        if self.mode == "url":
+            item = {"url": f"{self.base_url}/files/{next(self._task_ids)}.png"}
+        else:
+            item = {"b64_json": self.image_b64}
+        return web.json_response(
+            {"created": int(time.time()), "data": [item], "model": body.get("model", "")}
+        )
+
+    async def _models(self, request: web.Request) -> web.Response:
+        self._count("models")
+        model_type = request.query.get("type", "text2image")
+        return web.json_response({
+            "object": "list",
+            "data": [
+                {"id": f"mock-{model_type}-{i}", "object": "model", "created": 0, "owned_by": "mock"}
+                for i in range(5)
+            ],
+        })
+
+    async def _edits(self, request: web.Request) -> web.Response:
+        self._count("edits")
+        # 读取完整表单，模拟上传开销
+        await request.post()
+        error = self._inject_error()
+        if error is not None:
+            return error
+        task_id = f"mock-{next(self._task_ids)}"
+        self._tasks[task_id] = {
+            "ready_at": time.monotonic() + self.latency.sample(),
+            "created_at": int(time.time() * 1000),
+            "polls": 0,
+            "status": "running",
+        }
+        # 任务就绪前不返回，使插件的第一次轮询即可拿到结果，避免 10 秒的轮询间隔主导压测结果
+        if not self.pending_polls:
+            await asyncio.sleep(max(0.0, self._tasks[task_id]["ready_at"] - time.monotonic()))
+        return web.json_response({"task_id": task_id, "status": "waiting"})
+
+    async def _task(self, request: web.Request) -> web.Response:
+        self._count("task")
+        task = self._tasks.get(request.match_info["task_id"])
+        if task is None:
+            return web.json_response({"error": "not_found", "message": "任务不存在"}, status=404)
+        task["polls"] += 1
+        if task["status"] == "cancelled":
+            return web.json_response({"status": "cancelled"})
+        if task["polls"] <= self.pending_polls or time.monotonic() < task["ready_at"]:
+            return web.json_response({"status": "running"})
+        return web.json_response({
+            "status": "success",
+            "started_at": task["created_at"],
+            "completed_at": int(time.time() * 1000),
+            "output": {"file_url": f"{self.base_url}/files/{request.match_info['task_id']}.png"},
+        })
+
+    async def _cancel(self, request: web.Request) -> web.Response:
+        self._count("cancel")
+        task = self._tasks.get(request.match_info["task_id"])
+        if task is not None:
+            task["status"] = "cancelled"
+        return web.json_response({"status": "cancelled"})
+
+    async def _file(self, request: web.Request) -> web.Response:
+        self._count("files")
+        return web.Response(body=self.image, content_type="image/png")
+
+    def make_app(self) -> web.Application:
+        """创建 aiohttp 应用"""
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/images/generations", self._generations)
+        app.router.add_get("/models", self._models)
+        app.router.add_post("/async/images/edits", self._edits)
+        app.router.add_get("/task/{task_id}", self._task)
+        app.router.add_post("/task/{task_id}/cancel", self._cancel)
+        app.router.add_get("/files/{name}", self._file)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """启动服务
+
+        Args:
+            host: 监听地址
+            port: 监听端口，0 表示随机端口
+
+        Returns:
+            服务的 base_url
+        """
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        sockets = site._server.sockets if site._server else []  # type: ignore[union-attr]
+        actual_port = sockets[0].getsockname()[1] if sockets else port
+        self.base_url = f"http://{host}:{actual_port}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        """停止服务"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    """添加模拟服务的命令行参数
+
+    Args:
+        parser: 命令行解析器
+    """
+    parser.add_argument("--latency", default="lognormal:0.5,0.3", help="延迟分布，例如 fixed:0.5")
+    parser.add_argument("--error-429", type=float, default=0.0, help="返回 429 的概率")
+    parser.add_argument("--error-500", type=float, default=0.0, help="返回 500 的概率")
+    parser.add_argument("--mode", choices=("b64", "url"), default="b64", help="生成接口返回方式")
+    parser.add_argument("--image-kb", type=int, default=256, help="返回图片大小（KB）")
+    parser.add_argument("--pending-polls", type=int, default=0, help="编辑任务成功前返回 running 的次数")
+    parser.add_argument("--seed", type=int, default=None, help="随机数种子")
+
+
+def server_from_args(args: argparse.Namespace) -> MockGiteeServer:
+    """根据命令行参数创建模拟服务
+
+    Args:
+        args: 解析后的命令行参数
+
+    Returns:
+        模拟服务实例
+    """
+    return MockGiteeServer(
+        latency=args.latency,
+        error_429=args.error_429,
+        error_500=args.error_500,
+        mode=args.mode,
+        image_bytes=args.image_kb * 1024,
+        pending_polls=args.pending_polls,
+        seed=args.seed,
+    )
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    server = server_from_args(args)
+    base_url = await server.start(args.host, args.port)
+    print(f"模拟服务已启动: {base_url}（Ctrl+C 退出）")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地 Gitee AI 模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_server_arguments(parser)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""录制流量回放工具
+
+读取插件录制的 traffic.jsonl（配置项 traffic_record），按记录的到达时间以原速或倍速
+将请求送入插件命令，上游由本地模拟服务替代，用于在接近真实的流量组合下比较调度、
+缓存和传输层改动的效果。
+
+用法: python -m <插件目录名>.benchmarks.replay traffic.jsonl --speed 2 --latency recorded
+
+回放说明:
+- 到达时间取录制时的调用开始时间减去排队时间，即命令进入调度器的时间
+- generate、style（文生图）记录通过生图命令回放，draw 记录通过 LLM 工具回放，
+  edit 记录通过 AI 编辑命令回放，附件按录制的大小生成
+- 提示词只保留哈希时，用包含哈希、长度相同的占位文本代替，重复请求仍然相同
+- 尺寸按比例还原为该比例的首选尺寸
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import statistics
+import time
+from pathlib import Path
+from typing import Any
+
+from astrbot.api.message_components import Image
+
+from ._common import import_plugin_module, peak_rss_mb, percentile
+from .load_test import LoadTestEvent, build_plugin
+from .mock_server import add_server_arguments, server_from_args
+
+
+def load_records(path: str, limit: int = 0) -> list[dict[str, Any]]:
+    """读取录制文件，跳过无法解析的行，并按到达时间排序
+
+    Args:
+        path: JSONL 文件路径
+        limit: 最多读取的记录数，0 表示全部
+
+    Returns:
+        带有 arrival 字段的记录列表
+    """
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "ts" not in record or record.get("op") not in ("generate", "edit"):
+                continue
+            record["arrival"] = record["ts"] - record.get("queue_wait", 0.0)
+            records.append(record)
+    records.sort(key=lambda record: record["arrival"])
+    return records[:limit] if limit else records
+
+
+def fit_latency(records: list[dict[str, Any]]) -> str:
+    """根据录制的成功请求耗时拟合对数正态分布，作为模拟服务的延迟
+
+    Args:
+        records: 录制记录
+
+    Returns:
+        延迟分布描述，例如 lognormal:1.2,0.4
+    """
+    durations = [
+        r["duration"] for r in records if r.get("outcome") == "ok" and r.get("duration", 0) > 0
+    ]
+    if len(durations) < 2:
+        return "fixed:0.5"
+    logs = [math.log(d) for d in durations]
+    return f"lognormal:{math.exp(statistics.median(logs)):.3f},{statistics.stdev(logs):.3f}"
+
+
+def size_to_ratio(size: str) -> str:
+    """将录制的尺寸还原为比例参数
+
+    Args:
+        size: 尺寸，例如 1024x576
+
+    Returns:
+        比例，例如 16:9，无法识别时返回空字符串
+    """
+    config = import_plugin_module("core.config")
+    for ratio, sizes in config.SUPPORTED_RATIOS.items():
+        if size in sizes:
+            return ratio
+    return ""
+
+
+def replay_prompt(record: dict[str, Any]) -> str:
+    """还原提示词，只录制了哈希时生成长度相同的占位文本
+
+    Args:
+        record: 录制记录
+
+    Returns:
+        提示词
+    """
+    if "prompt" in record:
+        return record["prompt"]
+    text = f"回放 {record.get('prompt_hash', '')} "
+    return text + "字" * max(0, record.get("prompt_chars", 0) - len(text))
+
+
+class Attachments:
+    """按录制大小生成的附件文件，相同大小只生成一次"""
+
+    def __init__(self, directory: Path, header: bytes) -> None:
+        self.directory = directory
+        self.header = header
+        self._paths: dict[int, str] = {}
+
+    def get(self, size: int) -> str:
+        path = self._paths.get(size)
+        if path is None:
+            path = str(self.directory / f"replay_{size}.png")
+            Path(path).write_bytes(self.header + os.urandom(max(0, size - len(self.header))))
+            self._paths[size] = path
+        return path
+
+
+async def replay_one(
+    plugin: Any,
+    record: dict[str, Any],
+    event: LoadTestEvent,
+    attachments: Attachments,
+    default_image_bytes: int,
+) -> str:
+    """回放一条记录
+
+    Args:
+        plugin: 插件实例
+        record: 录制记录
+        event: 消息事件
+        attachments: 附件生成器
+        default_image_bytes: 未记录大小的附件使用的字节数
+
+    Returns:
+        ok 表示收到图片，failed 表示只收到文本回复
+    """
+    commands = import_plugin_module("commands")
+    prompt = replay_prompt(record)
+    if record["op"] == "edit":
+        event.message_obj.message = [
+            Image(file=attachments.get(image.get("bytes") or default_image_bytes))
+            for image in record.get("images") or [{}]
+        ]
+        task_types = record.get("task_types") or ["style"]
+        task_type = task_types[0] if task_types[0] in ("id", "style") else ""
+        results = commands.ai_edit_image_command(plugin, event, prompt, task_type)
+    else:
+        prompt = f"{prompt} {size_to_ratio(record.get('size', ''))}".strip()
+        if record.get("command") == "draw":
+            llm_tools = import_plugin_module("llm_tools")
+            text = await llm_tools.draw_image_tool(plugin, event, prompt)
+            return "ok" if text.startswith("图片已生成") else "failed"
+        results = commands.generate_image_command(plugin, event, prompt)
+
+    outcome = "failed"
+    async for kind, _ in results:
+        if kind == "chain":
+            outcome = "ok"
+    return outcome
+
+
+async def run_replay(args: argparse.Namespace) -> dict[str, Any]:
+    """按录制的到达时间回放
+
+    Args:
+        args: 命令行参数
+
+    Returns:
+        回放结果
+    """
+    records = load_records(args.traffic, args.limit)
+    if not records:
+        raise SystemExit(f"录制文件中没有可回放的记录: {args.traffic}")
+    if args.latency == "recorded":
+        args.latency = fit_latency(records)
+    server = server_from_args(args)
+    base_url = await server.start()
+    plugin = build_plugin(base_url, args)
+    await plugin.initialize()
+    image_dir = Path(plugin.api_client.image_manager.get_save_path()).parent
+    attachments = Attachments(image_dir, server.image[:32])
+
+    latencies: list[float] = []
+    dispatch_lag: list[float] = []
+    outcomes: dict[str, int] = {}
+    first_arrival = records[0]["arrival"]
+
+    async def one(index: int, record: dict[str, Any]) -> None:
+        user = f"replay-{index}" if args.anonymous_users else record.get("user", f"user-{index}")
+        event = LoadTestEvent(user, record.get("group", ""))
+        start = time.perf_counter()
+        try:
+            outcome = await replay_one(
+                plugin, record, event, attachments, args.image_kb * 1024
+            )
+        except Exception:
+            outcome = "error"
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        if outcome == "ok":
+            latencies.append(time.perf_counter() - start)
+
+    tasks = []
+    wall_start = time.perf_counter()
+    for index, record in enumerate(records):
+        due = (record["arrival"] - first_arrival) / args.speed
+        delay = due - (time.perf_counter() - wall_start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        dispatch_lag.append(max(0.0, time.perf_counter() - wall_start - due))
+        tasks.append(asyncio.create_task(one(index, record)))
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - wall_start
+
+    await plugin.close()
+    await server.stop()
+
+    recorded = [r["duration"] + r.get("queue_wait", 0.0) for r in records if r.get("outcome") == "ok"]
+    return {
+        "traffic": args.traffic,
+        "records": len(records),
+        "speed": args.speed,
+        "latency_model": args.latency,
+        "recorded_span_seconds": round(records[-1]["arrival"] - first_arrival, 3),
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(outcomes.get("ok", 0) / wall, 2) if wall else 0.0,
+        "p50": round(percentile(latencies, 0.50), 4),
+        "p95": round(percentile(latencies, 0.95), 4),
+        "p99": round(percentile(latencies, 0.99), 4),
+        "recorded_p50": round(percentile(recorded, 0.50), 4),
+        "recorded_p95": round(percentile(recorded, 0.95), 4),
+        "dispatch_lag_max": round(max(dispatch_lag, default=0.0), 4),
+        "outcomes": outcomes,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "server": server.stats,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="录制流量回放（离线）")
+    parser.add_argument("traffic", help="录制的 traffic.jsonl 文件")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速，2 表示以两倍速度到达")
+    parser.add_argument("--limit", type=int, default=0, help="最多回放的记录数，0 表示全部")
+    parser.add_argument(
+        "--anonymous-users", action="store_true",
+        help="每个请求使用不同的用户（倍速回放时避免被防抖拦截，但会失去按用户公平排队的效果）",
+    )
+    parser.add_argument("--keys", type=int, default=4, help="API Key 数量")
+    parser.add_argument("--job-concurrency", type=int, default=16, help="任务调度器并发上限")
+    parser.add_argument("--per-key-concurrency", type=int, default=8, help="单个 Key 的并发上限")
+    parser.add_argument("--max-concurrency", type=int, default=32, help="上游总并发上限")
+    parser.add_argument(
+        "--job-queue-workers", type=int, default=0, help="开启任务队列模式并启动的工作进程数，0 表示不开启"
+    )
+    parser.add_argument("--json", default="", help="将结果写入 JSON 文件")
+    add_server_arguments(parser)
+    parser.set_defaults(latency="recorded")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed 必须大于 0")
+
+    result = asyncio.run(run_replay(args))
+    print(
+        f"回放 {result['records']} 条记录（录制跨度 {result['recorded_span_seconds']}s, "
+        f"{result['speed']}x），耗时 {result['wall_seconds']}s"
+    )
+    print(f"上游延迟模型: {result['latency_model']}")
+    print(f"吞吐量: {result['throughput_rps']} req/s")
+    print(
+        f"延迟: p50 {result['p50']}s, p95 {result['p95']}s, p99 {result['p99']}s "
+        f"（录制 p50 {result['recorded_p50']}s, p95 {result['recorded_p95']}s）"
+    )
+    print(f"结果: {result['outcomes']}, 最大调度滞后 {result['dispatch_lag_max']}s")
+    print(f"内存: 峰值 RSS {result['peak_rss_mb']} MB")
+    if args.json:
+        Path(args.json).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,10 @@ from .text2image import list_models_command
 from .help import help_command
 from .ai_edit import ai_edit_image_command
 from .style import style_command
+from .cancel import cancel_command
+from .stats import stats_command
+from .loop_report import loop_report_command
+from .profile import profile_command
 
 __all__ = [
     "generate_image_command",
@@ -17,4 +21,8 @@ __all__ = [
     "help_command",
     "ai_edit_image_command",
     "style_command",
+    "cancel_command",
+    "stats_command",
+    "loop_report_command",
+    "profile_command",
 ]
\ No newline at end of file
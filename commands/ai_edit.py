@@ -3,6 +3,7 @@
 处理 /ai-gitee ai-edit 命令，使用 Gitee AI 编辑图片。
 """
 
+import asyncio
 import time
 from typing import Any, AsyncGenerator
 
@@ -11,7 +12,16 @@ from astrbot.api.event import AstrMessageEvent
 from astrbot.api.message_components import Plain, Image
 
 from ..core import check_rate_limit
-from ..core.command_utils import extract_images_from_message
+from ..core.command_utils import (
+    extract_images_from_message,
+    format_phase_breakdown,
+    format_queue_position,
+    record_completion,
+    record_failure,
+    submit_job,
+)
+from ..core.deadline import with_deadline
+from ..core.tracing import trace_span
 
 
 async def ai_edit_image_command(
@@ -52,13 +62,18 @@ async def ai_edit_image_command(
     user_id = event.get_sender_id()
     request_id = user_id
 
-    plugin.debug_log(f"[AI编辑命令] 收到编辑请求: user_id={user_id}, prompt={prompt[:50] if prompt else ''}..., task_type={task_type}")
+    plugin.debug_log(
+        "[AI编辑命令] 收到编辑请求: user_id=%s, prompt=%.50s..., task_type=%s",
+        user_id, prompt or "", task_type,
+    )
 
     # 检查速率限制和防抖
-    async for result in check_rate_limit(plugin, event, "AI编辑命令", request_id):
+    async for result in check_rate_limit(plugin, event, "AI编辑命令", request_id, "ai-edit"):
         yield result
         return
 
+    ticket = None
+    root = plugin.tracer.start_trace("ai-edit", user_id=user_id, model="Qwen-Image-Edit-2511")
     try:
         # 检查提示词
         if not prompt:
@@ -77,7 +92,9 @@ async def ai_edit_image_command(
             return
 
         # 获取消息中的图片
-        image_paths = await extract_images_from_message(event)
+        image_paths = await extract_images_from_message(
+            event, plugin.api_client.image_manager.memory
+        )
         if not image_paths:
             plugin.debug_log("[AI编辑命令] 未找到图片")
             yield event.plain_result(
@@ -93,16 +110,27 @@ async def ai_edit_image_command(
             task_types = [task_type.lower()]
 
         plugin.debug_log(
-            f"[AI编辑命令] 开始编辑图片: images={len(image_paths)}, "
-            f"task_types={task_types}, prompt={prompt[:50]}..."
+            "[AI编辑命令] 开始编辑图片: images=%s, task_types=%s, prompt=%.50s...",
+            len(image_paths), task_types, prompt,
         )
 
+        # 提交到任务队列
+        ticket, rejection = submit_job(plugin, event, "ai-edit", model="Qwen-Image-Edit-2511")
+        if ticket is None:
+            yield event.plain_result(rejection)
+            return
+        queue_message = format_queue_position(ticket)
+        if queue_message:
+            yield event.plain_result(queue_message)
+        with trace_span("queue.wait"):
+            await with_deadline("queue", ticket.wait(), ticket.deadline)
+
         yield event.plain_result(f"正在使用 AI 编辑图片（{len(image_paths)}张），这可能需要几分钟，请稍候...")
 
         start_time = time.time()
 
         # 调用 API 编辑图片
-        image_path = await plugin.api_client.edit_image(
+        image_path = await ticket.run(plugin.api_client.edit_image(
             prompt=prompt,
             image_paths=image_paths,
             task_types=task_types,
@@ -110,26 +138,35 @@ async def ai_edit_image_command(
             num_inference_steps=4,
             guidance_scale=1.0,
             download_urls=plugin.download_image_urls,
-        )
+        ))
 
         end_time = time.time()
         elapsed_time = end_time - start_time
+        record_completion(plugin, "ai-edit", "Qwen-Image-Edit-2511", elapsed_time)
 
-        plugin.debug_log(
-            f"[AI编辑命令] 图片编辑成功: path={image_path}, "
-            f"耗时={elapsed_time:.2f}秒"
-        )
+        plugin.debug_log("[AI编辑命令] 图片编辑成功: path=%s, 耗时=%.2f秒", image_path, elapsed_time)
 
         # 发送结果
-        yield event.chain_result([
-            Image.fromFileSystem(image_path),  # type: ignore
-            Plain(f"AI 图片编辑完成，耗时：{elapsed_time:.2f}秒")
-        ])
-
+        breakdown = format_phase_breakdown(plugin, root)
+        with trace_span("platform.send"):
+            yield event.chain_result([
+                Image.fromFileSystem(image_path),  # type: ignore
+                Plain(f"AI 图片编辑完成，耗时：{elapsed_time:.2f}秒{breakdown}")
+            ])
+
+    except asyncio.CancelledError:
+        if ticket is None or not ticket.cancelled:
+            raise
+        plugin.debug_log("[AI编辑命令] 任务已取消: user_id=%s", user_id)
+        yield event.plain_result("任务已取消。")
     except Exception as e:
+        record_failure("ai-edit", e)
         logger.error(f"AI 图片编辑失败: {e}", exc_info=True)
-        plugin.debug_log(f"[AI编辑命令] 编辑失败: error={str(e)}")
+        plugin.debug_log("[AI编辑命令] 编辑失败: error=%s", e)
         yield event.plain_result(f"AI 图片编辑失败: {str(e)}")
     finally:
+        root.end()
+        if ticket is not None:
+            ticket.release()
         plugin.rate_limiter.remove_processing(request_id)
-        plugin.debug_log(f"[AI编辑命令] 处理完成: user_id={user_id}")
\ No newline at end of file
+        plugin.debug_log("[AI编辑命令] 处理完成: user_id=%s", user_id)
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""取消任务命令处理模块
+
+处理 /ai-gitee cancel 命令，取消排队中或执行中的任务。
+"""
+
+from typing import Any, AsyncGenerator
+
+from astrbot.api.event import AstrMessageEvent
+
+
+async def cancel_command(
+    plugin,
+    event: "AstrMessageEvent",
+    job_id: str = "",
+) -> AsyncGenerator[Any, None]:
+    """取消任务命令
+
+    取消当前用户排队中或执行中的任务，执行中的远程异步任务也会一并取消。
+
+    用法: /ai-gitee cancel [任务编号]
+    示例: /ai-gitee cancel        # 取消自己的所有任务
+          /ai-gitee cancel 12     # 只取消编号为 12 的任务
+
+    Args:
+        plugin: 插件实例，提供 scheduler, debug_log 等方法
+        event: 消息事件对象
+        job_id: 任务编号（可选）
+
+    Yields:
+        取消结果
+    """
+    user_id = event.get_sender_id()
+    plugin.debug_log("[取消任务] 收到请求: user_id=%s, job_id=%s", user_id, job_id)
+
+    jobs = plugin.scheduler.get_user_jobs(user_id)
+    if not jobs:
+        yield event.plain_result("您当前没有排队或执行中的任务。")
+        return
+
+    if job_id:
+        target = next((job for job in jobs if str(job.job_id) == job_id.strip()), None)
+        if target is None:
+            yield event.plain_result(
+                f"未找到编号为 {job_id} 的任务。您的任务编号：{', '.join(str(job.job_id) for job in jobs)}"
+            )
+            return
+        cancelled = 1 if target.cancel() else 0
+    else:
+        cancelled = plugin.scheduler.cancel_user_jobs(user_id)
+
+    plugin.debug_log("[取消任务] 已取消: user_id=%s, count=%s", user_id, cancelled)
+    if cancelled:
+        yield event.plain_result(f"已取消 {cancelled} 个任务。")
+    else:
+        yield event.plain_result("任务已结束或正在取消中，无需重复操作。")
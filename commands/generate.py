@@ -3,6 +3,7 @@
 处理 /ai-gitee generate 命令，生成图片。
 """
 
+import asyncio
 import time
 from typing import Any, AsyncGenerator
 
@@ -10,6 +11,18 @@ from astrbot.api import logger
 from astrbot.api.event import AstrMessageEvent
 from astrbot.api.message_components import Image, Plain
 from ..core import check_rate_limit, parse_prompt_and_size
+from ..core.command_utils import (
+    format_phase_breakdown,
+    format_queue_position,
+    plan_quality,
+    record_completion,
+    record_first_image,
+    record_failure,
+    submit_job,
+)
+from ..core.deadline import with_deadline
+from ..core.degradation import draft_plan
+from ..core.tracing import trace_span
 
 
 async def generate_image_command(
@@ -44,10 +57,13 @@ async def generate_image_command(
     user_id = event.get_sender_id()
     request_id = user_id
 
-    plugin.debug_log(f"[命令] 收到生图请求: user_id={user_id}, prompt={prompt[:50]}...")
+    plugin.debug_log("[命令] 收到生图请求: user_id=%s, prompt=%.50s...", user_id, prompt)
 
-    # 检查速率限制和防抖
-    async for result in check_rate_limit(plugin, event, "命令", request_id):
+    # 检查速率限制和防抖；上一张图还在精修时，新的提示词用于取代它，不受防抖限制
+    superseding = user_id in plugin.pending_refines
+    async for result in check_rate_limit(
+        plugin, event, "命令", request_id, "generate", debounce=not superseding
+    ):
         yield result
         return
 
@@ -55,34 +71,98 @@ async def generate_image_command(
     try:
         prompt, target_size = parse_prompt_and_size(plugin, prompt)
     except ValueError as e:
-        plugin.debug_log(f"[命令] 参数解析失败: {e}")
+        plugin.debug_log("[命令] 参数解析失败: %s", e)
+        plugin.rate_limiter.remove_processing(request_id)
         yield event.plain_result(f"{e}。使用方法：/ai-gitee generate <提示词> [比例]")
         return
 
-    plugin.debug_log(f"[命令] 解析参数: prompt={prompt[:50]}..., size={target_size}")
+    plugin.debug_log("[命令] 解析参数: prompt=%.50s..., size=%s", prompt, target_size)
+
+    # 新的提示词取代同一用户还在精修中的上一张图
+    superseded = plugin.pending_refines.pop(user_id, None)
+    if superseded is not None and superseded.cancel():
+        plugin.debug_log("[命令] 跳过上一张图的精修: user_id=%s, job_id=%s", user_id, superseded.job_id)
 
+    # 选择模型并提交到任务队列
+    model = plugin.api_client.router.route(user_id, "generate", plugin.api_client.model)
+    ticket, rejection = submit_job(plugin, event, "generate", model=model)
+    if ticket is None:
+        plugin.rate_limiter.remove_processing(request_id)
+        yield event.plain_result(rejection)
+        return
+
+    root = plugin.tracer.start_trace(
+        "generate", user_id=user_id, job_id=ticket.job_id, size=target_size,
+        model=model,
+    )
+    draft_sent = False
     try:
-        plugin.debug_log(f"[命令] 开始生成图片: user_id={user_id}")
+        queue_message = format_queue_position(ticket)
+        if queue_message:
+            yield event.plain_result(queue_message)
+        with trace_span("queue.wait"):
+            await with_deadline("queue", ticket.wait(), ticket.deadline)
+
+        plugin.debug_log("[命令] 开始生成图片: user_id=%s", user_id)
         # 先发送提示消息
         yield event.plain_result("正在生成图片，请稍候...")
+        plan = plan_quality(plugin, target_size)
+        draft = draft_plan(plan) if plugin.draft_preview else None
         start_time = time.time()
-        image_path = await plugin.api_client.generate_image(prompt, size=target_size)
+        if draft is not None:
+            # 先生成低分辨率、少步数的预览图，随后再生成完整画质
+            with trace_span("draft", size=draft.size, steps=draft.steps):
+                draft_path = await ticket.run(plugin.api_client.generate_image(
+                    prompt, size=draft.size, model=model, steps=draft.steps, preview=True
+                ))
+            first_image_time = time.time() - start_time
+            record_first_image("generate", model, first_image_time)
+            plugin.debug_log("[命令] 预览图生成成功: path=%s, 耗时=%.2f秒", draft_path, first_image_time)
+            plugin.pending_refines[user_id] = ticket
+            draft_sent = True
+            with trace_span("platform.send"):
+                yield event.chain_result([
+                    Image.fromFileSystem(draft_path),  # type: ignore
+                    Plain(
+                        f"预览图（{draft.size}，{draft.steps} 步），耗时：{first_image_time:.2f}秒，"
+                        "正在生成完整画质..."
+                    ),
+                ])
+        image_path = await ticket.run(plugin.api_client.generate_image(
+            prompt, size=plan.size, model=model, steps=plan.steps
+        ))
         end_time = time.time()
         elapsed_time = end_time - start_time
-        plugin.debug_log(
-            f"[命令] 图片生成成功: path={image_path},"
-            f"耗时={elapsed_time:.2f}秒"
-        )
+        record_completion(plugin, "generate", model, elapsed_time)
+        if draft is None:
+            record_first_image("generate", model, elapsed_time)
+        plugin.debug_log("[命令] 图片生成成功: path=%s,耗时=%.2f秒", image_path, elapsed_time)
         # 将图片和耗时信息合并到一个消息中发送
-        yield event.chain_result([
-            Image.fromFileSystem(image_path),  # type: ignore
-            Plain(f"图片生成完成，耗时：{elapsed_time:.2f}秒")
-        ])
-
+        breakdown = format_phase_breakdown(plugin, root)
+        title = "完整画质图片生成完成" if draft is not None else "图片生成完成"
+        with trace_span("platform.send"):
+            yield event.chain_result([
+                Image.fromFileSystem(image_path),  # type: ignore
+                Plain(f"{title}，耗时：{elapsed_time:.2f}秒{plan.describe()}{breakdown}")
+            ])
+
+    except asyncio.CancelledError:
+        if not ticket.cancelled:
+            raise
+        plugin.debug_log("[命令] 任务已取消: user_id=%s", user_id)
+        if draft_sent:
+            yield event.plain_result("已跳过完整画质生成，保留预览图。")
+        else:
+            yield event.plain_result("任务已取消。")
     except Exception as e:
+        record_failure("generate", e)
         logger.error(f"生图失败: {e}", exc_info=True)
-        plugin.debug_log(f"[命令] 图片生成失败: error={str(e)}")
+        plugin.debug_log("[命令] 图片生成失败: error=%s", e)
         yield event.plain_result(f"生成图片失败: {str(e)}")
     finally:
+        if plugin.pending_refines.get(user_id) is ticket:
+            del plugin.pending_refines[user_id]
+        root.end()
+        ticket.release()
         plugin.rate_limiter.remove_processing(request_id)
-        plugin.debug_log(f"[命令] 处理完成: user_id={user_id}")
\ No newline at end of file
+        plugin.debug_log("[命令] 处理完成: user_id=%s", user_id)
\ No newline at end of file
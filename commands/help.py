@@ -66,10 +66,17 @@ async def help_command(
   - /ai-gitee ai-edit 让这张照片更有电影感 style
   - /ai-gitee ai-edit 保持人物特征，改变背景为海滩 id
 
+🛑 取消任务:
+  /ai-gitee cancel [任务编号]
+  示例: /ai-gitee cancel        # 取消自己的所有排队和执行中任务
+        /ai-gitee cancel 12     # 只取消指定编号的任务
+  说明: 执行中的 AI 编辑任务会同时取消远程任务
+
 🔄 切换模型:
-  /ai-gitee switch-model <模型名称>
+  /ai-gitee switch-model <模型名称|auto>
   示例: /ai-gitee switch-model z-image-turbo
         /ai-gitee switch-model flux-schnell
+  说明: 配置了模型池时只为自己固定模型，auto 恢复自动选择
 
 📋 模型列表:
   /ai-gitee text2image [--type=<类型>]
@@ -101,6 +108,11 @@ async def help_command(
   - image_video2video: 图像/视频生成视频
   - audio_video2video: 音频/视频生成视频
 
+📊 运行统计（仅管理员）:
+  /ai-gitee stats
+  /ai-gitee lag - 事件循环卡顿报告
+  /ai-gitee profile start [秒数] | stop - CPU 和内存剖析
+
 ❓ 帮助命令:
   /ai-gitee help
 """
@@ -0,0 +1,78 @@
+"""事件循环卡顿报告命令处理模块
+
+处理 /ai-gitee lag 命令，展示事件循环延迟和卡顿归因。
+"""
+
+import time
+from typing import Any, AsyncGenerator
+
+from astrbot.api.event import AstrMessageEvent
+
+
+def _format_ms(value: float | None) -> str:
+    """格式化秒数为毫秒，没有数据时显示 -"""
+    return f"{value * 1000:.0f}ms" if value is not None else "-"
+
+
+def build_loop_report(plugin, stack_depth: int = 6) -> str:
+    """生成事件循环卡顿报告
+
+    Args:
+        plugin: 插件实例
+        stack_depth: 最近一次卡顿展示的调用栈帧数（从最内层开始）
+
+    Returns:
+        报告文本
+    """
+    watchdog = plugin.loop_watchdog
+    if not watchdog.enabled:
+        return "事件循环看门狗未启用，请在配置中设置 loop_stall_threshold_ms。"
+
+    snapshot = watchdog.snapshot()
+    since = time.strftime("%m-%d %H:%M:%S", time.localtime(watchdog.started_at))
+    lines = [
+        "🐢 事件循环卡顿报告",
+        "",
+        f"状态: {'运行中' if snapshot['running'] else '未运行'}, "
+        f"阈值 {_format_ms(snapshot['threshold'])}, 开始于 {since}",
+        f"心跳延迟: p50 {_format_ms(snapshot['lag_p50'])}, p99 {_format_ms(snapshot['lag_p99'])}, "
+        f"最大 {_format_ms(snapshot['max_lag'])}",
+        f"最近卡顿: {snapshot['stalls']} 次",
+    ]
+    if snapshot["top"]:
+        lines.append("")
+        lines.append("归因排行（按累计时间）:")
+        for function, count, total, longest in snapshot["top"]:
+            lines.append(
+                f"- {function}: {count} 次, 累计 {total:.2f}s, 最长 {_format_ms(longest)}"
+            )
+
+    if watchdog.stalls:
+        latest = watchdog.stalls[-1]
+        at = time.strftime("%H:%M:%S", time.localtime(latest.started_at))
+        lines.append("")
+        lines.append(f"最近一次: {at} 卡顿 {_format_ms(latest.duration)}, 归因 {latest.function}")
+        if latest.stack:
+            lines.extend(f"  {frame}" for frame in latest.stack[-stack_depth:])
+        else:
+            lines.append("  （卡顿过短，未抓取到调用栈）")
+    return "\n".join(lines)
+
+
+async def loop_report_command(
+    plugin,
+    event: "AstrMessageEvent",
+) -> AsyncGenerator[Any, None]:
+    """事件循环卡顿报告命令（仅管理员）
+
+    用法: /ai-gitee lag
+
+    Args:
+        plugin: 插件实例，提供 loop_watchdog 属性
+        event: 消息事件对象
+
+    Yields:
+        卡顿报告
+    """
+    plugin.debug_log("[卡顿报告] 收到请求: user_id=%s", event.get_sender_id())
+    yield event.plain_result(build_loop_report(plugin))
@@ -0,0 +1,97 @@
+"""性能剖析命令处理模块
+
+处理 /ai-gitee profile 命令，按需开始或结束 CPU 和内存剖析。
+"""
+
+from typing import Any, AsyncGenerator
+
+from astrbot.api.event import AstrMessageEvent
+
+from ..core.config import PROFILE_DEFAULT_DURATION
+
+
+def format_profile_result(result) -> str:
+    """格式化剖析结果摘要
+
+    Args:
+        result: ProfileResult 实例
+
+    Returns:
+        摘要文本
+    """
+    lines = [
+        f"性能剖析完成，时长 {result.duration:.0f} 秒，采样 {result.samples} 次，"
+        f"命中插件代码 {result.plugin_samples} 次。",
+        f"结果目录: {result.output_dir}",
+        "- cpu.collapsed: 折叠调用栈，可用 flamegraph.pl 或 speedscope 生成火焰图",
+        "- memory_top.txt: 内存增长排行",
+    ]
+    if result.top_functions:
+        lines.append("")
+        lines.append("CPU 热点（栈顶函数）:")
+        for function, count in result.top_functions[:5]:
+            lines.append(f"- {function}: {count}")
+    if result.top_allocations:
+        lines.append("")
+        lines.append("内存增长:")
+        lines.extend(f"- {line}" for line in result.top_allocations)
+    return "\n".join(lines)
+
+
+async def profile_command(
+    plugin,
+    event: "AstrMessageEvent",
+    action: str = "",
+    duration: str = "",
+) -> AsyncGenerator[Any, None]:
+    """性能剖析命令（仅管理员）
+
+    用法: /ai-gitee profile start [秒数]
+          /ai-gitee profile stop
+    示例: /ai-gitee profile start 120
+
+    Args:
+        plugin: 插件实例，提供 profiler, debug_log 等方法
+        event: 消息事件对象
+        action: start 或 stop
+        duration: 剖析时长（秒），到时自动结束
+
+    Yields:
+        剖析状态或结果摘要
+    """
+    profiler = plugin.profiler
+    action = action.strip().lower()
+    plugin.debug_log("[性能剖析] 收到请求: action=%s, duration=%s", action, duration)
+
+    if action == "start":
+        try:
+            seconds = float(duration) if duration else PROFILE_DEFAULT_DURATION
+        except ValueError:
+            yield event.plain_result("时长必须是数字（秒）。使用方法：/ai-gitee profile start [秒数]")
+            return
+        try:
+            seconds = await profiler.start(seconds)
+        except RuntimeError as e:
+            yield event.plain_result(
+                f"{e}，剩余 {profiler.remaining:.0f} 秒，可使用 /ai-gitee profile stop 提前结束。"
+            )
+            return
+        yield event.plain_result(
+            f"已开始性能剖析，{seconds:.0f} 秒后自动结束，"
+            f"也可使用 /ai-gitee profile stop 提前结束。"
+        )
+    elif action == "stop":
+        result = await profiler.stop()
+        if result is not None:
+            yield event.plain_result(format_profile_result(result))
+        elif profiler.last_result is not None:
+            yield event.plain_result(
+                "当前没有进行中的剖析，上一次的结果：\n" + format_profile_result(profiler.last_result)
+            )
+        else:
+            yield event.plain_result("当前没有进行中的剖析。")
+    else:
+        status = f"进行中，剩余 {profiler.remaining:.0f} 秒" if profiler.running else "未运行"
+        yield event.plain_result(
+            f"性能剖析状态：{status}\n使用方法：/ai-gitee profile start [秒数] | stop"
+        )
@@ -0,0 +1,192 @@
+"""运行统计命令处理模块
+
+处理 /ai-gitee stats 命令，展示请求耗时、错误、缓存和队列等统计信息。
+"""
+
+from typing import Any, AsyncGenerator
+
+from astrbot.api.event import AstrMessageEvent
+
+from ..core.degradation import DEGRADE_LEVELS
+from ..core.metrics import (
+    CACHE_REQUESTS,
+    ERRORS,
+    FIRST_IMAGE_LATENCY,
+    REQUEST_LATENCY,
+    UPSTREAM_LATENCY,
+)
+
+MB = 1024 * 1024
+
+
+def _format_seconds(value: float | None) -> str:
+    """格式化秒数，没有数据时显示 -"""
+    return f"{value:.2f}s" if value is not None else "-"
+
+
+async def build_stats_text(plugin) -> str:
+    """生成统计信息文本
+
+    Args:
+        plugin: 插件实例
+
+    Returns:
+        统计信息文本
+    """
+    lines = ["📊 运行统计", "", "请求耗时:"]
+    for labels, count, _ in sorted(REQUEST_LATENCY.series()):
+        command, model = labels
+        lines.append(
+            f"- {command} ({model}): {count} 次, "
+            f"p50 {_format_seconds(REQUEST_LATENCY.quantile(0.5, *labels))}, "
+            f"p95 {_format_seconds(REQUEST_LATENCY.quantile(0.95, *labels))}"
+        )
+
+    if plugin.draft_preview:
+        lines.append("")
+        lines.append("首图耗时（含预览图）:")
+        for labels, count, _ in sorted(FIRST_IMAGE_LATENCY.series()):
+            command, model = labels
+            lines.append(
+                f"- {command} ({model}): {count} 次, "
+                f"p50 {_format_seconds(FIRST_IMAGE_LATENCY.quantile(0.5, *labels))}, "
+                f"p95 {_format_seconds(FIRST_IMAGE_LATENCY.quantile(0.95, *labels))}"
+            )
+
+    lines.append("")
+    lines.append("上游耗时:")
+    for labels, count, _ in sorted(UPSTREAM_LATENCY.series()):
+        operation, model, size, key = labels
+        lines.append(
+            f"- {operation} {model} {size or '-'} {key}: {count} 次, "
+            f"p50 {_format_seconds(UPSTREAM_LATENCY.quantile(0.5, *labels))}, "
+            f"p95 {_format_seconds(UPSTREAM_LATENCY.quantile(0.95, *labels))}"
+        )
+
+    lines.append("")
+    lines.append("错误:")
+    errors = sorted(ERRORS.items())
+    if not errors:
+        lines.append("- 无")
+    for (command, error), count in errors:
+        lines.append(f"- {command}/{error}: {count:.0f}")
+
+    lines.append("")
+    lines.append("缓存:")
+    caches: dict[str, dict[str, float]] = {}
+    for (cache, result), count in CACHE_REQUESTS.items():
+        caches.setdefault(cache, {})[result] = count
+    if not caches:
+        lines.append("- 无")
+    for cache, results in sorted(caches.items()):
+        hits = results.get("hit", 0.0)
+        total = hits + results.get("miss", 0.0)
+        ratio = hits / total * 100 if total else 0.0
+        lines.append(f"- {cache}: 命中率 {ratio:.1f}% ({hits:.0f}/{total:.0f})")
+
+    routing = plugin.api_client.router.snapshot()
+    if routing["enabled"] or routing["decisions"]:
+        lines.append("")
+        lines.append(
+            f"模型路由: 固定用户 {routing['user_pins']} 个, 固定命令 {len(routing['command_pins'])} 个"
+        )
+        for model in sorted(set(routing["models"]) | set(routing["decisions"])):
+            reasons = routing["decisions"].get(model, {})
+            decided = ", ".join(
+                f"{reason}={count:.0f}" for reason, count in sorted(reasons.items())
+            )
+            stats = routing["models"].get(model)
+            if stats is None:
+                lines.append(f"- {model} (不在模型池): 决策 {decided or '-'}")
+                continue
+            lines.append(
+                f"- {model} (权重 {stats['weight']:g}): 平均耗时 {_format_seconds(stats['latency'])}, "
+                f"错误率 {stats['error_rate'] * 100:.1f}%, 成功 {stats['samples']} 次, "
+                f"失败 {stats['failures']} 次, 决策 {decided or '-'}"
+            )
+
+    queue = plugin.scheduler.snapshot()
+    queued = ", ".join(f"{lane}={count}" for lane, count in queue["queued"].items())
+    admission = plugin.api_client.admission.snapshot()
+    memory = plugin.api_client.image_manager.memory.snapshot()
+    limit = f"{memory['limit'] / MB:.0f} MB" if memory["limit"] else "不限"
+    lines.extend([
+        "",
+        f"任务队列: 排队 {queued}; 执行中 {queue['running']}/{queue['max_concurrency']}",
+        f"上游并发: 窗口 {admission['global']['limit']}, 进行中 {admission['global']['in_flight']}, "
+        f"等待中 {admission['waiting']}, 等待 p95 {admission['wait_p95']:.2f}s",
+        f"图片内存: 当前 {memory['used'] / MB:.1f} MB, 峰值 {memory['peak'] / MB:.1f} MB, "
+        f"预算 {limit}, 等待 {memory.get('waited', 0):.0f} 次, 落盘 {memory.get('spilled', 0):.0f} 次",
+    ])
+
+    endpoints = plugin.api_client.endpoints.snapshot()
+    if len(endpoints) > 1 or endpoints[0]["state"] != "closed":
+        lines.append("")
+        lines.append("API 地址:")
+        for endpoint in endpoints:
+            state = {"closed": "正常", "open": "熔断", "half_open": "试探中"}[endpoint["state"]]
+            if endpoint["state"] == "open":
+                state += f"（{endpoint['retry_after']:.0f} 秒后试探）"
+            lines.append(
+                f"- {endpoint['base_url']}: {state}, 连续失败 {endpoint['failures']} 次"
+            )
+
+    shared = plugin.shared_state
+    if shared is not None:
+        client = plugin.api_client
+        usage = await shared.key_usage(client.api_keys)
+        keys = ", ".join(f"{client._key_label(key)} {count}" for key, count in usage.items())
+        lines.append(f"共享状态: {shared.path}; 本分钟 Key 用量（所有实例）: {keys or '-'}")
+
+    dispatcher = plugin.job_dispatcher
+    if dispatcher is not None:
+        jobs = await dispatcher.snapshot()
+        lines.append(
+            f"多进程任务队列: 本实例等待结果 {jobs['pending']}, "
+            f"队列中排队 {jobs.get('queued', '-')} / 执行中 {jobs.get('running', '-')}（所有实例）, "
+            f"本实例工作进程 {plugin.worker_pool.alive_count}/{plugin.worker_pool.workers}"
+        )
+
+    hedge = plugin.api_client.hedge
+    if hedge.enabled:
+        hedges = hedge.snapshot()
+        lines.append(
+            f"请求对冲: 主请求胜出 {hedges.get('primary_won', 0):.0f} 次, "
+            f"对冲请求胜出 {hedges.get('hedge_won', 0):.0f} 次, "
+            f"均失败 {hedges.get('both_failed', 0):.0f} 次, "
+            f"复用落败结果 {hedges.get('spare_used', 0):.0f} 次（暂存 {hedges['spares']:.0f} 张）, "
+            f"预算不足 {hedges.get('budget_exhausted', 0):.0f} 次, 剩余额度 {hedges['credits']:.2f}"
+        )
+
+    quality = plugin.api_client.quality
+    if quality.enabled:
+        size_drop, steps_ratio = DEGRADE_LEVELS[quality.level]
+        lines.append(
+            f"画质降级: 等级 {quality.level}/{len(DEGRADE_LEVELS) - 1}, 负载压力 {quality.pressure:.2f}, "
+            f"尺寸下调 {size_drop} 档, 步数 ×{steps_ratio:g}"
+        )
+
+    catalog = plugin.style_catalog
+    lines.append(f"风格库: {len(catalog)} 个风格, 重新加载 {catalog.reloads} 次")
+    for name, error in sorted(catalog.errors.items())[:10]:
+        lines.append(f"- {name}: {error}")
+    return "\n".join(lines)
+
+
+async def stats_command(
+    plugin,
+    event: "AstrMessageEvent",
+) -> AsyncGenerator[Any, None]:
+    """运行统计命令（仅管理员）
+
+    用法: /ai-gitee stats
+
+    Args:
+        plugin: 插件实例，提供 scheduler, api_client, style_catalog 等属性
+        event: 消息事件对象
+
+    Yields:
+        统计信息
+    """
+    plugin.debug_log("[运行统计] 收到请求: user_id=%s", event.get_sender_id())
+    yield event.plain_result(await build_stats_text(plugin))
@@ -3,37 +3,30 @@
 处理 /ai-gitee style 命令，支持多种风格转换。
 """
 
-import json
-import os
+import asyncio
 import time
+from pathlib import Path
 from typing import Any, AsyncGenerator
 
 from astrbot.api import logger
 from astrbot.api.event import AstrMessageEvent
 from astrbot.api.message_components import Plain, Image
 from ..core import check_rate_limit, parse_prompt_and_size
-from ..core.command_utils import extract_images_from_message
+from ..core.command_utils import (
+    extract_images_from_message,
+    format_phase_breakdown,
+    format_queue_position,
+    plan_quality,
+    record_completion,
+    record_failure,
+    submit_job,
+)
+from ..core.deadline import with_deadline
+from ..core.tracing import trace_span
 
 
-def _load_style_prompts() -> dict:
-    """从 JSON 文件加载风格提示词"""
-    # 获取当前文件所在目录
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    prompts_file = os.path.join(current_dir, "style_prompts.json")
-
-    try:
-        with open(prompts_file, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        logger.error(f"风格提示词文件未找到: {prompts_file}")
-        return {}
-    except json.JSONDecodeError as e:
-        logger.error(f"风格提示词文件解析失败: {e}")
-        return {}
-
-
-# 风格提示词字典（从 JSON 文件加载）
-STYLE_PROMPTS = _load_style_prompts()
+# 风格提示词文件，由插件的 StyleCatalog 加载并在修改后自动重新加载
+STYLE_PROMPTS_FILE = Path(__file__).resolve().parent / "style_prompts.json"
 
 
 async def style_command(
@@ -66,7 +59,7 @@ async def style_command(
     支持比例: 1:1, 4:3, 3:4, 3:2, 2:3, 16:9, 9:16
 
     Args:
-        plugin: 插件实例，提供 api_client, rate_limiter, debug_log 等方法
+        plugin: 插件实例，提供 api_client, rate_limiter, style_catalog, debug_log 等方法
         event: 消息事件对象
         style_name: 风格名称
         prompt: 自定义描述，可包含比例参数（格式：[描述] [比例]）
@@ -77,48 +70,39 @@ async def style_command(
     user_id = event.get_sender_id()
     request_id = user_id
 
-    plugin.debug_log(f"[风格转换命令] 收到请求: user_id={user_id}, style_name={style_name}, prompt={prompt[:50] if prompt else ''}...")
+    plugin.debug_log(
+        "[风格转换命令] 收到请求: user_id=%s, style_name=%s, prompt=%.50s...",
+        user_id, style_name, prompt or "",
+    )
 
     # 检查速率限制和防抖
-    async for result in check_rate_limit(plugin, event, "风格转换命令", request_id):
+    async for result in check_rate_limit(plugin, event, "风格转换命令", request_id, "style"):
         yield result
         return
 
+    ticket = None
+    root = plugin.tracer.start_trace("style", user_id=user_id, style=style_name)
     try:
         # 检查风格名称
+        catalog = plugin.style_catalog
         if not style_name:
             # 列出所有可用的风格
-            style_list = "\n".join(f"- {name}" for name in sorted(STYLE_PROMPTS.keys()))
-            yield event.plain_result(
-                f"请指定风格名称！\n\n"
-                f"使用方法：/ai-gitee style <风格名称> [自定义描述] [比例]\n\n"
-                f"可用风格：\n{style_list}\n\n"
-                f"支持比例：1:1, 4:3, 3:4, 3:2, 2:3, 16:9, 9:16\n\n"
-                f"示例：\n"
-                f"/ai-gitee style 手办化\n"
-                f"/ai-gitee style Q版化 一个可爱的女孩\n"
-                f"/ai-gitee style cos化 猫娘 9:16\n\n"
-                f"提示：发送图片时将进行图生图转换，不发送图片则为文生图"
-            )
+            yield event.plain_result(catalog.usage_text)
             return
 
         # 检查风格是否存在
-        if style_name not in STYLE_PROMPTS:
-            available_styles = ", ".join(sorted(STYLE_PROMPTS.keys()))
-            yield event.plain_result(
-                f"风格 '{style_name}' 不存在！\n\n"
-                f"可用风格：{available_styles}\n\n"
-                f"使用方法：/ai-gitee style <风格名称> [自定义描述] [比例]"
-            )
+        style_prompt = catalog.get(style_name)
+        if style_prompt is None:
+            yield event.plain_result(catalog.unknown_style_text(style_name))
             return
 
         # 获取消息中的图片
-        image_paths = await extract_images_from_message(event)
-        plugin.debug_log(f"[风格转换命令] 检测到 {len(image_paths)} 张图片")
+        image_paths = await extract_images_from_message(
+            event, plugin.api_client.image_manager.memory
+        )
+        plugin.debug_log("[风格转换命令] 检测到 %s 张图片", len(image_paths))
 
-        # 获取风格提示词
-        style_prompt = STYLE_PROMPTS[style_name]
-        plugin.debug_log(f"[风格转换命令] 使用风格: {style_name}")
+        plugin.debug_log("[风格转换命令] 使用风格: %s", style_name)
 
         # 解析提示词和目标尺寸
         target_size = plugin.api_client.default_size
@@ -128,7 +112,7 @@ async def style_command(
                 prompt, target_size = parse_prompt_and_size(plugin, prompt)
                 final_prompt = f"{prompt}, {style_prompt}"
             except ValueError as e:
-                plugin.debug_log(f"[风格转换命令] 参数解析失败: {e}")
+                plugin.debug_log("[风格转换命令] 参数解析失败: %s", e)
                 yield event.plain_result(f"{e}。使用方法：/ai-gitee style <风格名称> [自定义描述] [比例]")
                 return
         else:
@@ -136,10 +120,26 @@ async def style_command(
             final_prompt = style_prompt
 
         plugin.debug_log(
-            f"[风格转换命令] 开始生成风格转换图片: user_id={user_id}, "
-            f"style={style_name}, prompt={final_prompt[:80]}..., has_image={bool(image_paths)}, size={target_size}"
+            "[风格转换命令] 开始生成风格转换图片: user_id=%s, style=%s, prompt=%.80s..., has_image=%s, size=%s",
+            user_id, style_name, final_prompt, bool(image_paths), target_size,
         )
 
+        # 选择模型并提交到任务队列，图生图固定使用编辑模型
+        if image_paths:
+            model = "Qwen-Image-Edit-2511"
+        else:
+            model = plugin.api_client.router.route(user_id, "style", plugin.api_client.model)
+        ticket, rejection = submit_job(plugin, event, "style", model=model)
+        root.set_attribute("model", model)
+        if ticket is None:
+            yield event.plain_result(rejection)
+            return
+        queue_message = format_queue_position(ticket)
+        if queue_message:
+            yield event.plain_result(queue_message)
+        with trace_span("queue.wait"):
+            await with_deadline("queue", ticket.wait(), ticket.deadline)
+
         # 先发送提示消息
         if image_paths:
             yield event.plain_result(f"正在使用 {style_name} 风格转换图片（{len(image_paths)}张），请稍候...")
@@ -147,11 +147,12 @@ async def style_command(
             yield event.plain_result(f"正在使用 {style_name} 风格生成图片，请稍候...")
 
         start_time = time.time()
+        note = ""
 
         # 根据是否有图片选择不同的 API 调用方式
         if image_paths:
             # 图生图：使用 edit_image API
-            image_path = await plugin.api_client.edit_image(
+            image_path = await ticket.run(plugin.api_client.edit_image(
                 prompt=final_prompt,
                 image_paths=image_paths,
                 task_types=["style"],
@@ -159,29 +160,42 @@ async def style_command(
                 num_inference_steps=4,
                 guidance_scale=1.0,
                 download_urls=plugin.download_image_urls,
-            )
+            ))
         else:
-            # 文生图：使用 generate_image API
-            image_path = await plugin.api_client.generate_image(final_prompt, size=target_size)
+            # 文生图：使用 generate_image API，按当前负载降级
+            plan = plan_quality(plugin, target_size)
+            note = plan.describe()
+            image_path = await ticket.run(plugin.api_client.generate_image(
+                final_prompt, size=plan.size, model=model, steps=plan.steps
+            ))
 
         end_time = time.time()
         elapsed_time = end_time - start_time
+        record_completion(plugin, "style", model, elapsed_time)
 
-        plugin.debug_log(
-            f"[风格转换命令] 图片生成成功: path={image_path}, "
-            f"耗时={elapsed_time:.2f}秒"
-        )
+        plugin.debug_log("[风格转换命令] 图片生成成功: path=%s, 耗时=%.2f秒", image_path, elapsed_time)
 
         # 将图片和耗时信息合并到一个消息中发送
-        yield event.chain_result([
-            Image.fromFileSystem(image_path),  # type: ignore
-            Plain(f"{style_name} 风格图片生成完成，耗时：{elapsed_time:.2f}秒")
-        ])
-
+        breakdown = format_phase_breakdown(plugin, root)
+        with trace_span("platform.send"):
+            yield event.chain_result([
+                Image.fromFileSystem(image_path),  # type: ignore
+                Plain(f"{style_name} 风格图片生成完成，耗时：{elapsed_time:.2f}秒{note}{breakdown}")
+            ])
+
+    except asyncio.CancelledError:
+        if ticket is None or not ticket.cancelled:
+            raise
+        plugin.debug_log("[风格转换命令] 任务已取消: user_id=%s", user_id)
+        yield event.plain_result("任务已取消。")
     except Exception as e:
+        record_failure("style", e)
         logger.error(f"风格转换图片生成失败: {e}", exc_info=True)
-        plugin.debug_log(f"[风格转换命令] 图片生成失败: error={str(e)}")
+        plugin.debug_log("[风格转换命令] 图片生成失败: error=%s", e)
         yield event.plain_result(f"风格转换图片生成失败: {str(e)}")
     finally:
+        root.end()
+        if ticket is not None:
+            ticket.release()
         plugin.rate_limiter.remove_processing(request_id)
-        plugin.debug_log(f"[风格转换命令] 处理完成: user_id={user_id}")
\ No newline at end of file
+        plugin.debug_log("[风格转换命令] 处理完成: user_id=%s", user_id)
\ No newline at end of file
@@ -15,11 +15,14 @@ async def switch_model_command(
 ) -> AsyncGenerator[Any, None]:
     """切换模型命令
 
-    切换当前使用的 AI 模型。
+    切换当前使用的 AI 模型。配置了模型池（model_pool）时只为当前用户固定模型，
+    不影响其他用户的路由，模型必须在模型池中；使用 auto 取消固定，恢复自动路由。
+    未配置模型池时，模型名称需在 Gitee AI 的文生图模型列表中（列表获取失败时不校验）。
 
-    用法: /ai-gitee switch-model <模型名称>
+    用法: /ai-gitee switch-model <模型名称|auto>
     示例: /ai-gitee switch-model z-image-turbo
           /ai-gitee switch-model flux-schnell
+          /ai-gitee switch-model auto
 
     Args:
         plugin: 插件实例，提供 api_client, debug_log 等方法
@@ -35,12 +38,41 @@ async def switch_model_command(
         return
 
     user_id = event.get_sender_id()
-    plugin.debug_log(f"[切换模型] 收到请求: user_id={user_id}, model_name={model_name}")
+    plugin.debug_log("[切换模型] 收到请求: user_id=%s, model_name=%s", user_id, model_name)
+
+    router = plugin.api_client.router
+    if router.enabled:
+        if model_name == "auto":
+            old_model = router.unpin_user(user_id)
+            plugin.debug_log("[切换模型] 取消固定模型: user_id=%s, model=%s", user_id, old_model)
+            yield event.plain_result("✅ 已恢复自动选择模型")
+            return
+        if model_name not in router.models:
+            plugin.debug_log("[切换模型] 模型不在模型池中: %s", model_name)
+            yield event.plain_result(
+                f"模型 {model_name} 不在模型池中，可选：{', '.join(router.models)}, auto"
+            )
+            return
+        old_model = router.user_pins.get(user_id) or "自动"
+        router.pin_user(user_id, model_name)
+        plugin.debug_log("[切换模型] 固定模型: user_id=%s, %s -> %s", user_id, old_model, model_name)
+        yield event.plain_result(
+            f"✅ 你的模型已切换：{old_model} → {model_name}（发送 switch-model auto 恢复自动选择）"
+        )
+        return
+
+    known_models = await plugin.model_lister.known_models()
+    if known_models is not None and model_name not in known_models:
+        plugin.debug_log("[切换模型] 未知模型: %s", model_name)
+        yield event.plain_result(
+            f"未找到文生图模型 {model_name}，使用 /ai-gitee text2image 查看可用模型"
+        )
+        return
 
     # 更新插件中的模型
     old_model = plugin.api_client.model
     plugin.api_client.model = model_name
 
-    plugin.debug_log(f"[切换模型] 模型切换成功: {old_model} -> {model_name}")
+    plugin.debug_log("[切换模型] 模型切换成功: %s -> %s", old_model, model_name)
 
     yield event.plain_result(f"✅ 模型已切换：{old_model} → {model_name}")
\ No newline at end of file
@@ -57,16 +57,16 @@ async def list_models_command(
     user_id = event.get_sender_id()
     request_id = user_id
 
-    plugin.debug_log(f"[模型列表] 收到请求: user_id={user_id}, type_param={type_param}")
+    plugin.debug_log("[模型列表] 收到请求: user_id=%s, type_param=%s", user_id, type_param)
 
     # 防抖检查
-    if plugin.rate_limiter.check_debounce(request_id):
-        plugin.debug_log(f"[模型列表] 请求被防抖拦截: user_id={user_id}")
+    if await plugin.rate_limiter.is_debounced(request_id):
+        plugin.debug_log("[模型列表] 请求被防抖拦截: user_id=%s", user_id)
         yield event.plain_result("操作太快了，请稍后再试。")
         return
 
     if plugin.rate_limiter.is_processing(request_id):
-        plugin.debug_log(f"[模型列表] 用户正在处理中: user_id={user_id}")
+        plugin.debug_log("[模型列表] 用户正在处理中: user_id=%s", user_id)
         yield event.plain_result("您有正在进行的请求，请稍候...")
         return
 
@@ -81,4 +81,4 @@ async def list_models_command(
         yield event.plain_result(result)
     finally:
         plugin.rate_limiter.remove_processing(request_id)
-        plugin.debug_log(f"[模型列表] 处理完成: user_id={user_id}")
\ No newline at end of file
+        plugin.debug_log("[模型列表] 处理完成: user_id=%s", user_id)
\ No newline at end of file
@@ -3,41 +3,195 @@
 提供配置管理、客户端管理、速率限制、图片管理等核心功能。
 """
 
+from .circuit_breaker import CircuitOpenError, EndpointPool
 from .client_manager import ClientManager
-from .command_utils import check_rate_limit, parse_prompt_and_size
+from .concurrency import AdmissionController
+from .command_utils import check_rate_limit, get_rate_limit_rejection, parse_prompt_and_size
 from .config import (
     CLEANUP_INTERVAL,
+    CIRCUIT_OPEN_SECONDS,
     DEFAULT_BASE_URL,
+    DEFAULT_CIRCUIT_FAILURE_THRESHOLD,
+    DEFAULT_CIRCUIT_SLOW_CALL_SECONDS,
+    DEFAULT_COMMAND_COSTS,
+    DEFAULT_DEBUG_SAMPLE_EVERY,
+    DEFAULT_DEGRADE_LATENCY,
+    DEFAULT_DEGRADE_QUEUE_DEPTH,
+    DEFAULT_DRAFT_PREVIEW,
+    DEFAULT_GLOBAL_RATE_LIMIT,
+    DEFAULT_GROUP_RATE_LIMIT,
+    DEFAULT_HEDGE_BUDGET,
+    DEFAULT_HEDGE_PERCENTILE,
+    DEFAULT_IMAGE_MEMORY_BUDGET_MB,
+    DEFAULT_LOOP_STALL_THRESHOLD_MS,
     DEFAULT_INFERENCE_STEPS,
+    DEFAULT_JOB_CONCURRENCY,
+    DEFAULT_JOB_QUEUE_MODE,
+    DEFAULT_JOB_QUEUE_PATH,
+    DEFAULT_JOB_QUEUE_WORKERS,
+    DEFAULT_LOAD_SHED_MODE,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_MAX_ESTIMATED_WAIT,
+    DEFAULT_MAX_JOBS_PER_USER,
+    DEFAULT_METRICS_EXPORT_INTERVAL,
+    DEFAULT_MIRROR_BASE_URLS,
     DEFAULT_MODEL,
+    DEFAULT_MODEL_PINS,
+    DEFAULT_MODEL_POOL,
     DEFAULT_NEGATIVE_PROMPT,
+    DEFAULT_PER_KEY_CONCURRENCY,
+    DEFAULT_SHARED_STATE_PATH,
+    DEFAULT_REQUEST_DEADLINES,
+    DEFAULT_SHUTDOWN_GRACE_SECONDS,
     DEFAULT_SIZE,
+    DEFAULT_TRACE_IN_REPLY,
+    DEFAULT_TRACE_SAMPLE_RATE,
+    DEFAULT_TRAFFIC_RECORD,
+    DEFAULT_TRAFFIC_RECORD_PROMPTS,
+    DEFAULT_USER_RATE_LIMIT,
     DEBOUNCE_SECONDS,
+    JOB_QUEUE_FILE,
+    LOOP_WATCHDOG_INTERVAL,
     MAX_CACHED_IMAGES,
     OPERATION_CACHE_TTL,
     PLUGIN_NAME,
+    PROFILE_MAX_DURATION,
+    PROFILE_SAMPLE_INTERVAL,
+    PROFILE_TOP_N,
+    ROUTER_EXPLORE_RATE,
+    ROUTER_MIN_SAMPLES,
+    SHUTDOWN_CANCEL_TIMEOUT,
+    STYLE_RELOAD_CHECK_INTERVAL,
     SUPPORTED_RATIOS,
     parse_api_keys,
+    parse_base_urls,
+    parse_command_costs,
+    parse_model_pins,
+    parse_model_pool,
+    parse_rate_limit,
+    parse_request_deadlines,
 )
+from .deadline import Deadline, DeadlineExceeded, current_deadline
+from .debug_logger import DebugLogger, configure_debug_logging, parse_debug_levels
+from .degradation import QualityGovernor, QualityPlan
+from .hedging import HedgePolicy
 from .image_manager import ImageManager
-from .rate_limiter import RateLimiter
+from .job_queue import JobDispatcher, JobQueue
+from .load_shedder import LoadShedder
+from .memory_budget import MemoryBudget
+from .model_router import ModelRouter
+from .metrics import MetricsExporter, MetricsRegistry, registry
+from .profiler import PluginProfiler
+from .rate_limiter import RateLimiter, TokenBucket
+from .scheduler import JobScheduler, JobTicket, QueueFullError, SchedulerClosedError
+from .shared_state import SharedState
+from .shutdown import format_shutdown_summary, write_shutdown_journal
+from .style_catalog import StyleCatalog
+from .tracing import Tracer, current_span, trace_span
+from .traffic_recorder import TrafficRecorder
+from .watchdog import LoopWatchdog
 
 __all__ = [
     "CLEANUP_INTERVAL",
+    "CIRCUIT_OPEN_SECONDS",
     "DEFAULT_BASE_URL",
+    "DEFAULT_CIRCUIT_FAILURE_THRESHOLD",
+    "DEFAULT_CIRCUIT_SLOW_CALL_SECONDS",
+    "DEFAULT_COMMAND_COSTS",
+    "DEFAULT_DEBUG_SAMPLE_EVERY",
+    "DEFAULT_DEGRADE_LATENCY",
+    "DEFAULT_DEGRADE_QUEUE_DEPTH",
+    "DEFAULT_DRAFT_PREVIEW",
+    "DEFAULT_GLOBAL_RATE_LIMIT",
+    "DEFAULT_GROUP_RATE_LIMIT",
+    "DEFAULT_HEDGE_BUDGET",
+    "DEFAULT_HEDGE_PERCENTILE",
+    "DEFAULT_IMAGE_MEMORY_BUDGET_MB",
+    "DEFAULT_LOOP_STALL_THRESHOLD_MS",
     "DEFAULT_INFERENCE_STEPS",
+    "DEFAULT_JOB_CONCURRENCY",
+    "DEFAULT_JOB_QUEUE_MODE",
+    "DEFAULT_JOB_QUEUE_PATH",
+    "DEFAULT_JOB_QUEUE_WORKERS",
+    "DEFAULT_LOAD_SHED_MODE",
+    "DEFAULT_MAX_CONCURRENCY",
+    "DEFAULT_MAX_ESTIMATED_WAIT",
+    "DEFAULT_MAX_JOBS_PER_USER",
+    "DEFAULT_METRICS_EXPORT_INTERVAL",
+    "DEFAULT_MIRROR_BASE_URLS",
     "DEFAULT_MODEL",
+    "DEFAULT_MODEL_PINS",
+    "DEFAULT_MODEL_POOL",
     "DEFAULT_NEGATIVE_PROMPT",
+    "DEFAULT_PER_KEY_CONCURRENCY",
+    "DEFAULT_SHARED_STATE_PATH",
+    "DEFAULT_REQUEST_DEADLINES",
+    "DEFAULT_SHUTDOWN_GRACE_SECONDS",
     "DEFAULT_SIZE",
+    "DEFAULT_TRACE_IN_REPLY",
+    "DEFAULT_TRACE_SAMPLE_RATE",
+    "DEFAULT_TRAFFIC_RECORD",
+    "DEFAULT_TRAFFIC_RECORD_PROMPTS",
+    "DEFAULT_USER_RATE_LIMIT",
     "DEBOUNCE_SECONDS",
+    "JOB_QUEUE_FILE",
+    "LOOP_WATCHDOG_INTERVAL",
     "MAX_CACHED_IMAGES",
     "OPERATION_CACHE_TTL",
     "PLUGIN_NAME",
+    "PROFILE_MAX_DURATION",
+    "PROFILE_SAMPLE_INTERVAL",
+    "PROFILE_TOP_N",
+    "ROUTER_EXPLORE_RATE",
+    "ROUTER_MIN_SAMPLES",
+    "SHUTDOWN_CANCEL_TIMEOUT",
+    "STYLE_RELOAD_CHECK_INTERVAL",
     "SUPPORTED_RATIOS",
     "parse_api_keys",
+    "parse_base_urls",
+    "parse_command_costs",
+    "parse_model_pins",
+    "parse_model_pool",
+    "parse_rate_limit",
+    "parse_request_deadlines",
+    "AdmissionController",
+    "CircuitOpenError",
     "ClientManager",
+    "DebugLogger",
+    "Deadline",
+    "DeadlineExceeded",
+    "EndpointPool",
+    "HedgePolicy",
     "ImageManager",
+    "JobDispatcher",
+    "JobQueue",
+    "JobScheduler",
+    "JobTicket",
+    "LoadShedder",
+    "LoopWatchdog",
+    "MemoryBudget",
+    "MetricsExporter",
+    "MetricsRegistry",
+    "ModelRouter",
+    "PluginProfiler",
+    "QualityGovernor",
+    "QualityPlan",
+    "QueueFullError",
     "RateLimiter",
+    "SchedulerClosedError",
+    "SharedState",
+    "StyleCatalog",
+    "TokenBucket",
+    "Tracer",
+    "TrafficRecorder",
     "check_rate_limit",
+    "configure_debug_logging",
+    "current_deadline",
+    "current_span",
+    "format_shutdown_summary",
+    "parse_debug_levels",
+    "get_rate_limit_rejection",
     "parse_prompt_and_size",
+    "registry",
+    "write_shutdown_journal",
 ]
\ No newline at end of file
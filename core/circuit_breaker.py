@@ -0,0 +1,287 @@
+"""熔断模块
+
+为每个 API 基础 URL 维护熔断器：连续失败或慢调用达到阈值后熔断，熔断期间快速失败，
+冷却后放行单个试探请求（半开），试探成功则恢复。配置了镜像地址时自动切换到可用的地址。
+"""
+
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from .deadline import DeadlineExceeded
+from .debug_logger import DebugLogger
+from .metrics import registry
+
+# 熔断器状态
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+CIRCUIT_TRANSITIONS = registry.counter(
+    "circuit_transitions_total", "熔断器状态切换次数", ("base_url", "state")
+)
+CIRCUIT_REJECTIONS = registry.counter("circuit_rejections_total", "因熔断被快速拒绝的请求数")
+
+
+def is_endpoint_error(exc: BaseException) -> bool:
+    """判断异常是否说明服务端点不可用（超时、连接失败或 5xx）
+
+    认证失败、429 等与 API Key 相关的错误不计入熔断。
+
+    Args:
+        exc: 捕获到的异常
+
+    Returns:
+        True 表示应计为端点失败
+    """
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    for attr in ("status_code", "status"):
+        status = getattr(exc, attr, None)
+        if isinstance(status, int) and status >= 500:
+            return True
+    name = type(exc).__name__
+    return "Timeout" in name or "Connection" in name or "ServerError" in name
+
+
+class CircuitOpenError(RuntimeError):
+    """所有端点都处于熔断状态"""
+
+    def __init__(self, retry_after: float) -> None:
+        """初始化异常
+
+        Args:
+            retry_after: 最早可以重试的秒数
+        """
+        self.retry_after = retry_after
+        super().__init__(f"Gitee AI 服务暂时不可用，请约 {max(1, round(retry_after))} 秒后再试。")
+
+
+class CircuitBreaker:
+    """单个基础 URL 的熔断器"""
+
+    def __init__(
+        self,
+        base_url: str,
+        failure_threshold: int = 5,
+        slow_call_seconds: float = 0.0,
+        open_seconds: float = 30.0,
+    ) -> None:
+        """初始化熔断器
+
+        Args:
+            base_url: API 基础 URL
+            failure_threshold: 连续失败（含慢调用）达到该次数时熔断，0 表示不熔断
+            slow_call_seconds: 耗时超过该秒数的成功调用计为失败，0 表示不统计慢调用
+            open_seconds: 熔断持续时间（秒），之后进入半开状态
+        """
+        self.base_url = base_url
+        self.failure_threshold = max(0, failure_threshold)
+        self.slow_call_seconds = max(0.0, slow_call_seconds)
+        self.open_seconds = open_seconds
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def _transition(self, state: str, now: float) -> None:
+        """切换状态"""
+        self.state = state
+        if state == STATE_OPEN:
+            self.opened_at = now
+        CIRCUIT_TRANSITIONS.inc(self.base_url, state)
+
+    def retry_after(self, now: float) -> float:
+        """距离下次允许试探的秒数"""
+        if self.state != STATE_OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.open_seconds - now)
+
+    def available(self, now: float) -> bool:
+        """是否可能放行请求（不占用半开试探名额）"""
+        if self.state == STATE_CLOSED:
+            return True
+        if self.state == STATE_OPEN:
+            return now >= self.opened_at + self.open_seconds
+        return not self._probing
+
+    def allow(self, now: float) -> bool:
+        """判断是否放行请求，半开状态下同一时间只放行一个试探请求
+
+        Args:
+            now: 当前时间戳
+
+        Returns:
+            True 表示放行
+        """
+        if self.state == STATE_CLOSED:
+            return True
+        if self.state == STATE_OPEN:
+            if now < self.opened_at + self.open_seconds:
+                return False
+            self._transition(STATE_HALF_OPEN, now)
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self, seconds: float, now: float) -> None:
+        """记录一次成功调用
+
+        Args:
+            seconds: 耗时（秒）
+            now: 当前时间戳
+        """
+        if self.slow_call_seconds and seconds > self.slow_call_seconds:
+            self.record_failure(now)
+            return
+        self._probing = False
+        self.failures = 0
+        if self.state != STATE_CLOSED:
+            self._transition(STATE_CLOSED, now)
+
+    def record_failure(self, now: float) -> None:
+        """记录一次端点失败
+
+        Args:
+            now: 当前时间戳
+        """
+        self._probing = False
+        self.failures += 1
+        if self.state == STATE_HALF_OPEN:
+            self._transition(STATE_OPEN, now)
+        elif (
+            self.state == STATE_CLOSED
+            and self.failure_threshold
+            and self.failures >= self.failure_threshold
+        ):
+            self._transition(STATE_OPEN, now)
+
+    def release(self) -> None:
+        """释放半开试探名额（请求被取消或结果与端点健康无关时）"""
+        self._probing = False
+
+
+class EndpointPool:
+    """按配置顺序排列的端点池，优先使用主地址，熔断时切换到镜像地址"""
+
+    def __init__(
+        self,
+        base_urls: list[str],
+        failure_threshold: int = 5,
+        slow_call_seconds: float = 0.0,
+        open_seconds: float = 30.0,
+        debug_mode: bool = False,
+    ) -> None:
+        """初始化端点池
+
+        Args:
+            base_urls: 基础 URL 列表，第一个为主地址
+            failure_threshold: 连续失败达到该次数时熔断，0 表示不熔断
+            slow_call_seconds: 耗时超过该秒数的调用计为失败，0 表示不统计慢调用
+            open_seconds: 熔断持续时间（秒）
+            debug_mode: 是否启用 Debug 日志
+        """
+        self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("EndpointPool", self.debug_mode)
+        urls = list(dict.fromkeys(url.rstrip("/") for url in base_urls if url))
+        self.breakers = [
+            CircuitBreaker(url, failure_threshold, slow_call_seconds, open_seconds) for url in urls
+        ]
+        self.debug_log(
+            "初始化端点池: base_urls=%s, failure_threshold=%s, slow_call_seconds=%s",
+            urls, failure_threshold, slow_call_seconds,
+        )
+
+    def available(self) -> bool:
+        """是否有端点可能放行请求，用于在排队前快速失败"""
+        now = time.time()
+        return any(breaker.available(now) for breaker in self.breakers)
+
+    def retry_after(self) -> float:
+        """距离最早的端点允许试探的秒数"""
+        now = time.time()
+        return min(breaker.retry_after(now) for breaker in self.breakers)
+
+    def acquire(self) -> CircuitBreaker:
+        """选择第一个放行请求的端点
+
+        Returns:
+            端点的熔断器
+
+        Raises:
+            CircuitOpenError: 所有端点都处于熔断状态
+        """
+        now = time.time()
+        for breaker in self.breakers:
+            if breaker.allow(now):
+                if breaker is not self.breakers[0]:
+                    self.debug_log.sampled("使用备用地址: %s", breaker.base_url)
+                return breaker
+        CIRCUIT_REJECTIONS.inc()
+        raise CircuitOpenError(self.retry_after())
+
+    def record(
+        self, breaker: CircuitBreaker, seconds: float, error: Optional[BaseException] = None
+    ) -> None:
+        """记录一次调用结果
+
+        Args:
+            breaker: 调用使用的端点
+            seconds: 耗时（秒）
+            error: 调用抛出的异常，成功时为 None
+        """
+        now = time.time()
+        previous = breaker.state
+        if error is None:
+            breaker.record_success(seconds, now)
+        elif isinstance(error, (asyncio.CancelledError, DeadlineExceeded)):
+            # 请求被取消或请求总时限耗尽，不能说明端点的状况
+            breaker.release()
+        elif is_endpoint_error(error):
+            breaker.record_failure(now)
+        else:
+            # 4xx 等错误说明端点可以正常响应
+            breaker.record_success(0.0, now)
+        if breaker.state != previous:
+            self.debug_log(
+                "熔断器状态变化: base_url=%s, %s -> %s, failures=%s",
+                breaker.base_url, previous, breaker.state, breaker.failures,
+            )
+
+    @contextmanager
+    def guard(self) -> Iterator[CircuitBreaker]:
+        """选择端点并记录调用结果
+
+        Yields:
+            端点的熔断器，使用其 base_url 发送请求
+
+        Raises:
+            CircuitOpenError: 所有端点都处于熔断状态
+        """
+        breaker = self.acquire()
+        start = time.perf_counter()
+        try:
+            yield breaker
+        except BaseException as e:
+            self.record(breaker, time.perf_counter() - start, e)
+            raise
+        self.record(breaker, time.perf_counter() - start)
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        """导出各端点状态，用于统计展示
+
+        Returns:
+            各端点的地址、状态、连续失败次数和剩余熔断时间
+        """
+        now = time.time()
+        return [
+            {
+                "base_url": breaker.base_url,
+                "state": breaker.state,
+                "failures": breaker.failures,
+                "retry_after": breaker.retry_after(now),
+            }
+            for breaker in self.breakers
+        ]
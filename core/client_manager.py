@@ -3,17 +3,23 @@
 负责 AsyncOpenAI 客户端和 aiohttp Session 的管理和复用。
 """
 
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
-import aiohttp
-import httpx
-from openai import AsyncOpenAI
+from . import deps
+from .debug_logger import DebugLogger
+from .metrics import CACHE_REQUESTS
 
-from astrbot.api import logger
+if TYPE_CHECKING:
+    import aiohttp
+    import httpx
+    from openai import AsyncOpenAI
 
 
 class ClientManager:
-    """客户端管理器，负责管理 OpenAI 客户端和 HTTP Session"""
+    """客户端管理器，负责管理 OpenAI 客户端和 HTTP Session
+
+    openai、httpx 和 aiohttp 在第一次创建客户端时才导入，见 deps 模块。
+    """
 
     def __init__(self, base_url: str, debug_mode: bool = False) -> None:
         """初始化客户端管理器
@@ -23,30 +29,23 @@ class ClientManager:
             debug_mode: 是否启用 Debug 日志
         """
         self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("ClientManager", self.debug_mode)
         self.base_url = base_url
-        self._openai_clients: dict[str, AsyncOpenAI] = {}
-        self._http_session: Optional[aiohttp.ClientSession] = None
+        self._openai_clients: dict[tuple[str, str], "AsyncOpenAI"] = {}
+        self._http_session: Optional["aiohttp.ClientSession"] = None
         # 创建共享的 httpx.AsyncClient，供所有 AsyncOpenAI 实例使用
-        self._httpx_client: Optional[httpx.AsyncClient] = None
-        self.debug_log(f"初始化客户端管理器: base_url={base_url}, debug_mode={debug_mode}")
-
-    def debug_log(self, message: str) -> None:
-        """输出 Debug 日志
-
-        Args:
-            message: 日志消息
-        """
-        if self.debug_mode:
-            logger.debug(f"[ClientManager] {message}")
+        self._httpx_client: Optional["httpx.AsyncClient"] = None
+        self.debug_log("初始化客户端管理器: base_url=%s, debug_mode=%s", base_url, debug_mode)
 
-    def get_openai_client(self, api_key: str) -> AsyncOpenAI:
+    def get_openai_client(self, api_key: str, base_url: str = "") -> "AsyncOpenAI":
         """获取或创建 AsyncOpenAI 客户端
 
-        使用 API Key 作为缓存键，如果已存在则复用，否则创建新实例。
+        使用基础 URL 和 API Key 作为缓存键，如果已存在则复用，否则创建新实例。
         所有 AsyncOpenAI 实例共享同一个 httpx.AsyncClient 以减少资源占用。
 
         Args:
             api_key: API Key
+            base_url: API 基础 URL（可选），默认使用 self.base_url，切换到镜像地址时传入
 
         Returns:
             AsyncOpenAI 客户端实例
@@ -60,24 +59,31 @@ class ClientManager:
         # 延迟初始化共享的 httpx.AsyncClient
         if self._httpx_client is None:
             self.debug_log("创建共享的 httpx.AsyncClient")
+            httpx = deps.httpx
             self._httpx_client = httpx.AsyncClient(
                 limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
                 timeout=httpx.Timeout(60.0, connect=10.0),
             )
 
-        if api_key not in self._openai_clients:
-            self.debug_log(f"创建新的 OpenAI 客户端: api_key={api_key[:10]}...")
-            self._openai_clients[api_key] = AsyncOpenAI(
-                base_url=self.base_url,
+        base_url = base_url or self.base_url
+        key = (base_url, api_key)
+        if key not in self._openai_clients:
+            CACHE_REQUESTS.inc("openai_client", "miss")
+            self.debug_log(
+                "创建新的 OpenAI 客户端: base_url=%s, api_key=%.10s...", base_url, api_key
+            )
+            self._openai_clients[key] = deps.openai.AsyncOpenAI(
+                base_url=base_url,
                 api_key=api_key,
                 http_client=self._httpx_client,  # 使用共享的 httpx.AsyncClient
             )
         else:
-            self.debug_log(f"复用 OpenAI 客户端: api_key={api_key[:10]}...")
+            CACHE_REQUESTS.inc("openai_client", "hit")
+            self.debug_log.sampled("复用 OpenAI 客户端: api_key=%.10s...", api_key)
 
-        return self._openai_clients[api_key]
+        return self._openai_clients[key]
 
-    async def get_http_session(self) -> aiohttp.ClientSession:
+    async def get_http_session(self) -> "aiohttp.ClientSession":
         """获取或创建 aiohttp Session
 
         如果当前 Session 已关闭或不存在，则创建新实例。
@@ -87,9 +93,9 @@ class ClientManager:
         """
         if self._http_session is None or self._http_session.closed:
             self.debug_log("创建新的 HTTP Session")
-            self._http_session = aiohttp.ClientSession()
+            self._http_session = deps.aiohttp.ClientSession()
         else:
-            self.debug_log("复用 HTTP Session")
+            self.debug_log.sampled("复用 HTTP Session")
         return self._http_session
 
     async def close(self) -> None:
@@ -115,4 +121,4 @@ class ClientManager:
         # 清理 OpenAI 客户端（不需要调用 close，因为它们使用共享的 httpx.AsyncClient）
         client_count = len(self._openai_clients)
         self._openai_clients.clear()
-        self.debug_log(f"已清理 {client_count} 个 OpenAI 客户端")
+        self.debug_log("已清理 %s 个 OpenAI 客户端", client_count)
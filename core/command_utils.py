@@ -3,16 +3,71 @@
 提供命令处理中的公共辅助函数。
 """
 
-import aiohttp
+import asyncio
+import contextlib
 import uuid
 from pathlib import Path
-from typing import Any, AsyncGenerator
+from typing import Any, AsyncGenerator, Optional
 
 from astrbot.api import logger
 from astrbot.api.event import AstrMessageEvent
 from astrbot.api.message_components import Image
 
-from .config import SUPPORTED_RATIOS
+from . import deps
+from .circuit_breaker import CIRCUIT_REJECTIONS, CircuitOpenError
+from .config import IMAGE_SPILL_CHUNK_SIZE, SUPPORTED_RATIOS
+from .deadline import Deadline, stage_timeout
+from .degradation import QualityPlan
+from .load_shedder import format_duration
+from .memory_budget import MemoryBudget
+from .metrics import ERRORS, FIRST_IMAGE_LATENCY, REQUEST_LATENCY, error_class
+from .scheduler import LANE_BATCH, LANE_COMMAND, JobTicket, QueueFullError, SchedulerClosedError
+from .tracing import Span, current_span
+
+
+async def get_rate_limit_rejection(
+    plugin,
+    event: AstrMessageEvent,
+    command_name: str,
+    request_id: str,
+    command: str = "generate",
+    debounce: bool = True,
+) -> str | None:
+    """检查防抖和令牌桶限流，通过时将请求标记为处理中
+
+    同一用户的并发请求不再被拒绝，而是交给任务调度器排队。
+
+    Args:
+        plugin: 插件实例
+        event: 消息事件对象
+        command_name: 命令名称（用于日志）
+        request_id: 请求标识符
+        command: 命令标识，用于确定令牌消耗（如 generate, ai-edit）
+        debounce: 是否进行防抖检查
+
+    Returns:
+        拒绝消息；返回 None 表示请求已放行
+    """
+    plugin.debug_log("[%s] 收到请求: request_id=%s", command_name, request_id)
+
+    # 防抖检查
+    if debounce and await plugin.rate_limiter.is_debounced(request_id):
+        plugin.debug_log("[%s] 请求被防抖拦截: request_id=%s", command_name, request_id)
+        return "操作太快了，请稍后再试。"
+
+    # 令牌桶限流检查
+    wait, tier = await plugin.rate_limiter.acquire(
+        event.get_sender_id(), event.get_group_id() or "", command
+    )
+    if wait > 0:
+        plugin.debug_log("[%s] 请求被限流: request_id=%s, tier=%s", command_name, request_id, tier)
+        if wait == float("inf"):
+            return "该命令消耗超过了当前限流配额，请联系管理员调整配置。"
+        tier_name = {"user": "您", "group": "本群", "global": "全局"}.get(tier, "")
+        return f"{tier_name}请求过于频繁，请 {wait:.0f} 秒后再试。"
+
+    plugin.rate_limiter.add_processing(request_id)
+    return None
 
 
 async def check_rate_limit(
@@ -20,6 +75,8 @@ async def check_rate_limit(
     event: AstrMessageEvent,
     command_name: str,
     request_id: str,
+    command: str = "generate",
+    debounce: bool = True,
 ) -> AsyncGenerator[Any, None]:
     """检查速率限制和防抖
 
@@ -28,24 +85,173 @@ async def check_rate_limit(
         event: 消息事件对象
         command_name: 命令名称（用于日志）
         request_id: 请求标识符
+        command: 命令标识，用于确定令牌消耗（如 generate, ai-edit）
+        debounce: 是否进行防抖检查
 
     Yields:
         如果需要拒绝请求，则返回拒绝消息；否则不返回
     """
-    plugin.debug_log(f"[{command_name}] 收到请求: request_id={request_id}")
+    rejection = await get_rate_limit_rejection(
+        plugin, event, command_name, request_id, command, debounce
+    )
+    if rejection:
+        yield event.plain_result(rejection)
 
-    # 防抖检查
-    if plugin.rate_limiter.check_debounce(request_id):
-        plugin.debug_log(f"[{command_name}] 请求被防抖拦截: request_id={request_id}")
-        yield event.plain_result("操作太快了，请稍后再试。")
-        return
 
-    if plugin.rate_limiter.is_processing(request_id):
-        plugin.debug_log(f"[{command_name}] 用户正在处理中: request_id={request_id}")
-        yield event.plain_result("您有正在进行的生图任务，请稍候...")
-        return
+def submit_job(
+    plugin,
+    event: AstrMessageEvent,
+    command: str,
+    lane: int = LANE_COMMAND,
+    model: str = "",
+) -> tuple[JobTicket | None, str | None]:
+    """估算等待时间并将请求提交到任务调度器排队
 
-    plugin.rate_limiter.add_processing(request_id)
+    所有端点都处于熔断状态时直接拒绝。预计完成时间超过阈值时，根据负载削减模式拒绝请求或将其降级到批量通道。
+
+    Args:
+        plugin: 插件实例
+        event: 消息事件对象
+        command: 命令标识（如 generate, ai-edit）
+        lane: 优先级通道
+        model: 本次请求使用的模型，用于估算耗时
+
+    Returns:
+        (排队凭证, 拒绝消息)，排队成功时拒绝消息为 None
+    """
+    # 所有端点都在熔断时直接失败，不让用户排队等待
+    endpoints = plugin.api_client.endpoints
+    if not endpoints.available():
+        plugin.debug_log("[%s] 端点熔断，快速失败", command)
+        CIRCUIT_REJECTIONS.inc()
+        return None, str(CircuitOpenError(endpoints.retry_after()))
+
+    scheduler = plugin.scheduler
+    shedder = plugin.load_shedder
+    estimate = shedder.estimate_wait(
+        command,
+        model,
+        scheduler.queued_count + scheduler.running_count,
+        scheduler.max_concurrency,
+    )
+    if shedder.should_shed(estimate):
+        plugin.debug_log("[%s] 负载过高: estimate=%.1fs, mode=%s", command, estimate, shedder.mode)
+        if shedder.mode == "reject":
+            return None, f"当前请求较多，预计需要等待约 {format_duration(estimate)}，请稍后再试。"
+        lane = max(lane, LANE_BATCH)
+
+    try:
+        ticket = plugin.scheduler.submit(
+            event.get_sender_id(), event.get_group_id() or "", lane, command
+        )
+    except QueueFullError as e:
+        plugin.debug_log("[%s] 用户排队任务已满: user_id=%s", command, event.get_sender_id())
+        return None, str(e)
+    except SchedulerClosedError as e:
+        plugin.debug_log("[%s] 插件正在关闭，拒绝新任务", command)
+        return None, str(e)
+    ticket.estimated_wait = estimate
+    budget = plugin.request_deadlines.get(command, 0)
+    if budget > 0:
+        ticket.deadline = Deadline(command, budget)
+    return ticket, None
+
+
+def format_queue_position(ticket: JobTicket) -> str | None:
+    """生成排队位置提示
+
+    Args:
+        ticket: 排队凭证
+
+    Returns:
+        排队提示消息，立即执行时返回 None
+    """
+    if ticket.position <= 0:
+        return None
+    return (
+        f"当前任务较多，您前面还有 {ticket.position} 个任务，"
+        f"预计约 {format_duration(ticket.estimated_wait)} 后完成，轮到后将自动开始...\n"
+        f"任务编号：{ticket.job_id}，发送 /ai-gitee cancel {ticket.job_id} 可取消"
+    )
+
+
+def record_completion(plugin, command: str, model: str, elapsed: float) -> None:
+    """记录一次成功完成的请求，用于负载估算和指标统计
+
+    Args:
+        plugin: 插件实例
+        command: 命令标识
+        model: 使用的模型
+        elapsed: 耗时（秒）
+    """
+    plugin.load_shedder.record(command, model, elapsed)
+    REQUEST_LATENCY.observe(elapsed, command, model)
+
+
+def record_first_image(command: str, model: str, elapsed: float) -> None:
+    """记录从开始执行到发送第一张图片的耗时
+
+    开启预览图时为预览图的耗时，否则与完整耗时相同。
+
+    Args:
+        command: 命令标识
+        model: 使用的模型
+        elapsed: 耗时（秒）
+    """
+    FIRST_IMAGE_LATENCY.observe(elapsed, command, model)
+
+
+def plan_quality(plugin, size: str) -> QualityPlan:
+    """根据当前负载确定文生图使用的尺寸和推理步数
+
+    应在任务出队、即将调用上游前调用，使降级反映执行时的负载。
+
+    Args:
+        plugin: 插件实例
+        size: 请求的尺寸
+
+    Returns:
+        生成计划，plan.describe() 为需要附加到回复中的降级说明
+    """
+    plan = plugin.api_client.quality.plan(size, plugin.scheduler.queued_count)
+    if plan.degraded:
+        plugin.debug_log(
+            "[降级] level=%s, size=%s->%s, steps=%s->%s",
+            plan.level, plan.requested_size, plan.size, plan.requested_steps, plan.steps,
+        )
+        span = current_span()
+        if span is not None:
+            span.set_attribute("quality_level", plan.level)
+    return plan
+
+
+def record_failure(command: str, error: BaseException) -> None:
+    """按异常类型记录一次失败的请求
+
+    Args:
+        command: 命令标识
+        error: 捕获到的异常
+    """
+    ERRORS.inc(command, error_class(error))
+    span = current_span()
+    if span is not None:
+        span.record_error(error)
+
+
+def format_phase_breakdown(plugin, root: Span) -> str:
+    """生成附加到回复中的分阶段耗时明细
+
+    Args:
+        plugin: 插件实例
+        root: 请求的根 Span
+
+    Returns:
+        以换行开头的明细文本，未开启或没有数据时返回空字符串
+    """
+    if not plugin.trace_in_reply:
+        return ""
+    breakdown = root.breakdown()
+    return f"\n阶段耗时：{breakdown}" if breakdown else ""
 
 
 def parse_prompt_and_size(plugin, prompt: str) -> tuple[str, str]:
@@ -91,11 +297,14 @@ def parse_prompt_and_size(plugin, prompt: str) -> tuple[str, str]:
     return prompt, target_size
 
 
-async def extract_images_from_message(event: AstrMessageEvent) -> list[str]:
+async def extract_images_from_message(
+    event: AstrMessageEvent, memory: Optional[MemoryBudget] = None
+) -> list[str]:
     """从消息中提取所有图片的路径
 
     Args:
         event: 消息事件对象
+        memory: 下载图片时占用的内存预算（可选）
 
     Returns:
         图片路径列表
@@ -111,7 +320,7 @@ async def extract_images_from_message(event: AstrMessageEvent) -> list[str]:
             # 从 Image 组件中获取图片路径
             if hasattr(component, 'url') and component.url:
                 # 如果是 URL，需要下载
-                path = await download_image(component.url)
+                path = await download_image(component.url, memory)
                 if path:
                     image_paths.append(path)
             elif hasattr(component, 'file') and component.file:
@@ -122,25 +331,41 @@ async def extract_images_from_message(event: AstrMessageEvent) -> list[str]:
     return image_paths
 
 
-async def download_image(url: str) -> str | None:
+async def download_image(url: str, memory: Optional[MemoryBudget] = None) -> str | None:
     """下载图片到本地
 
+    内存预算不足或响应未给出长度时边读边写磁盘。
+
     Args:
         url: 图片 URL
+        memory: 占用的内存预算（可选）
 
     Returns:
         本地文件路径
     """
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=10) as response:
+        async with deps.aiohttp.ClientSession() as session:
+            async with session.get(url, timeout=stage_timeout("upload", 10)) as response:
                 if response.status == 200:
-                    data = await response.read()
                     # 保存到临时目录
                     temp_dir = Path("data/plugins/astrbot_plugin_models_ai/temp")
-                    temp_dir.mkdir(parents=True, exist_ok=True)
+                    await asyncio.to_thread(temp_dir.mkdir, parents=True, exist_ok=True)
                     temp_path = temp_dir / f"{uuid.uuid4()}.png"
-                    temp_path.write_bytes(data)
+                    length = response.content_length
+                    reservation = (
+                        memory.reserve(length or 0, spill=True)
+                        if memory is not None
+                        else contextlib.nullcontext(True)
+                    )
+                    async with reservation as buffered:
+                        async with deps.aiofiles.open(temp_path, "wb") as f:
+                            if buffered and length is not None:
+                                await f.write(await response.read())
+                            else:
+                                async for chunk in response.content.iter_chunked(
+                                    IMAGE_SPILL_CHUNK_SIZE
+                                ):
+                                    await f.write(chunk)
                     return str(temp_path)
     except Exception as e:
         logger.error(f"下载图片失败: {e}")
@@ -0,0 +1,213 @@
+"""自适应并发控制模块
+
+按 API Key 和全局维护并发窗口，使用 AIMD（加性增、乘性减）算法调整窗口大小。
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Optional
+
+from .debug_logger import DebugLogger
+from .tracing import trace_span
+
+
+def is_overload_error(exc: BaseException) -> bool:
+    """判断异常是否表示上游过载（429 或超时）
+
+    Args:
+        exc: 捕获到的异常
+
+    Returns:
+        True 表示应收缩并发窗口
+    """
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    for attr in ("status_code", "status"):
+        if getattr(exc, attr, None) == 429:
+            return True
+    return "Timeout" in type(exc).__name__ or "RateLimit" in type(exc).__name__
+
+
+class AdaptiveWindow:
+    """单个并发窗口，记录当前上限和进行中的请求数"""
+
+    __slots__ = ("limit", "min_limit", "max_limit", "in_flight")
+
+    def __init__(self, initial: float, min_limit: float, max_limit: float) -> None:
+        """初始化并发窗口
+
+        Args:
+            initial: 初始窗口大小
+            min_limit: 窗口下限
+            max_limit: 窗口上限
+        """
+        self.limit = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.in_flight = 0
+
+    def has_capacity(self) -> bool:
+        """窗口是否还能容纳新请求"""
+        return self.in_flight < int(self.limit)
+
+    def increase(self, step: float) -> None:
+        """加性增大窗口，每次成功增加 step / limit，约每个窗口周期增加 step
+
+        Args:
+            step: 增长步长
+        """
+        self.limit = min(self.max_limit, self.limit + step / max(self.limit, 1.0))
+
+    def decrease(self, factor: float) -> None:
+        """乘性缩小窗口
+
+        Args:
+            factor: 缩小系数（0-1）
+        """
+        self.limit = max(self.min_limit, self.limit * factor)
+
+
+class AdmissionController:
+    """准入控制器，请求发往上游前需要同时获得 Key 级和全局并发槽位
+
+    成功的请求让窗口加性增长，遇到 429 或超时时窗口乘性收缩，
+    从而在不知道上游并发限制的情况下逼近其真实容量。
+    """
+
+    def __init__(
+        self,
+        debug_mode: bool = False,
+        per_key_max: int = 4,
+        global_max: int = 16,
+        increase_step: float = 1.0,
+        decrease_factor: float = 0.5,
+        key_label: Optional[Callable[[str], str]] = None,
+    ) -> None:
+        """初始化准入控制器
+
+        Args:
+            debug_mode: 是否启用 Debug 日志
+            per_key_max: 每个 API Key 的并发窗口上限
+            global_max: 全局并发窗口上限
+            increase_step: 加性增长步长
+            decrease_factor: 乘性收缩系数
+            key_label: 生成 API Key 展示标识的函数，用于日志和统计，避免泄露 Key 内容；
+                默认按首次使用的顺序编号
+        """
+        self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("AdmissionController", self.debug_mode)
+        self.per_key_max = max(1, per_key_max)
+        self.global_max = max(1, global_max)
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self._global = AdaptiveWindow(max(1.0, self.global_max / 2), 1.0, float(self.global_max))
+        self._keys: dict[str, AdaptiveWindow] = {}
+        self._key_label = key_label or (lambda key: f"key{list(self._keys).index(key)}")
+        self._condition: Optional[asyncio.Condition] = None
+        self._waiting = 0
+        self._wait_times: deque[float] = deque(maxlen=256)
+        self.debug_log("初始化准入控制器: per_key_max=%s, global_max=%s", per_key_max, global_max)
+
+    def _get_condition(self) -> asyncio.Condition:
+        """获取条件变量（延迟创建，确保绑定到运行中的事件循环）"""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _get_window(self, api_key: str) -> AdaptiveWindow:
+        """获取或创建 API Key 对应的并发窗口
+
+        Args:
+            api_key: API Key
+
+        Returns:
+            并发窗口
+        """
+        window = self._keys.get(api_key)
+        if window is None:
+            window = AdaptiveWindow(max(1.0, self.per_key_max / 2), 1.0, float(self.per_key_max))
+            self._keys[api_key] = window
+        return window
+
+    @asynccontextmanager
+    async def slot(self, api_key: str) -> AsyncIterator[None]:
+        """获取并发槽位，退出时根据结果调整窗口
+
+        成功时增大窗口，429 或超时时收缩窗口，其他错误和取消不调整窗口。
+
+        Args:
+            api_key: 本次请求使用的 API Key
+
+        Yields:
+            None，持有槽位期间可以发送上游请求
+        """
+        window = self._get_window(api_key)
+        condition = self._get_condition()
+        start = time.monotonic()
+
+        with trace_span("admission.wait"):
+            async with condition:
+                self._waiting += 1
+                try:
+                    await condition.wait_for(
+                        lambda: window.has_capacity() and self._global.has_capacity()
+                    )
+                finally:
+                    self._waiting -= 1
+                window.in_flight += 1
+                self._global.in_flight += 1
+
+        waited = time.monotonic() - start
+        self._wait_times.append(waited)
+        if waited > 0.01:
+            self.debug_log("等待并发槽位: key=%s, waited=%.2fs", self._key_label(api_key), waited)
+
+        outcome = "success"
+        try:
+            yield
+        except BaseException as e:
+            outcome = "overload" if is_overload_error(e) else "error"
+            raise
+        finally:
+            # 先同步归还槽位并调整窗口，即使唤醒等待者时被取消也不会泄漏槽位
+            window.in_flight -= 1
+            self._global.in_flight -= 1
+            if outcome == "overload":
+                window.decrease(self.decrease_factor)
+                self._global.decrease(self.decrease_factor)
+                self.debug_log(
+                    "上游过载，收缩窗口: key=%s, key_limit=%.2f, global_limit=%.2f",
+                    self._key_label(api_key), window.limit, self._global.limit,
+                )
+            elif outcome == "success":
+                window.increase(self.increase_step)
+                self._global.increase(self.increase_step)
+            async with condition:
+                condition.notify_all()
+
+    def snapshot(self) -> dict[str, Any]:
+        """导出当前窗口大小和等待时间，用于监控
+
+        Returns:
+            包含全局窗口、各 Key 窗口（以 Key 标识为键）和等待时间统计的字典
+        """
+        wait_times = sorted(self._wait_times)
+        count = len(wait_times)
+        return {
+            "global": {
+                "limit": round(self._global.limit, 2),
+                "in_flight": self._global.in_flight,
+            },
+            "keys": {
+                self._key_label(key): {
+                    "limit": round(window.limit, 2), "in_flight": window.in_flight
+                }
+                for key, window in self._keys.items()
+            },
+            "waiting": self._waiting,
+            "wait_avg": sum(wait_times) / count if count else 0.0,
+            "wait_p95": wait_times[min(count - 1, int(count * 0.95))] if count else 0.0,
+            "wait_max": wait_times[-1] if count else 0.0,
+        }
@@ -26,6 +26,123 @@ MAX_CACHED_IMAGES = 20
 OPERATION_CACHE_TTL = 300  # 5分钟清理一次过期操作记录
 CLEANUP_INTERVAL = 10  # 每 N 次生成执行一次清理
 
+# 自适应并发控制配置
+DEFAULT_PER_KEY_CONCURRENCY = 4
+DEFAULT_MAX_CONCURRENCY = 16
+
+# 图片内存预算配置
+DEFAULT_IMAGE_MEMORY_BUDGET_MB = 256  # 进行中的图片缓冲可占用的内存（MB），0 表示不限制
+IMAGE_MEMORY_SPILL_WAIT = 2.0  # 预算不足时可落盘的调用方最多等待的秒数，超时后改为落盘
+IMAGE_SPILL_CHUNK_SIZE = 256 * 1024  # 落盘时每次读写的字节数
+
+# 任务调度配置
+DEFAULT_JOB_CONCURRENCY = 8
+DEFAULT_MAX_JOBS_PER_USER = 3
+
+# 多实例共享状态配置
+DEFAULT_SHARED_STATE_PATH = ""  # 共享令牌桶、防抖和 Key 用量的 SQLite 文件路径，为空时只使用本实例的内存状态
+SHARED_STATE_BUSY_TIMEOUT = 1.0  # 在工作线程中等待其他实例释放数据库锁的最长时间（秒），超时后拒绝本次请求
+SHARED_STATE_CLEANUP_EVERY = 256  # 每 N 次操作清理一次过期记录
+
+# 多进程任务队列配置
+DEFAULT_JOB_QUEUE_MODE = False  # 开启后文生图和图片编辑的上游调用写入 SQLite 任务队列，由工作进程执行
+DEFAULT_JOB_QUEUE_PATH = ""  # 任务队列文件路径，为空时使用插件数据目录下的 job_queue.db
+DEFAULT_JOB_QUEUE_WORKERS = 2  # 本实例启动的工作进程数，0 表示只使用其他实例的工作进程
+JOB_QUEUE_FILE = "job_queue.db"
+JOB_QUEUE_BUSY_TIMEOUT = 1.0  # 等待其他进程释放队列数据库锁的最长时间（秒），队列读写不在事件循环中执行
+JOB_QUEUE_POLL_INTERVAL = 0.1  # 工作进程领取任务、实例取回结果的轮询间隔（秒）
+JOB_QUEUE_LEASE_SECONDS = 30.0  # 任务租约时长，工作进程超时未续约时任务重新排队
+JOB_QUEUE_MAX_ATTEMPTS = 2  # 同一任务最多被领取的次数，工作进程反复异常退出时判定失败
+JOB_QUEUE_RESULT_TTL = 3600  # 发起实例已退出、无人取回的结果保留的秒数
+JOB_WORKER_CONCURRENCY = 4  # 每个工作进程同时执行的任务数
+JOB_WORKER_CHECK_INTERVAL = 1.0  # 检查工作进程是否存活的间隔（秒）
+JOB_WORKER_RESTART_BACKOFF = 1.0  # 工作进程退出后首次重启前的等待时间（秒），连续退出时逐次翻倍
+JOB_WORKER_RESTART_BACKOFF_MAX = 60.0  # 重启等待时间上限（秒）
+JOB_WORKER_MAX_RESTARTS = 5  # 工作进程连续异常退出后最多重启的次数，超过后不再重启
+JOB_WORKER_STABLE_SECONDS = 60.0  # 工作进程运行超过该时长后退出视为偶发，重新计算连续退出次数
+
+# 关闭配置
+DEFAULT_SHUTDOWN_GRACE_SECONDS = 30  # 插件关闭时等待执行中任务完成的秒数，超时后取消
+SHUTDOWN_CANCEL_TIMEOUT = 5.0  # 取消任务和后台任务后等待其结束的秒数
+SHUTDOWN_JOURNAL_FILE = "shutdown_journal.jsonl"  # 关闭时被取消任务的记录文件
+
+# 负载削减配置
+DEFAULT_MAX_ESTIMATED_WAIT = 300  # 预计完成时间超过该秒数时削减负载，0 表示不削减
+DEFAULT_LOAD_SHED_MODE = "reject"
+
+# 指标导出配置
+DEFAULT_METRICS_EXPORT_INTERVAL = 60  # 写入 Prometheus 文本文件的间隔（秒），0 表示不导出
+
+# Debug 日志配置
+DEFAULT_DEBUG_SAMPLE_EVERY = 100  # 高频 Debug 消息每 N 条输出一条
+
+# 事件循环看门狗配置
+DEFAULT_LOOP_STALL_THRESHOLD_MS = 0  # 心跳延迟超过该毫秒数时记录卡顿调用栈，0 表示不启用
+LOOP_WATCHDOG_INTERVAL = 0.1  # 心跳间隔（秒）
+
+# 性能剖析配置
+PROFILE_SAMPLE_INTERVAL = 0.01  # CPU 采样间隔（秒）
+PROFILE_DEFAULT_DURATION = 60  # 默认剖析时长（秒）
+PROFILE_MAX_DURATION = 600  # 单次剖析的最长时间（秒）
+PROFILE_TOP_N = 30  # 内存增长排行条数
+
+# 请求追踪配置
+DEFAULT_TRACE_SAMPLE_RATE = 0.1  # 写入 traces.jsonl 的请求比例，0 表示不写入
+DEFAULT_TRACE_IN_REPLY = False  # 是否在回复中附加分阶段耗时
+
+# 风格库配置
+STYLE_RELOAD_CHECK_INTERVAL = 2.0  # 检查风格提示词文件是否修改的最小间隔（秒）
+
+# 流量录制配置
+DEFAULT_TRAFFIC_RECORD = False  # 是否将脱敏的上游请求形态和耗时写入 traffic/traffic.jsonl
+DEFAULT_TRAFFIC_RECORD_PROMPTS = "hash"  # 提示词录制方式：hash 只保留哈希，keep 保留原文
+TRAFFIC_HASH_SECRET_FILE = "traffic_hash_secret"  # 录制时对用户、群组和提示词做带密钥哈希的本机密钥文件
+
+# 模型路由配置
+DEFAULT_MODEL_POOL = ""  # 参与路由的文生图模型及权重（格式："模型=权重,..."），留空表示不启用路由
+DEFAULT_MODEL_PINS = ""  # 固定模型（格式："command:draw=模型,user:用户ID=模型"）
+ROUTER_EXPLORE_RATE = 0.05  # 按权重随机选择模型的概率，让落后的模型有机会刷新统计
+ROUTER_MIN_SAMPLES = 3  # 模型耗时统计可信所需的最少成功次数
+
+# 负载自适应降级配置（两项都为 0 时不降级）
+DEFAULT_DEGRADE_QUEUE_DEPTH = 0  # 排队任务数达到该值时开始降低尺寸和推理步数，0 表示不按排队数降级
+DEFAULT_DEGRADE_LATENCY = 0  # 近期生成耗时中位数达到该秒数时开始降级，0 表示不按耗时降级
+
+# 预览图配置
+DEFAULT_DRAFT_PREVIEW = False  # generate 命令是否先发送低分辨率预览图，再发送完整画质图片
+DRAFT_SIZE_DROP = 2  # 预览图在同一比例的可选尺寸中下调的档数（不低于 512x512）
+DRAFT_STEPS = 4  # 预览图的推理步数
+
+# 请求对冲配置
+DEFAULT_HEDGE_PERCENTILE = 0  # 文生图调用超过近期耗时的该分位数（0-100）时在另一个 Key 上对冲，0 表示不对冲
+DEFAULT_HEDGE_BUDGET = 0.05  # 对冲请求占全部文生图请求的最大比例
+
+# 熔断和镜像地址配置
+DEFAULT_MIRROR_BASE_URLS = ""  # 备用的 OpenAI 兼容地址，逗号分隔，主地址熔断时按顺序切换
+DEFAULT_CIRCUIT_FAILURE_THRESHOLD = 5  # 连续失败（超时、连接失败、5xx）达到该次数时熔断，0 表示不熔断
+DEFAULT_CIRCUIT_SLOW_CALL_SECONDS = 0  # 耗时超过该秒数的调用计为失败，0 表示不统计慢调用
+CIRCUIT_OPEN_SECONDS = 30.0  # 熔断持续时间（秒），之后放行一个试探请求
+
+# 令牌桶限流配置（格式："次数/秒数"，留空或 0 表示不限制）
+DEFAULT_USER_RATE_LIMIT = "5/60"
+DEFAULT_GROUP_RATE_LIMIT = "20/60"
+DEFAULT_GLOBAL_RATE_LIMIT = "60/60"
+# 各命令消耗的令牌数，未列出的命令消耗 1 个令牌
+DEFAULT_COMMAND_COSTS: dict[str, float] = {
+    "generate": 1.0,
+    "draw": 1.0,
+    "style": 1.0,
+    "ai-edit": 3.0,
+}
+
+# 各命令从提交到发送结果的总时限（秒），0 表示不限制
+DEFAULT_REQUEST_DEADLINES: dict[str, float] = {
+    "generate": 180.0,
+    "draw": 180.0,
+    "style": 600.0,
+    "ai-edit": 1800.0,
+}
+
 # Gitee AI 支持的图片比例
 SUPPORTED_RATIOS: dict[str, list[str]] = {
     "1:1": ["256x256", "512x512", "1024x1024", "2048x2048"],
@@ -54,3 +171,148 @@ def parse_api_keys(api_keys: Any) -> list[str]:
     if isinstance(api_keys, list):
         return [str(k).strip() for k in api_keys if str(k).strip()]
     return []
+
+
+def parse_base_urls(value: Any) -> list[str]:
+    """解析基础 URL 列表配置，支持逗号分隔字符串和列表格式
+
+    Args:
+        value: 基础 URL 配置
+
+    Returns:
+        去除首尾空白和末尾斜杠后的 URL 列表
+    """
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, list):
+        return []
+    return [str(url).strip().rstrip("/") for url in value if str(url).strip()]
+
+
+def parse_rate_limit(value: Any) -> tuple[float, float] | None:
+    """解析令牌桶限流配置
+
+    Args:
+        value: 限流配置，格式为 "次数/秒数"，例如 "5/60" 表示每 60 秒 5 次
+
+    Returns:
+        (桶容量, 每秒补充令牌数)，配置为空或无效时返回 None 表示不限制
+    """
+    if not value:
+        return None
+    try:
+        count_str, _, period_str = str(value).partition("/")
+        count = float(count_str.strip())
+        period = float(period_str.strip()) if period_str.strip() else 60.0
+    except ValueError:
+        return None
+    if count <= 0 or period <= 0:
+        return None
+    return count, count / period
+
+
+def parse_command_costs(value: Any) -> dict[str, float]:
+    """解析命令令牌消耗配置，支持 "命令=消耗" 逗号分隔字符串或字典格式
+
+    Args:
+        value: 命令消耗配置，例如 "generate=1,ai-edit=3"
+
+    Returns:
+        命令到令牌消耗的映射（在默认值基础上覆盖）
+    """
+    costs = dict(DEFAULT_COMMAND_COSTS)
+    if isinstance(value, dict):
+        items = list(value.items())
+    elif isinstance(value, str):
+        items = [
+            tuple(part.split("=", 1))
+            for part in value.split(",")
+            if "=" in part
+        ]
+    else:
+        items = []
+    for command, cost in items:
+        try:
+            costs[str(command).strip()] = max(0.0, float(cost))
+        except (TypeError, ValueError):
+            continue
+    return costs
+
+
+def parse_request_deadlines(value: Any) -> dict[str, float]:
+    """解析请求总时限配置，支持 "命令=秒数" 逗号分隔字符串或字典格式
+
+    Args:
+        value: 总时限配置，例如 "generate=120,ai-edit=900"
+
+    Returns:
+        命令到总时限的映射（在默认值基础上覆盖）
+    """
+    deadlines = dict(DEFAULT_REQUEST_DEADLINES)
+    for command, seconds in _split_pairs(value):
+        try:
+            deadlines[command] = max(0.0, float(seconds))
+        except (TypeError, ValueError):
+            continue
+    return deadlines
+
+
+def _split_pairs(value: Any) -> list[tuple[str, Any]]:
+    """将 "键=值" 逗号分隔字符串或字典拆分为键值对列表"""
+    if isinstance(value, dict):
+        return [(str(k).strip(), v) for k, v in value.items()]
+    if isinstance(value, str):
+        pairs = []
+        for part in value.split(","):
+            key, sep, val = part.partition("=")
+            if sep and key.strip():
+                pairs.append((key.strip(), val.strip()))
+        return pairs
+    return []
+
+
+def parse_model_pool(value: Any) -> dict[str, float]:
+    """解析模型池配置，支持 "模型=权重" 逗号分隔字符串或字典格式
+
+    Args:
+        value: 模型池配置，例如 "z-image-turbo=3,flux-1-schnell=1"，省略权重时按 1 计算
+
+    Returns:
+        模型名称到权重的映射，权重不大于 0 的模型被忽略
+    """
+    if isinstance(value, str):
+        value = ",".join(
+            part if "=" in part else f"{part}=1" for part in value.split(",") if part.strip()
+        )
+    pool: dict[str, float] = {}
+    for model, weight in _split_pairs(value):
+        try:
+            weight = float(weight)
+        except (TypeError, ValueError):
+            continue
+        if weight > 0:
+            pool[model] = weight
+    return pool
+
+
+def parse_model_pins(value: Any) -> tuple[dict[str, str], dict[str, str]]:
+    """解析固定模型配置
+
+    Args:
+        value: 固定模型配置，例如 "command:draw=z-image-turbo,user:123456=flux-1-schnell"
+
+    Returns:
+        (用户 ID 到模型的映射, 命令到模型的映射)
+    """
+    user_pins: dict[str, str] = {}
+    command_pins: dict[str, str] = {}
+    for target, model in _split_pairs(value):
+        kind, _, name = target.partition(":")
+        model = str(model).strip()
+        if not name.strip() or not model:
+            continue
+        if kind.strip() == "user":
+            user_pins[name.strip()] = model
+        elif kind.strip() == "command":
+            command_pins[name.strip()] = model
+    return user_pins, command_pins
@@ -0,0 +1,140 @@
+"""请求时限模块
+
+每个请求在提交时按命令类型获得一个总时限，排队、上传、推理、轮询、下载和发送各阶段
+只使用剩余的时间。时限通过 contextvar 在上游调用中传递，超时时报告所在的阶段。
+"""
+
+import asyncio
+import contextvars
+import time
+from typing import Awaitable, Optional, TypeVar
+
+from .metrics import registry
+
+T = TypeVar("T")
+
+DEADLINE_EXCEEDED = registry.counter(
+    "deadline_exceeded_total", "超出请求总时限的次数", ("command", "stage")
+)
+
+# 阶段名称
+STAGE_NAMES = {
+    "queue": "排队",
+    "upload": "上传图片",
+    "inference": "推理",
+    "polling": "轮询任务",
+    "download": "下载图片",
+    "send": "发送",
+}
+
+# 当前任务的时限，由 JobTicket.run() 在上游调用的上下文中设置
+current_deadline: contextvars.ContextVar[Optional["Deadline"]] = contextvars.ContextVar(
+    "current_deadline", default=None
+)
+
+
+class Deadline:
+    """一个请求的总时限"""
+
+    __slots__ = ("command", "budget", "started_at", "expires_at")
+
+    def __init__(self, command: str, budget: float) -> None:
+        """初始化时限，从创建时开始计时
+
+        Args:
+            command: 命令标识
+            budget: 总时限（秒）
+        """
+        self.command = command
+        self.budget = budget
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget
+
+    def remaining(self) -> float:
+        """剩余秒数，可能为负数"""
+        return self.expires_at - time.monotonic()
+
+    def exceeded(self, stage: str) -> "DeadlineExceeded":
+        """生成超时异常并计数
+
+        Args:
+            stage: 超时所在的阶段
+
+        Returns:
+            超时异常
+        """
+        DEADLINE_EXCEEDED.inc(self.command, stage)
+        return DeadlineExceeded(stage, self)
+
+
+class DeadlineExceeded(RuntimeError):
+    """请求超出总时限"""
+
+    def __init__(self, stage: str, deadline: Deadline) -> None:
+        """初始化异常
+
+        Args:
+            stage: 超时所在的阶段
+            deadline: 请求的时限
+        """
+        self.stage = stage
+        self.deadline = deadline
+        super().__init__(
+            f"请求超时：在{STAGE_NAMES.get(stage, stage)}阶段超出总时限 {deadline.budget:g} 秒"
+        )
+
+
+def stage_timeout(stage: str, default: float, deadline: Optional[Deadline] = None) -> float:
+    """计算本阶段单次 I/O 可用的超时时间
+
+    Args:
+        stage: 阶段名称
+        default: 没有时限时使用的超时秒数
+        deadline: 请求的时限，默认取当前上下文中的时限
+
+    Returns:
+        默认超时和剩余时间中的较小值
+
+    Raises:
+        DeadlineExceeded: 时限已耗尽
+    """
+    deadline = deadline or current_deadline.get()
+    if deadline is None:
+        return default
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        raise deadline.exceeded(stage)
+    return min(default, remaining)
+
+
+async def with_deadline(
+    stage: str, awaitable: Awaitable[T], deadline: Optional[Deadline] = None
+) -> T:
+    """在剩余时间内等待一个阶段完成
+
+    Args:
+        stage: 阶段名称
+        awaitable: 要等待的协程或 Future
+        deadline: 请求的时限，默认取当前上下文中的时限
+
+    Returns:
+        awaitable 的结果
+
+    Raises:
+        DeadlineExceeded: 时限耗尽时抛出，awaitable 会被取消
+    """
+    deadline = deadline or current_deadline.get()
+    if deadline is None:
+        return await awaitable
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise deadline.exceeded(stage)
+    try:
+        return await asyncio.wait_for(awaitable, remaining)
+    except asyncio.TimeoutError as e:
+        if deadline.remaining() > 0:
+            # 阶段内部自己的超时，不是总时限耗尽
+            raise
+        raise deadline.exceeded(stage) from e
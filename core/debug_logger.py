@@ -0,0 +1,142 @@
+"""Debug 日志模块
+
+提供延迟格式化的 Debug 日志记录器。消息使用 % 风格的占位符，参数在确认需要输出后才格式化，
+关闭时每次调用只有一次属性判断，不会构造任何字符串。支持按模块设置级别，并对高频消息采样。
+"""
+
+import weakref
+from typing import Any
+
+from astrbot.api import logger
+
+# 日志级别：off 不输出；on 输出普通消息并对高频消息采样；verbose 输出全部消息
+LEVEL_OFF = "off"
+LEVEL_ON = "on"
+LEVEL_VERBOSE = "verbose"
+LEVELS = (LEVEL_OFF, LEVEL_ON, LEVEL_VERBOSE)
+
+# 按模块名覆盖的级别，未配置的模块跟随 debug_mode
+_module_levels: dict[str, str] = {}
+# 级别为 on 时高频消息每 N 条输出一条
+_sample_every = 100
+_loggers: "weakref.WeakSet[DebugLogger]" = weakref.WeakSet()
+
+
+class DebugLogger:
+    """按模块输出 Debug 日志的记录器
+
+    用法与原先的 debug_log 方法一致，但消息应使用 % 占位符并把参数单独传入::
+
+        self.debug_log("防抖拦截: request_id=%s, elapsed=%.2fs", request_id, elapsed)
+
+    提示词等长文本可以用 %.50s 截断，避免在调用处切片。参数本身计算代价较高时，
+    可以先判断 ``debug_log.enabled`` 再调用。
+    """
+
+    __slots__ = ("name", "debug_mode", "enabled", "verbose", "_sample_count", "__weakref__")
+
+    def __init__(self, name: str, debug_mode: bool = False) -> None:
+        """初始化记录器
+
+        Args:
+            name: 模块名，同时作为日志前缀和按模块配置级别的键
+            debug_mode: 插件是否启用 Debug 日志，未按模块配置级别时使用
+        """
+        self.name = name
+        self.debug_mode = debug_mode
+        self.enabled = False
+        self.verbose = False
+        self._sample_count = 0
+        self._apply_level()
+        _loggers.add(self)
+
+    def _apply_level(self) -> None:
+        """根据模块级别配置计算是否输出"""
+        level = _module_levels.get(self.name)
+        if level is None:
+            level = LEVEL_ON if self.debug_mode else LEVEL_OFF
+        self.enabled = level != LEVEL_OFF
+        self.verbose = level == LEVEL_VERBOSE
+
+    def _emit(self, message: str, args: tuple[Any, ...]) -> None:
+        """格式化并输出消息
+
+        Args:
+            message: 消息模板
+            args: 模板参数
+        """
+        if args:
+            try:
+                message = message % args
+            except (TypeError, ValueError):
+                message = f"{message} {args!r}"
+        logger.debug(f"[{self.name}] {message}")
+
+    def __call__(self, message: str, *args: Any) -> None:
+        """输出 Debug 日志
+
+        Args:
+            message: 消息模板，使用 % 风格占位符
+            *args: 模板参数，仅在需要输出时格式化
+        """
+        if self.enabled:
+            self._emit(message, args)
+
+    def sampled(self, message: str, *args: Any) -> None:
+        """输出高频 Debug 日志，级别为 on 时按采样间隔输出，verbose 时全部输出
+
+        Args:
+            message: 消息模板，使用 % 风格占位符
+            *args: 模板参数，仅在需要输出时格式化
+        """
+        if not self.enabled:
+            return
+        if not self.verbose:
+            self._sample_count += 1
+            if self._sample_count < _sample_every:
+                return
+            self._sample_count = 0
+            message = f"{message} (采样 1/{_sample_every})"
+        self._emit(message, args)
+
+
+def parse_debug_levels(value: Any) -> dict[str, str]:
+    """解析按模块配置的日志级别
+
+    Args:
+        value: 形如 "RateLimiter=verbose,ImageManager=off" 的字符串，或模块名到级别的字典
+
+    Returns:
+        模块名到级别的字典，忽略无法识别的级别
+    """
+    if isinstance(value, dict):
+        items = [(str(k), str(v)) for k, v in value.items()]
+    else:
+        items = []
+        for part in str(value or "").replace("\n", ",").split(","):
+            name, sep, level = part.partition("=")
+            if sep:
+                items.append((name, level))
+    levels = {}
+    for name, level in items:
+        name, level = name.strip(), level.strip().lower()
+        if name and level in LEVELS:
+            levels[name] = level
+        elif name:
+            logger.warning(f"忽略无效的 Debug 日志级别: {name}={level}")
+    return levels
+
+
+def configure_debug_logging(levels: dict[str, str], sample_every: int = 100) -> None:
+    """设置按模块的日志级别和采样间隔，并应用到已创建的记录器
+
+    Args:
+        levels: 模块名到级别的字典
+        sample_every: 级别为 on 时高频消息每 N 条输出一条
+    """
+    global _sample_every
+    _module_levels.clear()
+    _module_levels.update(levels)
+    _sample_every = max(1, int(sample_every))
+    for debug_logger in list(_loggers):
+        debug_logger._apply_level()
@@ -0,0 +1,241 @@
+"""负载自适应降级模块
+
+排队任务增多或上游耗时升高时，逐级降低文生图的尺寸和推理步数，负载回落后逐级恢复。
+"""
+
+import time
+from typing import Optional
+
+from .config import DRAFT_SIZE_DROP, DRAFT_STEPS, SUPPORTED_RATIOS
+from .debug_logger import DebugLogger
+from .load_shedder import LatencyWindow
+from .metrics import registry
+
+QUALITY_LEVEL = registry.gauge("quality_degrade_level", "当前画质降级等级，0 表示不降级")
+QUALITY_DEGRADED = registry.counter("quality_degraded_total", "降级生成的请求数", ("level",))
+
+# 降级等级：(尺寸下调档数, 推理步数比例)，第 N 级在负载压力达到 N 时进入
+DEGRADE_LEVELS: tuple[tuple[int, float], ...] = (
+    (0, 1.0),
+    (0, 0.67),
+    (1, 0.67),
+    (1, 0.5),
+    (2, 0.5),
+)
+DEGRADE_MIN_STEPS = 4  # 降级后的最少推理步数
+DEGRADE_MIN_PIXELS = 512 * 512  # 降级后的最小像素数
+DEGRADE_RECOVERY_RATIO = 0.75  # 压力低于当前等级阈值的该比例时才恢复，避免在阈值附近来回切换
+DEGRADE_RECOVERY_DWELL = 30.0  # 每恢复一级前至少保持当前等级的时间（秒）
+
+
+def _pixels(size: str) -> int:
+    """计算 "宽x高" 尺寸的像素数，无法解析时返回 0"""
+    width, _, height = size.partition("x")
+    try:
+        return int(width) * int(height)
+    except ValueError:
+        return 0
+
+
+def lower_size(size: str, drop: int) -> str:
+    """在同一比例的可选尺寸中下调尺寸
+
+    Args:
+        size: 原始尺寸
+        drop: 下调档数
+
+    Returns:
+        下调后的尺寸，不在 SUPPORTED_RATIOS 中的尺寸原样返回
+    """
+    if drop <= 0:
+        return size
+    for sizes in SUPPORTED_RATIOS.values():
+        if size not in sizes:
+            continue
+        index = sizes.index(size)
+        while drop > 0 and index > 0 and _pixels(sizes[index - 1]) >= DEGRADE_MIN_PIXELS:
+            index -= 1
+            drop -= 1
+        return sizes[index]
+    return size
+
+
+class QualityPlan:
+    """一次生成实际使用的尺寸和步数"""
+
+    __slots__ = ("level", "size", "steps", "requested_size", "requested_steps")
+
+    def __init__(
+        self, level: int, size: str, steps: int, requested_size: str, requested_steps: int
+    ) -> None:
+        """初始化生成计划
+
+        Args:
+            level: 降级等级
+            size: 实际尺寸
+            steps: 实际推理步数
+            requested_size: 请求的尺寸
+            requested_steps: 配置的推理步数
+        """
+        self.level = level
+        self.size = size
+        self.steps = steps
+        self.requested_size = requested_size
+        self.requested_steps = requested_steps
+
+    @property
+    def degraded(self) -> bool:
+        """是否实际降低了尺寸或步数"""
+        return self.size != self.requested_size or self.steps != self.requested_steps
+
+    def describe(self) -> str:
+        """生成回复中的降级说明，未降级时返回空字符串"""
+        if not self.degraded:
+            return ""
+        changes = []
+        if self.size != self.requested_size:
+            changes.append(f"尺寸 {self.requested_size}→{self.size}")
+        if self.steps != self.requested_steps:
+            changes.append(f"步数 {self.requested_steps}→{self.steps}")
+        return f"\n⚡ 当前负载较高，已临时降低画质：{'，'.join(changes)}"
+
+
+def draft_plan(plan: QualityPlan) -> Optional[QualityPlan]:
+    """根据完整画质的生成计划确定预览图的尺寸和步数
+
+    Args:
+        plan: 完整画质的生成计划
+
+    Returns:
+        预览图的生成计划；预览图不比完整画质更快时返回 None
+    """
+    size = lower_size(plan.size, DRAFT_SIZE_DROP)
+    steps = min(plan.steps, DRAFT_STEPS)
+    if size == plan.size and steps == plan.steps:
+        return None
+    return QualityPlan(plan.level, size, steps, plan.size, plan.steps)
+
+
+class QualityGovernor:
+    """画质降级策略
+
+    负载压力取排队任务数 / queue_threshold 与近期耗时中位数 / latency_threshold 中的较大值。
+    压力达到 N 时立即升到第 N 级；压力低于当前等级阈值的 DEGRADE_RECOVERY_RATIO 倍，
+    且在当前等级停留满 DEGRADE_RECOVERY_DWELL 秒后才恢复一级。
+    降级请求的耗时按像素数 × 步数折算为完整画质的耗时，避免降级本身拉低耗时导致过早恢复。
+    """
+
+    def __init__(
+        self,
+        default_size: str,
+        num_inference_steps: int,
+        queue_threshold: int = 0,
+        latency_threshold: float = 0.0,
+        debug_mode: bool = False,
+    ) -> None:
+        """初始化降级策略
+
+        Args:
+            default_size: 默认图片大小，作为耗时折算的基准
+            num_inference_steps: 配置的推理步数
+            queue_threshold: 排队任务数达到该值时进入第 1 级，0 表示不按排队数降级
+            latency_threshold: 近期耗时中位数达到该秒数时进入第 1 级，0 表示不按耗时降级
+            debug_mode: 是否启用 Debug 日志
+        """
+        self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("QualityGovernor", self.debug_mode)
+        self.num_inference_steps = num_inference_steps
+        self.queue_threshold = max(0, queue_threshold)
+        self.latency_threshold = max(0.0, latency_threshold)
+        self._reference_work = max(1, _pixels(default_size)) * max(1, num_inference_steps)
+        self._latency = LatencyWindow(max_samples=50, max_age=300.0)
+        self.level = 0
+        self.pressure = 0.0
+        self._changed_at = 0.0
+        QUALITY_LEVEL.set(0)
+        self.debug_log(
+            "初始化降级策略: queue_threshold=%s, latency_threshold=%s",
+            self.queue_threshold, self.latency_threshold,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用降级"""
+        return bool(self.queue_threshold or self.latency_threshold)
+
+    def record(self, seconds: float, size: str, steps: int) -> None:
+        """记录一次成功生成的耗时
+
+        Args:
+            seconds: 耗时（秒）
+            size: 实际尺寸
+            steps: 实际推理步数
+        """
+        if not self.latency_threshold:
+            return
+        work = _pixels(size) * steps
+        if work > 0:
+            seconds *= self._reference_work / work
+        self._latency.add(seconds, time.time())
+
+    def _update(self, queue_depth: int, now: float) -> None:
+        """根据当前负载更新降级等级
+
+        Args:
+            queue_depth: 排队中的任务数
+            now: 当前时间戳
+        """
+        pressure = 0.0
+        if self.queue_threshold:
+            pressure = queue_depth / self.queue_threshold
+        if self.latency_threshold:
+            latency = self._latency.percentile(0.5, now)
+            if latency is not None:
+                pressure = max(pressure, latency / self.latency_threshold)
+        self.pressure = pressure
+
+        level = self.level
+        target = min(len(DEGRADE_LEVELS) - 1, int(pressure))
+        if target > level:
+            level = target
+        elif (
+            level > 0
+            and pressure < level * DEGRADE_RECOVERY_RATIO
+            and now - self._changed_at >= DEGRADE_RECOVERY_DWELL
+        ):
+            level -= 1
+        if level != self.level:
+            self.debug_log(
+                "降级等级变化: %s -> %s, pressure=%.2f, queue_depth=%s",
+                self.level, level, pressure, queue_depth,
+            )
+            self.level = level
+            self._changed_at = now
+            QUALITY_LEVEL.set(level)
+
+    def plan(self, size: str, queue_depth: int, now: Optional[float] = None) -> QualityPlan:
+        """确定一次生成使用的尺寸和步数
+
+        Args:
+            size: 请求的尺寸
+            queue_depth: 排队中的任务数
+            now: 当前时间戳，默认取当前时间
+
+        Returns:
+            生成计划
+        """
+        steps = self.num_inference_steps
+        if not self.enabled:
+            return QualityPlan(0, size, steps, size, steps)
+        self._update(queue_depth, time.time() if now is None else now)
+        size_drop, steps_ratio = DEGRADE_LEVELS[self.level]
+        plan = QualityPlan(
+            self.level,
+            lower_size(size, size_drop),
+            max(min(steps, DEGRADE_MIN_STEPS), round(steps * steps_ratio)),
+            size,
+            steps,
+        )
+        if plan.degraded:
+            QUALITY_DEGRADED.inc(str(plan.level))
+        return plan
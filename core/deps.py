@@ -0,0 +1,54 @@
+"""第三方依赖的延迟导入
+
+openai、httpx、aiohttp 和 aiofiles 的导入合计需要数百毫秒（其中 openai 的类型定义占大头），
+而插件加载时一个都用不到。通过本模块的属性访问依赖（``deps.aiohttp.ClientSession()``），
+依赖会在第一次访问时导入并缓存到模块全局变量中，之后的访问与普通的模块属性访问相同。
+
+注意不要写成 ``from .deps import aiohttp``，这会在导入时立即加载依赖。
+"""
+
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    import aiofiles
+    import aiohttp
+    import httpx
+    import openai
+
+# 可以延迟导入的模块
+LAZY_MODULES = ("aiofiles", "aiohttp", "httpx", "openai")
+
+
+def __getattr__(name: str) -> Any:
+    """首次访问时导入依赖（PEP 562）
+
+    Args:
+        name: 模块名
+
+    Returns:
+        导入的模块
+
+    Raises:
+        AttributeError: 不是可延迟导入的模块
+    """
+    if name not in LAZY_MODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(name)
+    # 写入模块全局变量，之后的访问不再经过 __getattr__
+    globals()[name] = module
+    return module
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(LAZY_MODULES))
+
+
+def preload() -> None:
+    """导入所有可延迟导入的依赖
+
+    插件加载后在工作线程中调用，使首个请求不必在事件循环上承担导入耗时。
+    """
+    for name in LAZY_MODULES:
+        if name not in globals():
+            __getattr__(name)
@@ -0,0 +1,154 @@
+"""请求对冲模块
+
+上游调用超过近期耗时的指定分位数仍未完成时，在另一个 API Key 上发出一份相同的请求，
+先完成的结果胜出，以少量额外调用换取更低的尾延迟。取消落败请求并不能停止服务端的推理，
+因此落败请求会继续完成，其图片按请求参数暂存，之后相同参数的请求可以直接使用。
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from .debug_logger import DebugLogger
+from .load_shedder import LatencyWindow
+from .metrics import registry
+
+HEDGES = registry.counter("hedged_requests_total", "对冲请求的结果", ("outcome",))
+
+# 对冲结果
+OUTCOME_PRIMARY_WON = "primary_won"
+OUTCOME_HEDGE_WON = "hedge_won"
+OUTCOME_BUDGET_EXHAUSTED = "budget_exhausted"
+OUTCOME_BOTH_FAILED = "both_failed"
+OUTCOME_SPARE_USED = "spare_used"
+
+HEDGE_MIN_SAMPLES = 20  # 耗时样本少于该数量时不对冲
+HEDGE_BURST = 5.0  # 对冲预算最多累积的次数，允许短时间内集中对冲
+HEDGE_SPARE_TTL = 600.0  # 落败请求的图片暂存时长（秒）
+HEDGE_MAX_SPARES = 32  # 最多暂存的落败请求图片数
+
+
+class HedgePolicy:
+    """对冲策略：按请求形态维护耗时窗口，并用预算限制对冲比例
+
+    每个主请求为预算增加 budget 次对冲额度（最多累积 HEDGE_BURST 次），每次对冲消耗 1 次，
+    因此长期来看对冲请求数不超过主请求数的 budget 倍。
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.0,
+        budget: float = 0.05,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        debug_mode: bool = False,
+    ) -> None:
+        """初始化对冲策略
+
+        Args:
+            percentile: 触发对冲的耗时分位数（0-100），0 表示不对冲
+            budget: 对冲请求占主请求的最大比例
+            min_samples: 耗时样本少于该数量时不对冲
+            debug_mode: 是否启用 Debug 日志
+        """
+        self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("HedgePolicy", self.debug_mode)
+        self.quantile = max(0.0, min(100.0, percentile)) / 100
+        self.budget = max(0.0, budget)
+        self.min_samples = max(1, min_samples)
+        self._windows: dict[tuple[Any, ...], LatencyWindow] = {}
+        self._credits = 0.0
+        # 请求参数 -> (图片路径, 暂存时间)，按暂存顺序排列
+        self._spares: OrderedDict[tuple[Any, ...], tuple[str, float]] = OrderedDict()
+        self.debug_log("初始化对冲策略: percentile=%s, budget=%s", percentile, budget)
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用对冲"""
+        return self.quantile > 0 and self.budget > 0
+
+    def record(self, shape: tuple[Any, ...], seconds: float) -> None:
+        """记录一次成功调用的耗时
+
+        Args:
+            shape: 请求形态（模型、尺寸、步数等），不同形态的耗时分别统计
+            seconds: 耗时（秒）
+        """
+        if not self.enabled:
+            return
+        window = self._windows.get(shape)
+        if window is None:
+            window = self._windows[shape] = LatencyWindow(max_samples=200, max_age=1800.0)
+        window.add(seconds, time.time())
+
+    def delay(self, shape: tuple[Any, ...]) -> Optional[float]:
+        """计算发出对冲请求前的等待时间，并为预算增加额度
+
+        每个主请求调用一次。
+
+        Args:
+            shape: 请求形态
+
+        Returns:
+            等待秒数，不对冲时返回 None
+        """
+        if not self.enabled:
+            return None
+        self._credits = min(HEDGE_BURST, self._credits + self.budget)
+        window = self._windows.get(shape)
+        if window is None or len(window) < self.min_samples:
+            return None
+        return window.percentile(self.quantile, time.time())
+
+    def try_spend(self) -> bool:
+        """尝试消耗一次对冲额度
+
+        Returns:
+            True 表示可以发出对冲请求
+        """
+        if self._credits < 1.0:
+            HEDGES.inc(OUTCOME_BUDGET_EXHAUSTED)
+            return False
+        self._credits -= 1.0
+        return True
+
+    def store_spare(self, request: tuple[Any, ...], path: str) -> None:
+        """暂存落败请求生成的图片
+
+        Args:
+            request: 请求参数（提示词、模型、尺寸、步数）
+            path: 图片本地路径
+        """
+        self._spares[request] = (path, time.monotonic())
+        self._spares.move_to_end(request)
+        while len(self._spares) > HEDGE_MAX_SPARES:
+            self._spares.popitem(last=False)
+        self.debug_log("暂存落败请求的图片: path=%s, spares=%s", path, len(self._spares))
+
+    def take_spare(self, request: tuple[Any, ...]) -> Optional[str]:
+        """取出与请求参数相同的暂存图片（每张图片只使用一次）
+
+        Args:
+            request: 请求参数（提示词、模型、尺寸、步数）
+
+        Returns:
+            图片本地路径，没有未过期的暂存图片时返回 None
+        """
+        now = time.monotonic()
+        while self._spares:
+            oldest, (_, stored_at) = next(iter(self._spares.items()))
+            if now - stored_at <= HEDGE_SPARE_TTL:
+                break
+            del self._spares[oldest]
+        spare = self._spares.pop(request, None)
+        return spare[0] if spare is not None else None
+
+    def snapshot(self) -> dict[str, float]:
+        """导出对冲统计，用于统计展示
+
+        Returns:
+            各结果的次数和剩余额度
+        """
+        stats = {outcome: count for (outcome,), count in HEDGES.items()}
+        stats["credits"] = self._credits
+        stats["spares"] = len(self._spares)
+        return stats
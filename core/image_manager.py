@@ -5,18 +5,24 @@
 
 import asyncio
 import base64
+import contextlib
 import os
+import tempfile
 import time
 from pathlib import Path
-from typing import Optional
-
-import aiofiles
-import aiohttp
+from typing import TYPE_CHECKING, Optional
 
 from astrbot.api import logger
 from astrbot.api.star import StarTools
 
-from .config import MAX_CACHED_IMAGES, PLUGIN_NAME
+from . import deps
+from .config import IMAGE_SPILL_CHUNK_SIZE, MAX_CACHED_IMAGES, PLUGIN_NAME
+from .debug_logger import DebugLogger
+from .memory_budget import MemoryBudget
+from .tracing import trace_span
+
+if TYPE_CHECKING:
+    import aiohttp
 
 
 class ImageManager:
@@ -25,24 +31,18 @@ class ImageManager:
     提供图片下载、保存和自动清理功能，支持多种图片格式。
     """
 
-    def __init__(self, debug_mode: bool = False) -> None:
+    def __init__(self, debug_mode: bool = False, memory: Optional[MemoryBudget] = None) -> None:
         """初始化图片管理器
 
         Args:
             debug_mode: 是否启用 Debug 日志
+            memory: 图片内存预算，默认只统计不限制
         """
         self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("ImageManager", self.debug_mode)
+        self.memory = memory if memory is not None else MemoryBudget(debug_mode=debug_mode)
         self._image_dir: Optional[Path] = None
-        self.debug_log(f"初始化图片管理器: debug_mode={debug_mode}")
-
-    def debug_log(self, message: str) -> None:
-        """输出 Debug 日志
-
-        Args:
-            message: 日志消息
-        """
-        if self.debug_mode:
-            logger.debug(f"[ImageManager] {message}")
+        self.debug_log("初始化图片管理器: debug_mode=%s", debug_mode)
 
     def _get_image_dir(self) -> Path:
         """获取图片保存目录（延迟初始化）
@@ -57,7 +57,7 @@ class ImageManager:
             base_dir = StarTools.get_data_dir(PLUGIN_NAME)
             self._image_dir = base_dir / "images"
             self._image_dir.mkdir(exist_ok=True)
-            self.debug_log(f"初始化图片目录: {self._image_dir}")
+            self.debug_log("初始化图片目录: %s", self._image_dir)
         return self._image_dir
 
     def get_save_path(self, extension: str = ".jpg") -> str:
@@ -75,6 +75,31 @@ class ImageManager:
         filename = f"{int(time.time())}_{os.urandom(4).hex()}{extension}"
         return str(image_dir / filename)
 
+    @staticmethod
+    def get_temp_path(extension: str = ".jpg") -> str:
+        """生成系统临时目录中的唯一路径，用于上传前的中转文件
+
+        临时文件不在图片目录中，不会挤占缓存图片的数量上限，使用后由调用方删除。
+
+        Args:
+            extension: 文件扩展名，默认为 ".jpg"
+
+        Returns:
+            临时文件路径
+        """
+        filename = f"gitee_ai_upload_{int(time.time())}_{os.urandom(4).hex()}{extension}"
+        return os.path.join(tempfile.gettempdir(), filename)
+
+    @staticmethod
+    async def remove_file(filepath: str) -> None:
+        """在线程池中删除文件，文件不存在时忽略
+
+        Args:
+            filepath: 文件路径
+        """
+        with contextlib.suppress(FileNotFoundError):
+            await asyncio.to_thread(os.unlink, filepath)
+
     @staticmethod
     def _get_extension_from_url_or_content_type(
         url: str, content_type: Optional[str] = None
@@ -118,10 +143,11 @@ class ImageManager:
         # 默认返回 .jpg
         return ".jpg"
 
-    async def download_image(self, url: str, session: aiohttp.ClientSession) -> str:
+    async def download_image(self, url: str, session: "aiohttp.ClientSession") -> str:
         """下载图片并异步保存到文件
 
         通过 HTTP 下载图片并保存到本地，使用异步 I/O 提高性能。
+        内存预算足够时整体读入后写盘，不足或响应未给出长度时边读边写磁盘。
 
         Args:
             url: 图片 URL
@@ -134,25 +160,52 @@ class ImageManager:
             Exception: 当 HTTP 状态码不是 200 时抛出异常
             Exception: 当网络请求失败时抛出异常
         """
-        self.debug_log(f"开始下载图片: url={url[:50]}...")
-
-        async with session.get(url) as resp:
-            if resp.status != 200:
-                raise RuntimeError(f"下载图片失败: HTTP {resp.status}")
-            data = await resp.read()
-            content_type = resp.headers.get("Content-Type")
+        self.debug_log("开始下载图片: url=%.50s...", url)
+
+        with trace_span("image.download") as span:
+            async with session.get(url) as resp:
+                if resp.status != 200:
+                    raise RuntimeError(f"下载图片失败: HTTP {resp.status}")
+                content_type = resp.headers.get("Content-Type")
+                # 根据内容类型或 URL 确定文件扩展名
+                extension = self._get_extension_from_url_or_content_type(url, content_type)
+                filepath = self.get_save_path(extension)
+                length = resp.content_length
+                async with self.memory.reserve(length or 0, spill=True) as buffered:
+                    if buffered and length is not None:
+                        data = await resp.read()
+                        size = len(data)
+                        with trace_span("image.save", bytes=size):
+                            async with deps.aiofiles.open(filepath, "wb") as f:
+                                await f.write(data)
+                        del data
+                    else:
+                        size = await self.stream_to_file(resp, filepath)
+            if span is not None:
+                span.set_attribute("bytes", size)
+
+        self.debug_log(
+            "图片保存成功: %s, size=%s bytes, content_type=%s", filepath, size, content_type
+        )
+        return filepath
 
-        self.debug_log(f"图片下载完成: size={len(data)} bytes, content_type={content_type}")
+    async def stream_to_file(self, resp: "aiohttp.ClientResponse", filepath: str) -> int:
+        """边读边写磁盘，内存中只保留一个分块
 
-        # 根据内容类型或 URL 确定文件扩展名
-        extension = self._get_extension_from_url_or_content_type(url, content_type)
-        filepath = self.get_save_path(extension)
-
-        async with aiofiles.open(filepath, "wb") as f:
-            await f.write(data)
+        Args:
+            resp: 下载响应
+            filepath: 保存路径
 
-        self.debug_log(f"图片保存成功: {filepath}")
-        return filepath
+        Returns:
+            写入的字节数
+        """
+        size = 0
+        with trace_span("image.spill"):
+            async with deps.aiofiles.open(filepath, "wb") as f:
+                async for chunk in resp.content.iter_chunked(IMAGE_SPILL_CHUNK_SIZE):
+                    size += len(chunk)
+                    await f.write(chunk)
+        return size
 
     async def save_base64_image(self, b64_data: str) -> str:
         """异步保存 base64 图片到文件
@@ -169,7 +222,7 @@ class ImageManager:
             ValueError: 当 Base64 数据无效时抛出异常
             OSError: 当文件写入失败时抛出异常
         """
-        self.debug_log(f"开始保存 Base64 图片: data_size={len(b64_data)}")
+        self.debug_log("开始保存 Base64 图片: data_size=%s", len(b64_data))
 
         # 检查是否包含 data URI 前缀
         extension = ".jpg"  # 默认扩展名
@@ -190,24 +243,54 @@ class ImageManager:
                         extension = ".gif"
                     elif mime_type_lower == "image/bmp":
                         extension = ".bmp"
-                    self.debug_log(f"从 Base64 前缀检测到格式: {mime_type}")
+                    self.debug_log("从 Base64 前缀检测到格式: %s", mime_type)
             except Exception as e:
-                self.debug_log(f"解析 Base64 前缀失败: {e}，使用默认格式")
+                self.debug_log("解析 Base64 前缀失败: %s，使用默认格式", e)
 
         # 解码 Base64 数据
         # 如果包含 data URI 前缀，需要先移除
         if "," in b64_data:
             b64_data = b64_data.split(",", 1)[1]
 
-        image_bytes = base64.b64decode(b64_data)
-
         filepath = self.get_save_path(extension)
-        async with aiofiles.open(filepath, "wb") as f:
-            await f.write(image_bytes)
-
-        self.debug_log(f"Base64 图片保存成功: {filepath}, size={len(image_bytes)} bytes")
+        async with self.memory.reserve(len(b64_data) * 3 // 4, spill=True) as buffered:
+            if buffered:
+                with trace_span("image.decode", chars=len(b64_data)):
+                    image_bytes = base64.b64decode(b64_data)
+                size = len(image_bytes)
+                with trace_span("image.save", bytes=size):
+                    async with deps.aiofiles.open(filepath, "wb") as f:
+                        await f.write(image_bytes)
+                del image_bytes
+            else:
+                size = await self._decode_base64_to_file(b64_data, filepath)
+
+        self.debug_log("Base64 图片保存成功: %s, size=%s bytes", filepath, size)
         return filepath
 
+    async def _decode_base64_to_file(self, b64_data: str, filepath: str) -> int:
+        """分块解码 Base64 并写入磁盘，内存中只保留一个分块的解码结果
+
+        Args:
+            b64_data: 不含 data URI 前缀的 Base64 数据
+            filepath: 保存路径
+
+        Returns:
+            写入的字节数
+        """
+        if "\n" in b64_data or "\r" in b64_data or " " in b64_data:
+            b64_data = "".join(b64_data.split())
+        # 分块长度必须是 4 的倍数，才能独立解码
+        step = IMAGE_SPILL_CHUNK_SIZE // 3 * 4
+        size = 0
+        with trace_span("image.spill", chars=len(b64_data)):
+            async with deps.aiofiles.open(filepath, "wb") as f:
+                for start in range(0, len(b64_data), step):
+                    chunk = base64.b64decode(b64_data[start:start + step])
+                    size += len(chunk)
+                    await f.write(chunk)
+        return size
+
     def _sync_cleanup_old_images(self) -> None:
         """同步清理旧图片（在线程池中执行）
 
@@ -229,7 +312,7 @@ class ImageManager:
                     if entry.is_file() and entry.name.lower().endswith(tuple(supported_exts)):
                         images_with_mtime.append((entry.path, entry.stat().st_mtime))
 
-            self.debug_log(f"清理旧图片: total={len(images_with_mtime)}, max={MAX_CACHED_IMAGES}")
+            self.debug_log("清理旧图片: total=%s, max=%s", len(images_with_mtime), MAX_CACHED_IMAGES)
 
             # 按修改时间排序（已预先获取 mtime，无需再次调用 stat）
             images_with_mtime.sort(key=lambda x: x[1])
@@ -243,11 +326,14 @@ class ImageManager:
                         deleted_count += 1
                     except OSError as e:
                         # 记录删除失败的文件，可能是已被其他进程删除
-                        self.debug_log(f"删除文件失败: {img_path}, 错误: {e}")
-                self.debug_log(f"清理完成: deleted={deleted_count}, kept={len(images_with_mtime) - deleted_count}")
+                        self.debug_log("删除文件失败: %s, 错误: %s", img_path, e)
+                self.debug_log(
+                    "清理完成: deleted=%s, kept=%s",
+                    deleted_count, len(images_with_mtime) - deleted_count,
+                )
         except OSError as e:
             logger.warning(f"清理旧图片时出错: {e}")
-            self.debug_log(f"清理旧图片失败: {e}")
+            self.debug_log("清理旧图片失败: %s", e)
 
     async def cleanup_old_images(self) -> None:
         """异步清理旧图片，使用线程池执行阻塞操作
@@ -0,0 +1,509 @@
+"""多进程任务队列模块
+
+开启任务队列模式后，文生图和图片编辑的上游调用不再在插件的事件循环中执行，而是写入
+WAL 模式的 SQLite 任务队列，由独立的工作进程领取执行，结果（本地图片路径或错误）写回
+队列后由发起任务的实例取回并发送。同一主机上的多个实例可以共用一个队列文件，
+空闲实例的工作进程会分担繁忙实例的任务。
+
+工作进程定期续约；租约过期的任务重新排队，被领取超过 JOB_QUEUE_MAX_ATTEMPTS 次时判定失败。
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Optional, TypeVar
+
+from astrbot.api import logger
+
+from .config import (
+    JOB_QUEUE_BUSY_TIMEOUT,
+    JOB_QUEUE_LEASE_SECONDS,
+    JOB_QUEUE_MAX_ATTEMPTS,
+    JOB_QUEUE_POLL_INTERVAL,
+    JOB_QUEUE_RESULT_TTL,
+    SHARED_STATE_CLEANUP_EVERY,
+)
+from .deadline import current_deadline, with_deadline
+from .debug_logger import DebugLogger
+from .metrics import registry
+
+T = TypeVar("T")
+
+JOB_QUEUE_ERRORS = registry.counter("job_queue_errors_total", "任务队列读写失败的次数", ("op",))
+JOB_QUEUE_JOBS = registry.counter(
+    "job_queue_jobs_total", "本实例经任务队列执行的任务数", ("kind", "outcome")
+)
+JOB_QUEUE_WAIT = registry.histogram(
+    "job_queue_wait_seconds", "任务从写入队列到被工作进程领取的耗时", ("kind",)
+)
+
+# 任务状态
+STATE_QUEUED = "queued"
+STATE_RUNNING = "running"
+STATE_DONE = "done"
+
+# 任务结果
+OUTCOME_DONE = "done"
+OUTCOME_FAILED = "failed"
+OUTCOME_CANCELLED = "cancelled"
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS jobs ("
+    "id INTEGER PRIMARY KEY AUTOINCREMENT, instance TEXT NOT NULL, kind TEXT NOT NULL, "
+    "payload TEXT NOT NULL, state TEXT NOT NULL, worker TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+    "lease_until REAL, cancel INTEGER NOT NULL DEFAULT 0, result TEXT, "
+    "created_at REAL NOT NULL, updated_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id)",
+    "CREATE INDEX IF NOT EXISTS jobs_instance ON jobs (instance, state)",
+)
+
+
+class JobQueue:
+    """基于 SQLite WAL 的持久化任务队列
+
+    发起实例和工作进程各自持有一个 JobQueue。每个操作都是一个 BEGIN IMMEDIATE 短事务，
+    读写失败时计数并抛出 sqlite3.Error，由调用方决定如何处理。
+    """
+
+    def __init__(self, path: str, debug_mode: bool = False) -> None:
+        """初始化任务队列
+
+        Args:
+            path: SQLite 文件路径，共用队列的实例和工作进程需配置同一路径
+            debug_mode: 是否启用 Debug 日志
+        """
+        self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("JobQueue", self.debug_mode)
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._ops = 0
+        self.debug_log("初始化任务队列: path=%s", path)
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开数据库连接（延迟初始化）"""
+        if self._conn is None:
+            conn = sqlite3.connect(
+                self.path,
+                timeout=JOB_QUEUE_BUSY_TIMEOUT,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            self._conn = conn
+        return self._conn
+
+    def _transaction(self, op: str, func: Callable[..., T], *args: object) -> T:
+        """在 BEGIN IMMEDIATE 事务中执行操作
+
+        Args:
+            op: 操作名称，用于错误计数
+            func: 接收连接和 args 的函数
+            *args: 传给 func 的参数
+
+        Returns:
+            func 的返回值
+
+        Raises:
+            sqlite3.Error: 读写失败
+        """
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    result = func(conn, *args)
+                    self._ops += 1
+                    if self._ops % SHARED_STATE_CLEANUP_EVERY == 0:
+                        self._cleanup(conn, time.time())
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                conn.execute("COMMIT")
+                return result
+            except sqlite3.Error:
+                JOB_QUEUE_ERRORS.inc(op)
+                raise
+
+    @staticmethod
+    def _cleanup(conn: sqlite3.Connection, now: float) -> None:
+        """删除无人取回的过期结果，以及执行者已退出的已取消任务"""
+        conn.execute(
+            "DELETE FROM jobs WHERE state = ? AND updated_at < ?",
+            (STATE_DONE, now - JOB_QUEUE_RESULT_TTL),
+        )
+        conn.execute(
+            "DELETE FROM jobs WHERE cancel = 1 AND (state != ? OR lease_until < ?)",
+            (STATE_RUNNING, now),
+        )
+
+    def enqueue(self, instance: str, kind: str, payload: dict[str, Any]) -> int:
+        """写入一个任务
+
+        Args:
+            instance: 发起实例的标识，结果只会被该实例取回
+            kind: 任务类型（generate 或 edit）
+            payload: 调用参数，需可序列化为 JSON
+
+        Returns:
+            任务 ID
+        """
+        data = json.dumps(payload, ensure_ascii=False)
+
+        def op(conn: sqlite3.Connection, now: float) -> int:
+            cursor = conn.execute(
+                "INSERT INTO jobs (instance, kind, payload, state, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (instance, kind, data, STATE_QUEUED, now, now),
+            )
+            return cursor.lastrowid
+
+        return self._transaction("enqueue", op, time.time())
+
+    def claim(self, worker: str) -> Optional[tuple[int, str, dict[str, Any], float]]:
+        """领取最早的排队任务或租约已过期的任务
+
+        Args:
+            worker: 工作进程标识
+
+        Returns:
+            (任务 ID, 任务类型, 调用参数, 排队秒数)，没有可领取的任务时返回 None
+        """
+        def op(conn: sqlite3.Connection, now: float) -> Optional[tuple[int, str, dict, float]]:
+            while True:
+                row = conn.execute(
+                    "SELECT id, kind, payload, attempts, created_at FROM jobs WHERE cancel = 0 "
+                    "AND (state = ? OR (state = ? AND lease_until < ?)) ORDER BY id LIMIT 1",
+                    (STATE_QUEUED, STATE_RUNNING, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                job_id, kind, payload, attempts, created_at = row
+                if attempts >= JOB_QUEUE_MAX_ATTEMPTS:
+                    logger.warning(f"任务 {job_id} 的工作进程多次异常退出，判定任务失败")
+                    self._store_result(conn, job_id, now, {
+                        "error": "工作进程异常退出，任务执行失败", "type": "RuntimeError",
+                    })
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET state = ?, worker = ?, attempts = attempts + 1, "
+                    "lease_until = ?, updated_at = ? WHERE id = ?",
+                    (STATE_RUNNING, worker, now + JOB_QUEUE_LEASE_SECONDS, now, job_id),
+                )
+                return job_id, kind, json.loads(payload), max(0.0, now - created_at)
+
+        now = time.time()
+        if not self._has_claimable(now):
+            return None
+        return self._transaction("claim", op, now)
+
+    def _has_claimable(self, now: float) -> bool:
+        """不加写锁地检查是否有可领取的任务，避免空闲的工作进程频繁占用写锁"""
+        with self._lock:
+            try:
+                row = self._connect().execute(
+                    "SELECT 1 FROM jobs WHERE cancel = 0 "
+                    "AND (state = ? OR (state = ? AND lease_until < ?)) LIMIT 1",
+                    (STATE_QUEUED, STATE_RUNNING, now),
+                ).fetchone()
+            except sqlite3.Error:
+                JOB_QUEUE_ERRORS.inc("claim")
+                raise
+        return row is not None
+
+    def renew(self, worker: str, job_ids: list[int]) -> list[int]:
+        """为执行中的任务续约，并返回其中已被发起实例取消的任务
+
+        Args:
+            worker: 工作进程标识
+            job_ids: 本工作进程执行中的任务 ID
+
+        Returns:
+            需要取消的任务 ID
+        """
+        if not job_ids:
+            return []
+        placeholders = ",".join("?" * len(job_ids))
+
+        def op(conn: sqlite3.Connection, now: float) -> list[int]:
+            conn.execute(
+                f"UPDATE jobs SET lease_until = ? WHERE worker = ? AND state = ? "
+                f"AND id IN ({placeholders})",
+                (now + JOB_QUEUE_LEASE_SECONDS, worker, STATE_RUNNING, *job_ids),
+            )
+            return [row[0] for row in conn.execute(
+                f"SELECT id FROM jobs WHERE cancel = 1 AND id IN ({placeholders})", job_ids
+            )]
+
+        return self._transaction("renew", op, time.time())
+
+    @staticmethod
+    def _store_result(
+        conn: sqlite3.Connection, job_id: int, now: float, result: dict[str, Any]
+    ) -> None:
+        """写入任务结果，已取消的任务直接删除"""
+        conn.execute("DELETE FROM jobs WHERE id = ? AND cancel = 1", (job_id,))
+        conn.execute(
+            "UPDATE jobs SET state = ?, result = ?, lease_until = NULL, updated_at = ? "
+            "WHERE id = ?",
+            (STATE_DONE, json.dumps(result, ensure_ascii=False), now, job_id),
+        )
+
+    def finish(self, job_id: int, worker: str, result: dict[str, Any]) -> bool:
+        """写回任务结果
+
+        租约过期后任务可能已被其他工作进程重新领取，此时丢弃本次结果。
+
+        Args:
+            job_id: 任务 ID
+            worker: 工作进程标识
+            result: {"path": 图片路径} 或 {"error": 错误信息, "type": 异常类型}
+
+        Returns:
+            结果是否被采用
+        """
+        def op(conn: sqlite3.Connection, now: float) -> bool:
+            row = conn.execute(
+                "SELECT 1 FROM jobs WHERE id = ? AND worker = ? AND state = ?",
+                (job_id, worker, STATE_RUNNING),
+            ).fetchone()
+            if row is None:
+                return False
+            self._store_result(conn, job_id, now, result)
+            return True
+
+        return self._transaction("finish", op, time.time())
+
+    def requeue(self, worker: str, job_ids: list[int]) -> None:
+        """工作进程停止时把执行中的任务放回队列，不计入领取次数
+
+        Args:
+            worker: 工作进程标识
+            job_ids: 要放回的任务 ID
+        """
+        if not job_ids:
+            return
+        placeholders = ",".join("?" * len(job_ids))
+
+        def op(conn: sqlite3.Connection, now: float) -> None:
+            conn.execute(
+                f"DELETE FROM jobs WHERE cancel = 1 AND id IN ({placeholders})", job_ids
+            )
+            conn.execute(
+                f"UPDATE jobs SET state = ?, worker = NULL, attempts = attempts - 1, "
+                f"lease_until = NULL, updated_at = ? WHERE worker = ? AND state = ? "
+                f"AND id IN ({placeholders})",
+                (STATE_QUEUED, now, worker, STATE_RUNNING, *job_ids),
+            )
+
+        self._transaction("requeue", op, time.time())
+
+    def cancel(self, job_ids: list[int]) -> None:
+        """取消任务：排队中的直接删除，执行中的标记取消，由工作进程在续约时发现
+
+        Args:
+            job_ids: 任务 ID
+        """
+        if not job_ids:
+            return
+        placeholders = ",".join("?" * len(job_ids))
+
+        def op(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                f"DELETE FROM jobs WHERE state != ? AND id IN ({placeholders})",
+                (STATE_RUNNING, *job_ids),
+            )
+            conn.execute(f"UPDATE jobs SET cancel = 1 WHERE id IN ({placeholders})", job_ids)
+
+        self._transaction("cancel", op)
+
+    def collect(self, instance: str) -> list[tuple[int, dict[str, Any]]]:
+        """取回并删除本实例已完成任务的结果
+
+        Args:
+            instance: 发起实例的标识
+
+        Returns:
+            (任务 ID, 结果) 列表
+        """
+        def op(conn: sqlite3.Connection) -> list[tuple[int, dict[str, Any]]]:
+            rows = conn.execute(
+                "SELECT id, result FROM jobs WHERE instance = ? AND state = ?",
+                (instance, STATE_DONE),
+            ).fetchall()
+            if rows:
+                conn.execute(
+                    "DELETE FROM jobs WHERE instance = ? AND state = ?", (instance, STATE_DONE)
+                )
+            return [(job_id, json.loads(result)) for job_id, result in rows]
+
+        return self._transaction("collect", op)
+
+    def counts(self) -> dict[str, int]:
+        """统计队列中各状态的任务数（所有实例合计）
+
+        Returns:
+            状态 -> 任务数
+        """
+        def op(conn: sqlite3.Connection) -> dict[str, int]:
+            counts = dict.fromkeys((STATE_QUEUED, STATE_RUNNING, STATE_DONE), 0)
+            counts.update(conn.execute(
+                "SELECT state, COUNT(*) FROM jobs WHERE cancel = 0 GROUP BY state"
+            ).fetchall())
+            return counts
+
+        return self._transaction("counts", op)
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class JobDispatcher:
+    """把上游调用写入任务队列并等待结果的发起端
+
+    每个实例有唯一的标识，后台任务定期取回本实例的结果并唤醒等待者。
+    等待被取消（用户取消、超时或插件关闭）时，队列中的任务也会被取消。
+    队列读写都在线程池中执行，等待数据库锁时不会阻塞事件循环。
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        instance: str,
+        poll_interval: float = JOB_QUEUE_POLL_INTERVAL,
+        debug_mode: bool = False,
+    ) -> None:
+        """初始化发起端
+
+        Args:
+            queue: 任务队列
+            instance: 本实例的唯一标识
+            poll_interval: 取回结果的轮询间隔（秒）
+            debug_mode: 是否启用 Debug 日志
+        """
+        self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("JobDispatcher", self.debug_mode)
+        self.queue = queue
+        self.instance = instance
+        self.poll_interval = poll_interval
+        self._pending: dict[int, asyncio.Future[dict[str, Any]]] = {}
+        self._task: Optional[asyncio.Task[None]] = None
+        self.debug_log("初始化任务队列发起端: instance=%s", instance)
+
+    @property
+    def pending_count(self) -> int:
+        """本实例等待结果的任务数"""
+        return len(self._pending)
+
+    async def run(self, kind: str, payload: dict[str, Any]) -> str:
+        """写入任务并等待工作进程返回图片路径
+
+        当前请求有总时限时，剩余时间随任务传给工作进程。
+
+        Args:
+            kind: 任务类型（generate 或 edit）
+            payload: 传给工作进程中 API 客户端对应方法的参数
+
+        Returns:
+            图片本地文件路径
+
+        Raises:
+            RuntimeError: 队列不可用或任务执行失败
+            DeadlineExceeded: 超出请求总时限
+        """
+        deadline = current_deadline.get()
+        if deadline is not None:
+            payload = dict(payload, deadline={
+                "command": deadline.command,
+                "budget": deadline.budget,
+                "remaining": deadline.remaining(),
+            })
+        try:
+            job_id = await asyncio.to_thread(self.queue.enqueue, self.instance, kind, payload)
+        except sqlite3.Error as e:
+            raise RuntimeError(f"任务队列不可用: {e}") from e
+
+        future: asyncio.Future[dict[str, Any]] = asyncio.get_running_loop().create_future()
+        self._pending[job_id] = future
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._collect())
+        self.debug_log.sampled("任务已写入队列: job_id=%s, kind=%s", job_id, kind)
+
+        try:
+            result = await with_deadline("inference", future)
+        except BaseException:
+            JOB_QUEUE_JOBS.inc(kind, OUTCOME_CANCELLED)
+            await self._cancel([job_id])
+            raise
+        finally:
+            self._pending.pop(job_id, None)
+
+        if "queue_wait" in result:
+            JOB_QUEUE_WAIT.observe(result["queue_wait"], kind)
+        if "path" in result:
+            JOB_QUEUE_JOBS.inc(kind, OUTCOME_DONE)
+            return result["path"]
+        JOB_QUEUE_JOBS.inc(kind, OUTCOME_FAILED)
+        if result.get("type") == "DeadlineExceeded" and deadline is not None:
+            raise deadline.exceeded(result.get("stage") or "inference")
+        raise RuntimeError(result.get("error") or "任务执行失败")
+
+    async def _cancel(self, job_ids: list[int]) -> None:
+        """取消队列中的任务，失败时只记录日志（租约过期后结果会被清理）"""
+        try:
+            await asyncio.to_thread(self.queue.cancel, job_ids)
+        except sqlite3.Error as e:
+            logger.warning(f"取消队列任务失败: job_ids={job_ids}, error={e}")
+
+    async def _collect(self) -> None:
+        """有等待者时定期取回本实例的结果"""
+        while self._pending:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                rows = await asyncio.to_thread(self.queue.collect, self.instance)
+            except sqlite3.Error as e:
+                logger.warning(f"取回任务结果失败: {e}")
+                continue
+            for job_id, result in rows:
+                future = self._pending.get(job_id)
+                if future is not None and not future.done():
+                    future.set_result(result)
+
+    async def snapshot(self) -> dict[str, int]:
+        """导出队列状态，用于统计展示
+
+        Returns:
+            本实例等待结果的任务数和队列中各状态的任务数，队列不可用时只有前者
+        """
+        stats = {"pending": self.pending_count}
+        try:
+            stats.update(await asyncio.to_thread(self.queue.counts))
+        except sqlite3.Error:
+            pass
+        return stats
+
+    async def close(self) -> None:
+        """取消本实例仍在等待的任务并停止取回结果"""
+        if self._pending:
+            for future in self._pending.values():
+                future.cancel()
+            job_ids = list(self._pending)
+            self._pending.clear()
+            await self._cancel(job_ids)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.queue.close)
@@ -0,0 +1,192 @@
+"""负载削减模块
+
+根据观测到的请求耗时估算排队等待时间，在负载过高时拒绝或延后新任务。
+"""
+
+import time
+from collections import deque
+from typing import Any, Optional
+
+from .debug_logger import DebugLogger
+
+# 没有观测数据时使用的默认耗时（秒）
+DEFAULT_SERVICE_TIMES: dict[str, float] = {
+    "generate": 20.0,
+    "draw": 20.0,
+    "style": 30.0,
+    "ai-edit": 120.0,
+}
+
+
+class LatencyWindow:
+    """滚动耗时窗口，保留最近的样本并支持分位数查询"""
+
+    __slots__ = ("_samples", "max_age")
+
+    def __init__(self, max_samples: int = 200, max_age: float = 1800.0) -> None:
+        """初始化耗时窗口
+
+        Args:
+            max_samples: 最多保留的样本数
+            max_age: 样本最长保留时间（秒）
+        """
+        self._samples: deque[tuple[float, float]] = deque(maxlen=max_samples)
+        self.max_age = max_age
+
+    def add(self, seconds: float, now: float) -> None:
+        """添加一个耗时样本
+
+        Args:
+            seconds: 耗时（秒）
+            now: 当前时间戳
+        """
+        self._samples.append((now, seconds))
+
+    def _expire(self, now: float) -> None:
+        """淘汰过旧的样本
+
+        Args:
+            now: 当前时间戳
+        """
+        samples = self._samples
+        while samples and now - samples[0][0] > self.max_age:
+            samples.popleft()
+
+    def percentile(self, q: float, now: float) -> Optional[float]:
+        """查询耗时分位数
+
+        Args:
+            q: 分位数（0-1）
+            now: 当前时间戳
+
+        Returns:
+            分位数耗时，没有样本时返回 None
+        """
+        self._expire(now)
+        if not self._samples:
+            return None
+        values = sorted(seconds for _, seconds in self._samples)
+        return values[min(len(values) - 1, int(len(values) * q))]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class LoadShedder:
+    """负载削减器，按命令和模型维护滚动耗时分布并估算等待时间"""
+
+    def __init__(
+        self,
+        debug_mode: bool = False,
+        max_wait_seconds: float = 300.0,
+        mode: str = "reject",
+    ) -> None:
+        """初始化负载削减器
+
+        Args:
+            debug_mode: 是否启用 Debug 日志
+            max_wait_seconds: 预计等待时间阈值（秒），0 表示不削减
+            mode: 超过阈值时的处理方式，reject 拒绝，defer 降级到低优先级通道
+        """
+        self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("LoadShedder", self.debug_mode)
+        self.max_wait_seconds = max_wait_seconds
+        self.mode = mode if mode in ("reject", "defer") else "reject"
+        self._by_command: dict[str, LatencyWindow] = {}
+        self._by_model: dict[str, LatencyWindow] = {}
+        self.debug_log("初始化负载削减器: max_wait_seconds=%s, mode=%s", max_wait_seconds, self.mode)
+
+    def record(self, command: str, model: str, seconds: float) -> None:
+        """记录一次完成的请求耗时
+
+        Args:
+            command: 命令名称
+            model: 使用的模型
+            seconds: 耗时（秒）
+        """
+        now = time.time()
+        self._by_command.setdefault(command, LatencyWindow()).add(seconds, now)
+        if model:
+            self._by_model.setdefault(model, LatencyWindow()).add(seconds, now)
+
+    def service_time(self, command: str, model: str = "", q: float = 0.5) -> float:
+        """估算单个任务的执行耗时
+
+        优先使用命令维度的观测值，其次是模型维度，最后使用默认值。
+
+        Args:
+            command: 命令名称
+            model: 使用的模型
+            q: 分位数
+
+        Returns:
+            估算耗时（秒）
+        """
+        now = time.time()
+        for windows, key in ((self._by_command, command), (self._by_model, model)):
+            window = windows.get(key)
+            if window is not None:
+                value = window.percentile(q, now)
+                if value is not None:
+                    return value
+        return DEFAULT_SERVICE_TIMES.get(command, 30.0)
+
+    def estimate_wait(self, command: str, model: str, ahead: int, concurrency: int) -> float:
+        """根据前面的任务数估算新任务的完成时间
+
+        Args:
+            command: 命令名称
+            model: 使用的模型
+            ahead: 排队和执行中的任务数
+            concurrency: 并发执行上限
+
+        Returns:
+            预计完成时间（秒）
+        """
+        service = self.service_time(command, model)
+        return (ahead / max(1, concurrency) + 1) * service
+
+    def should_shed(self, estimate: float) -> bool:
+        """判断预计完成时间是否超过阈值
+
+        Args:
+            estimate: 预计完成时间（秒）
+
+        Returns:
+            True 表示应拒绝或延后
+        """
+        return self.max_wait_seconds > 0 and estimate > self.max_wait_seconds
+
+    def snapshot(self) -> dict[str, Any]:
+        """导出各命令和模型的耗时分布，用于监控
+
+        Returns:
+            包含 p50/p95 和样本数的字典
+        """
+        now = time.time()
+
+        def describe(windows: dict[str, LatencyWindow]) -> dict[str, dict[str, Any]]:
+            return {
+                key: {
+                    "p50": window.percentile(0.5, now),
+                    "p95": window.percentile(0.95, now),
+                    "samples": len(window),
+                }
+                for key, window in windows.items()
+            }
+
+        return {"commands": describe(self._by_command), "models": describe(self._by_model)}
+
+
+def format_duration(seconds: float) -> str:
+    """格式化时长，用于回复用户
+
+    Args:
+        seconds: 秒数
+
+    Returns:
+        例如 "45 秒"、"3 分钟"
+    """
+    if seconds < 60:
+        return f"{seconds:.0f} 秒"
+    return f"{seconds / 60:.0f} 分钟"
@@ -0,0 +1,157 @@
+"""图片内存预算模块
+
+为进行中的图片缓冲（附件下载、上传表单、响应内容和 Base64 字符串）维护一个全局的字节预算。
+缓冲分配前先从预算中占用，预算不足时等待，或改为边读边写磁盘，避免并发大图把内存撑满。
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+from .config import IMAGE_MEMORY_SPILL_WAIT
+from .debug_logger import DebugLogger
+from .metrics import registry
+
+IMAGE_MEMORY_BYTES = registry.gauge("image_memory_bytes", "图片缓冲当前占用的内存（字节）")
+IMAGE_MEMORY_PEAK_BYTES = registry.gauge("image_memory_peak_bytes", "图片缓冲占用内存的峰值（字节）")
+IMAGE_MEMORY_EVENTS = registry.counter(
+    "image_memory_events_total", "图片内存预算不足的处理结果", ("outcome",)
+)
+
+# 预算不足时的处理结果
+OUTCOME_WAITED = "waited"
+OUTCOME_SPILLED = "spilled"
+
+
+class MemoryBudget:
+    """全局图片内存预算
+
+    占用量始终统计，limit_bytes 为 0 时只统计不限制。单次占用超过整个预算时，
+    在没有其他占用的情况下仍然放行，避免大图永远等不到预算。
+    """
+
+    def __init__(
+        self,
+        limit_bytes: int = 0,
+        spill_wait: float = IMAGE_MEMORY_SPILL_WAIT,
+        debug_mode: bool = False,
+    ) -> None:
+        """初始化内存预算
+
+        Args:
+            limit_bytes: 预算上限（字节），0 表示不限制
+            spill_wait: 可落盘的调用方在预算不足时最多等待的秒数，超时后改为落盘
+            debug_mode: 是否启用 Debug 日志
+        """
+        self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("MemoryBudget", self.debug_mode)
+        self.limit_bytes = max(0, limit_bytes)
+        self.spill_wait = max(0.0, spill_wait)
+        self.used = 0
+        self.peak = 0
+        self._waiting = 0
+        self._condition: Optional[asyncio.Condition] = None
+        IMAGE_MEMORY_BYTES.set(0)
+        IMAGE_MEMORY_PEAK_BYTES.set(0)
+        self.debug_log("初始化图片内存预算: limit_bytes=%s", self.limit_bytes)
+
+    def _get_condition(self) -> asyncio.Condition:
+        """获取条件变量（延迟创建，确保绑定到运行中的事件循环）"""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _fits(self, nbytes: int) -> bool:
+        """预算是否能容纳 nbytes"""
+        return not self.limit_bytes or not self.used or self.used + nbytes <= self.limit_bytes
+
+    def _add(self, nbytes: int) -> None:
+        """增加占用量并更新峰值"""
+        self.used += nbytes
+        IMAGE_MEMORY_BYTES.set(self.used)
+        if self.used > self.peak:
+            self.peak = self.used
+            IMAGE_MEMORY_PEAK_BYTES.set(self.peak)
+
+    async def _release(self, nbytes: int) -> None:
+        """归还占用量并唤醒等待者"""
+        # 先同步归还，即使唤醒等待者时被取消也不会泄漏预算
+        self.used -= nbytes
+        IMAGE_MEMORY_BYTES.set(self.used)
+        condition = self._get_condition()
+        async with condition:
+            condition.notify_all()
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int, spill: bool = False) -> AsyncIterator[bool]:
+        """在分配缓冲前占用预算，退出时归还
+
+        Args:
+            nbytes: 要占用的字节数
+            spill: 调用方能否改为落盘。True 时最多等待 spill_wait 秒，仍不足则不占用预算；
+                False 时一直等待到预算足够
+
+        Yields:
+            True 表示已占用预算，可以在内存中缓冲；False 表示应改为边读边写磁盘
+        """
+        nbytes = max(0, nbytes)
+        condition = self._get_condition()
+        async with condition:
+            if not self._fits(nbytes):
+                self._waiting += 1
+                try:
+                    if spill:
+                        await asyncio.wait_for(
+                            condition.wait_for(lambda: self._fits(nbytes)), self.spill_wait
+                        )
+                    else:
+                        await condition.wait_for(lambda: self._fits(nbytes))
+                except asyncio.TimeoutError:
+                    IMAGE_MEMORY_EVENTS.inc(OUTCOME_SPILLED)
+                    self.debug_log.sampled(
+                        "图片内存预算不足，改为落盘: nbytes=%s, used=%s", nbytes, self.used
+                    )
+                    nbytes = -1
+                else:
+                    IMAGE_MEMORY_EVENTS.inc(OUTCOME_WAITED)
+                finally:
+                    self._waiting -= 1
+            if nbytes >= 0:
+                self._add(nbytes)
+
+        if nbytes < 0:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            await self._release(nbytes)
+
+    @asynccontextmanager
+    async def track(self, nbytes: int) -> AsyncIterator[None]:
+        """统计已经在内存中的缓冲（例如 SDK 解析好的响应），不等待也不受上限约束
+
+        Args:
+            nbytes: 缓冲的字节数
+        """
+        nbytes = max(0, nbytes)
+        self._add(nbytes)
+        try:
+            yield
+        finally:
+            await self._release(nbytes)
+
+    def snapshot(self) -> dict[str, Any]:
+        """导出预算使用情况，用于统计展示
+
+        Returns:
+            当前占用、峰值、上限、等待中的请求数和各处理结果的次数
+        """
+        stats: dict[str, Any] = {
+            "used": self.used,
+            "peak": self.peak,
+            "limit": self.limit_bytes,
+            "waiting": self._waiting,
+        }
+        stats.update({outcome: count for (outcome,), count in IMAGE_MEMORY_EVENTS.items()})
+        return stats
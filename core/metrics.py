@@ -0,0 +1,395 @@
+"""指标统计模块
+
+提供进程内的计数器、仪表盘和直方图，支持导出为 Prometheus 文本格式。
+"""
+
+import asyncio
+import os
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+
+from astrbot.api import logger
+from astrbot.api.star import StarTools
+
+from .config import PLUGIN_NAME
+from .debug_logger import DebugLogger
+
+# 默认的耗时直方图分桶（秒），覆盖从下载到长时间编辑任务的范围
+DEFAULT_LATENCY_BUCKETS = (
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0, 600.0,
+)
+
+
+def _escape_label(value: Any) -> str:
+    """转义标签值中的反斜杠、双引号和换行"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    """格式化 Prometheus 标签
+
+    Args:
+        labelnames: 标签名
+        values: 标签值
+        extra: 额外的标签片段（如 le="0.5"）
+
+    Returns:
+        形如 {a="1",b="2"} 的字符串，没有标签时返回空字符串
+    """
+    parts = [f'{name}="{_escape_label(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """单调递增计数器"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        """初始化计数器
+
+        Args:
+            name: 指标名
+            documentation: 指标说明
+            labelnames: 标签名
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        """计数加一（或指定数量）
+
+        Args:
+            *labels: 按 labelnames 顺序给出的标签值
+            amount: 增加的数量
+        """
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def items(self) -> Iterable[tuple[tuple[str, ...], float]]:
+        """返回 (标签值, 计数) 列表"""
+        return list(self._values.items())
+
+    def render(self) -> list[str]:
+        """渲染为 Prometheus 文本行"""
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+            for labels, value in self._values.items()
+        ]
+
+
+class Gauge:
+    """仪表盘，可以直接设置数值或在导出时通过回调读取"""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        callback: Optional[Callable[[], Iterable[tuple[tuple[str, ...], float]]]] = None,
+    ) -> None:
+        """初始化仪表盘
+
+        Args:
+            name: 指标名
+            documentation: 指标说明
+            labelnames: 标签名
+            callback: 导出时调用的回调，返回 (标签值, 数值) 列表
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.callback = callback
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        """设置数值
+
+        Args:
+            value: 数值
+            *labels: 按 labelnames 顺序给出的标签值
+        """
+        self._values[labels] = value
+
+    def items(self) -> Iterable[tuple[tuple[str, ...], float]]:
+        """返回 (标签值, 数值) 列表"""
+        if self.callback is not None:
+            try:
+                return list(self.callback())
+            except Exception as e:
+                logger.warning(f"读取指标 {self.name} 失败: {e}")
+                return []
+        return list(self._values.items())
+
+    def render(self) -> list[str]:
+        """渲染为 Prometheus 文本行"""
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+            for labels, value in self.items()
+        ]
+
+
+class _HistogramSeries:
+    """单组标签下的直方图数据"""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, size: int) -> None:
+        self.counts = [0] * size
+        self.total = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """固定分桶的直方图，记录时只做一次二分查找和几次加法"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS,
+    ) -> None:
+        """初始化直方图
+
+        Args:
+            name: 指标名
+            documentation: 指标说明
+            labelnames: 标签名
+            buckets: 分桶上界（升序）
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple[str, ...], _HistogramSeries] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        """记录一个观测值
+
+        Args:
+            value: 观测值
+            *labels: 按 labelnames 顺序给出的标签值
+        """
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = _HistogramSeries(len(self.buckets) + 1)
+        series.counts[bisect_left(self.buckets, value)] += 1
+        series.total += value
+        series.count += 1
+
+    def quantile(self, q: float, *labels: str) -> Optional[float]:
+        """根据分桶线性插值估算分位数
+
+        Args:
+            q: 分位数（0-1）
+            *labels: 标签值
+
+        Returns:
+            估算值，没有数据时返回 None
+        """
+        series = self._series.get(labels)
+        if series is None or series.count == 0:
+            return None
+        rank = q * series.count
+        cumulative = 0
+        lower = 0.0
+        for i, count in enumerate(series.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+            if count and cumulative + count >= rank:
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = upper
+        return self.buckets[-1]
+
+    def series(self) -> Iterable[tuple[tuple[str, ...], int, float]]:
+        """返回 (标签值, 样本数, 总和) 列表"""
+        return [(labels, s.count, s.total) for labels, s in self._series.items()]
+
+    def render(self) -> list[str]:
+        """渲染为 Prometheus 文本行"""
+        lines = []
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series.counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {series.count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series.total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {series.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表，按名称复用已注册的指标"""
+
+    def __init__(self, prefix: str = "astrbot_gitee_ai_") -> None:
+        """初始化注册表
+
+        Args:
+            prefix: 指标名前缀
+        """
+        self.prefix = prefix
+        self._metrics: dict[str, Any] = {}
+
+    def _register(self, cls: type, name: str, *args: Any, **kwargs: Any) -> Any:
+        full_name = self.prefix + name
+        metric = self._metrics.get(full_name)
+        if metric is None:
+            metric = cls(full_name, *args, **kwargs)
+            self._metrics[full_name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        """获取或注册计数器"""
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        callback: Optional[Callable[[], Iterable[tuple[tuple[str, ...], float]]]] = None,
+    ) -> Gauge:
+        """获取或注册仪表盘，重复注册时更新回调（插件重载后回调指向新实例）"""
+        gauge = self._register(Gauge, name, documentation, labelnames)
+        if callback is not None:
+            gauge.callback = callback
+        return gauge
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS,
+    ) -> Histogram:
+        """获取或注册直方图"""
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def get(self, name: str) -> Any:
+        """按名称（不含前缀）获取指标"""
+        return self._metrics.get(self.prefix + name)
+
+    def render_prometheus(self) -> str:
+        """渲染所有指标为 Prometheus 文本格式"""
+        lines: list[str] = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 插件共享的指标注册表
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.histogram(
+    "request_duration_seconds", "命令从开始执行到返回结果的耗时", ("command", "model")
+)
+FIRST_IMAGE_LATENCY = registry.histogram(
+    "time_to_first_image_seconds", "命令从开始执行到发送第一张图片（含预览图）的耗时", ("command", "model")
+)
+UPSTREAM_LATENCY = registry.histogram(
+    "upstream_duration_seconds", "上游 API 调用耗时", ("operation", "model", "size", "key")
+)
+ERRORS = registry.counter("errors_total", "按命令和异常类型统计的错误数", ("command", "error"))
+CACHE_REQUESTS = registry.counter("cache_requests_total", "缓存命中和未命中次数", ("cache", "result"))
+
+
+def error_class(exc: BaseException) -> str:
+    """获取异常的根因类型名，API 客户端会把原始异常包装为 RuntimeError
+
+    Args:
+        exc: 异常
+
+    Returns:
+        异常类型名
+    """
+    return type(exc.__cause__ or exc).__name__
+
+
+class MetricsExporter:
+    """定期将指标写入 Prometheus textfile collector 可读取的文件"""
+
+    def __init__(
+        self, interval: float = 60.0, path: Optional[Path] = None, debug_mode: bool = False
+    ) -> None:
+        """初始化导出器
+
+        Args:
+            interval: 写入间隔（秒），0 表示不导出
+            path: 输出文件路径（.prom），默认为插件数据目录下的 metrics.prom
+            debug_mode: 是否启用 Debug 日志
+        """
+        self._path = path
+        self.interval = interval
+        self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("MetricsExporter", self.debug_mode)
+        self._task: Optional[asyncio.Task[None]] = None
+
+    @property
+    def path(self) -> Path:
+        """输出文件路径（延迟解析插件数据目录）"""
+        if self._path is None:
+            self._path = StarTools.get_data_dir(PLUGIN_NAME) / "metrics.prom"
+        return self._path
+
+    def ensure_started(self) -> None:
+        """在事件循环中启动定期写入任务（幂等）"""
+        if self.interval <= 0 or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run())
+        self.debug_log("启动指标导出: interval=%ss", self.interval)
+
+    def write(self, text: str) -> None:
+        """写入指标文本，先写临时文件再原子替换，避免采集到半个文件（在线程池中执行）
+
+        Args:
+            text: Prometheus 文本格式的指标
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(text, encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    async def export(self) -> None:
+        """在事件循环中渲染指标（指标和仪表盘回调读取的状态只在事件循环中修改），在线程池中写文件"""
+        text = registry.render_prometheus()
+        await asyncio.to_thread(self.write, text)
+
+    async def _run(self) -> None:
+        """定期写入循环，单次失败不会终止循环"""
+        while True:
+            await asyncio.sleep(self.interval)
+            start = time.perf_counter()
+            try:
+                await self.export()
+                self.debug_log("指标已写入: %s, 耗时=%.4fs", self.path, time.perf_counter() - start)
+            except Exception as e:
+                logger.warning(f"写入指标文件失败: {e}")
+
+    async def close(self) -> None:
+        """停止定期写入并写入最后一次"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            try:
+                await self.export()
+            except Exception as e:
+                logger.warning(f"写入指标文件失败: {e}")
@@ -0,0 +1,231 @@
+"""模型路由模块
+
+在一组可互换的文生图模型之间，按权重和近期的耗时、错误率为每个请求选择模型，
+支持按用户和按命令固定模型。
+"""
+
+import random
+import time
+from typing import Any, Optional
+
+from .debug_logger import DebugLogger
+from .metrics import registry
+
+MODEL_ROUTES = registry.counter("model_routes_total", "模型路由决策次数", ("model", "reason"))
+
+# 路由原因
+REASON_USER_PIN = "user_pin"
+REASON_COMMAND_PIN = "command_pin"
+REASON_BEST = "best"
+REASON_EXPLORE = "explore"
+REASON_DEFAULT = "default"
+
+# 错误率对得分的惩罚系数：错误率 25% 时预期耗时按 2 倍计算
+ERROR_PENALTY = 4.0
+
+MAX_USER_PINS = 10000  # 通过命令固定模型的用户数上限，超过后淘汰最早固定的用户（配置中的固定不淘汰）
+
+
+class ModelStats:
+    """单个模型的近期表现，耗时和错误率均为指数加权移动平均"""
+
+    __slots__ = ("weight", "latency", "error_rate", "samples", "routed", "failures", "updated_at")
+
+    def __init__(self, weight: float) -> None:
+        """初始化模型统计
+
+        Args:
+            weight: 配置的权重
+        """
+        self.weight = weight
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.samples = 0
+        self.routed = 0
+        self.failures = 0
+        self.updated_at = 0.0
+
+
+class ModelRouter:
+    """延迟感知的模型路由器
+
+    优先级：用户固定 > 命令固定 > 模型池路由 > 默认模型。模型池路由选择
+    权重 / (平均耗时 × (1 + 错误惩罚)) 最高的模型；样本不足的模型按当前最快模型的耗时
+    乐观估计，保证新模型能被尝试；另以 explore_rate 的概率按权重随机选择，
+    让暂时落后的模型有机会刷新统计。
+    """
+
+    def __init__(
+        self,
+        pool: Optional[dict[str, float]] = None,
+        user_pins: Optional[dict[str, str]] = None,
+        command_pins: Optional[dict[str, str]] = None,
+        explore_rate: float = 0.05,
+        min_samples: int = 3,
+        alpha: float = 0.3,
+        debug_mode: bool = False,
+    ) -> None:
+        """初始化模型路由器
+
+        Args:
+            pool: 模型名称到权重的映射，为空时不启用模型池路由
+            user_pins: 用户 ID 到模型的固定映射
+            command_pins: 命令到模型的固定映射
+            explore_rate: 按权重随机选择的概率
+            min_samples: 统计可信所需的最少样本数
+            alpha: 指数加权移动平均的平滑系数
+            debug_mode: 是否启用 Debug 日志
+        """
+        self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("ModelRouter", self.debug_mode)
+        self.models: dict[str, ModelStats] = {
+            name: ModelStats(weight) for name, weight in (pool or {}).items() if weight > 0
+        }
+        self.user_pins: dict[str, str] = dict(user_pins or {})
+        self._configured_pins = frozenset(self.user_pins)
+        self.command_pins: dict[str, str] = dict(command_pins or {})
+        self.explore_rate = max(0.0, min(1.0, explore_rate))
+        self.min_samples = max(1, min_samples)
+        self.alpha = alpha
+        self.debug_log(
+            "初始化模型路由器: pool=%s, user_pins=%s, command_pins=%s",
+            {name: stats.weight for name, stats in self.models.items()},
+            len(self.user_pins), self.command_pins,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用模型池路由"""
+        return bool(self.models)
+
+    def route(self, user_id: str, command: str, default: str) -> str:
+        """为一次请求选择模型
+
+        Args:
+            user_id: 用户 ID
+            command: 命令标识
+            default: 未启用路由时使用的模型
+
+        Returns:
+            模型名称
+        """
+        model = self.user_pins.get(user_id)
+        if model:
+            reason = REASON_USER_PIN
+        elif command in self.command_pins:
+            model, reason = self.command_pins[command], REASON_COMMAND_PIN
+        elif self.models:
+            model, reason = self._choose()
+        else:
+            return default
+
+        stats = self.models.get(model)
+        if stats is not None:
+            stats.routed += 1
+        MODEL_ROUTES.inc(model, reason)
+        self.debug_log.sampled(
+            "路由: user_id=%s, command=%s, model=%s, reason=%s", user_id, command, model, reason
+        )
+        return model
+
+    def _choose(self) -> tuple[str, str]:
+        """在模型池中选择模型
+
+        Returns:
+            (模型名称, 路由原因)
+        """
+        models = self.models
+        if len(models) > 1 and random.random() < self.explore_rate:
+            names = list(models)
+            weights = [models[name].weight for name in names]
+            return random.choices(names, weights=weights)[0], REASON_EXPLORE
+
+        known = [s.latency for s in models.values() if s.samples >= self.min_samples]
+        optimistic = min(known) if known else 1.0
+        best_name = ""
+        best_score = -1.0
+        for name, stats in models.items():
+            latency = stats.latency if stats.samples >= self.min_samples else optimistic
+            score = stats.weight / (max(latency, 1e-3) * (1 + ERROR_PENALTY * stats.error_rate))
+            if score > best_score:
+                best_name, best_score = name, score
+        return best_name, REASON_BEST
+
+    def record(self, model: str, seconds: float, ok: bool) -> None:
+        """记录一次调用结果
+
+        Args:
+            model: 模型名称
+            seconds: 耗时（秒）
+            ok: 是否成功
+        """
+        stats = self.models.get(model)
+        if stats is None:
+            return
+        alpha = self.alpha
+        stats.error_rate += alpha * ((0.0 if ok else 1.0) - stats.error_rate)
+        if ok:
+            if stats.samples == 0:
+                stats.latency = seconds
+            else:
+                stats.latency += alpha * (seconds - stats.latency)
+            stats.samples += 1
+        else:
+            stats.failures += 1
+        stats.updated_at = time.time()
+
+    def pin_user(self, user_id: str, model: str) -> None:
+        """为用户固定模型，调用方需先确认模型在模型池中
+
+        Args:
+            user_id: 用户 ID
+            model: 模型名称
+        """
+        # 重新插入到末尾，淘汰时按最近固定的顺序保留
+        self.user_pins.pop(user_id, None)
+        self.user_pins[user_id] = model
+        if len(self.user_pins) > MAX_USER_PINS:
+            oldest = next(
+                (uid for uid in self.user_pins if uid not in self._configured_pins), None
+            )
+            if oldest is not None:
+                del self.user_pins[oldest]
+        self.debug_log("固定用户模型: user_id=%s, model=%s", user_id, model)
+
+    def unpin_user(self, user_id: str) -> Optional[str]:
+        """取消用户的模型固定
+
+        Args:
+            user_id: 用户 ID
+
+        Returns:
+            原先固定的模型，没有固定时返回 None
+        """
+        return self.user_pins.pop(user_id, None)
+
+    def snapshot(self) -> dict[str, Any]:
+        """导出路由状态，用于统计展示
+
+        Returns:
+            包含各模型统计和路由决策计数的字典
+        """
+        decisions: dict[str, dict[str, float]] = {}
+        for (model, reason), count in MODEL_ROUTES.items():
+            decisions.setdefault(model, {})[reason] = count
+        return {
+            "enabled": self.enabled,
+            "models": {
+                name: {
+                    "weight": stats.weight,
+                    "latency": stats.latency if stats.samples else None,
+                    "error_rate": stats.error_rate,
+                    "samples": stats.samples,
+                    "failures": stats.failures,
+                    "routed": stats.routed,
+                }
+                for name, stats in self.models.items()
+            },
+            "decisions": decisions,
+            "user_pins": len(self.user_pins),
+            "command_pins": dict(self.command_pins),
+        }
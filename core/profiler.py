@@ -0,0 +1,311 @@
+"""按需性能剖析模块
+
+在运行中的插件上按时间窗口采集 CPU 调用栈样本和 tracemalloc 内存快照，
+输出可直接用于生成火焰图的折叠调用栈文件和内存分配增长排行。
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from typing import Optional
+
+from astrbot.api import logger
+from astrbot.api.star import StarTools
+
+from .config import PLUGIN_NAME
+from .debug_logger import DebugLogger
+from .watchdog import PLUGIN_ROOT
+
+# tracemalloc 保留的调用栈深度，越深越准确但开销越大
+TRACEMALLOC_FRAMES = 8
+
+
+def _frame_label(frame: FrameType) -> str:
+    """生成折叠调用栈中的帧名称，插件内的帧使用相对路径"""
+    filename = frame.f_code.co_filename
+    if filename.startswith(PLUGIN_ROOT):
+        module = Path(filename).relative_to(PLUGIN_ROOT).with_suffix("").as_posix()
+    else:
+        module = Path(filename).stem
+    return f"{module}:{frame.f_code.co_name}"
+
+
+def collapse_stack(frame: Optional[FrameType]) -> Optional[str]:
+    """将调用栈折叠为 "外层;...;内层" 形式，不包含插件帧的调用栈返回 None
+
+    Args:
+        frame: 线程当前的帧
+
+    Returns:
+        折叠后的调用栈
+    """
+    labels = []
+    in_plugin = False
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        if not in_plugin and frame.f_code.co_filename.startswith(PLUGIN_ROOT):
+            in_plugin = True
+        frame = frame.f_back
+    if not in_plugin:
+        return None
+    labels.reverse()
+    return ";".join(labels)
+
+
+class ProfileResult:
+    """一次剖析的结果摘要"""
+
+    def __init__(
+        self,
+        output_dir: Path,
+        duration: float,
+        samples: int,
+        plugin_samples: int,
+        top_functions: list[tuple[str, int]],
+        top_allocations: list[str],
+    ) -> None:
+        """初始化结果
+
+        Args:
+            output_dir: 输出目录
+            duration: 实际剖析时长（秒）
+            samples: 总采样次数
+            plugin_samples: 命中插件代码的样本数
+            top_functions: (函数, 样本数) 自身耗时排行
+            top_allocations: 内存增长排行文本行
+        """
+        self.output_dir = output_dir
+        self.duration = duration
+        self.samples = samples
+        self.plugin_samples = plugin_samples
+        self.top_functions = top_functions
+        self.top_allocations = top_allocations
+        self.finished_at = time.time()
+
+
+class PluginProfiler:
+    """插件范围的采样剖析器
+
+    采样线程按固定间隔读取所有线程的当前帧，只保留包含插件代码的调用栈（事件循环中的
+    插件协程，以及线程池中执行的插件函数），开销与采样频率成正比且不依赖请求量。
+    内存部分在开始和结束时各取一次 tracemalloc 快照并比较差异。
+    """
+
+    def __init__(
+        self,
+        sample_interval: float = 0.01,
+        max_duration: float = 300.0,
+        top_n: int = 30,
+        debug_mode: bool = False,
+    ) -> None:
+        """初始化剖析器
+
+        Args:
+            sample_interval: 采样间隔（秒）
+            max_duration: 单次剖析的最长时间（秒），到时自动结束
+            top_n: 内存增长排行的条数
+            debug_mode: 是否启用 Debug 日志
+        """
+        self.sample_interval = max(0.001, sample_interval)
+        self.max_duration = max_duration
+        self.top_n = top_n
+        self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("PluginProfiler", self.debug_mode)
+        self.last_result: Optional[ProfileResult] = None
+        self._stacks: Counter[str] = Counter()
+        self._samples = 0
+        self._started_at = 0.0
+        self._deadline = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._timer: Optional[asyncio.Task[None]] = None
+        self._lock = asyncio.Lock()
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._owns_tracemalloc = False
+
+    @property
+    def running(self) -> bool:
+        """是否正在剖析"""
+        return self._thread is not None
+
+    @property
+    def remaining(self) -> float:
+        """距离自动结束的剩余秒数"""
+        return max(0.0, self._deadline - time.monotonic()) if self.running else 0.0
+
+    async def start(self, duration: float) -> float:
+        """开始剖析
+
+        Args:
+            duration: 剖析时长（秒），超过 max_duration 时截断
+
+        Returns:
+            实际的剖析时长（秒）
+
+        Raises:
+            RuntimeError: 已有剖析在进行中
+        """
+        async with self._lock:
+            if self.running:
+                raise RuntimeError("已有剖析正在进行中")
+            duration = max(1.0, min(duration, self.max_duration))
+            self._owns_tracemalloc = not tracemalloc.is_tracing()
+            if self._owns_tracemalloc:
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._baseline = await asyncio.to_thread(tracemalloc.take_snapshot)
+
+            self._stacks = Counter()
+            self._samples = 0
+            self._started_at = time.monotonic()
+            self._deadline = self._started_at + duration
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._sample_loop, name="gitee-ai-profiler", daemon=True
+            )
+            self._thread.start()
+            self._timer = asyncio.create_task(self._auto_stop(duration))
+            self.debug_log("开始剖析: duration=%.0fs, interval=%.3fs", duration, self.sample_interval)
+            return duration
+
+    async def _auto_stop(self, duration: float) -> None:
+        """到达时间窗口后自动结束并写入结果
+
+        Args:
+            duration: 剖析时长（秒）
+        """
+        await asyncio.sleep(duration)
+        try:
+            result = await self.stop(from_timer=True)
+            if result is not None:
+                logger.info(f"性能剖析已自动结束，结果保存在: {result.output_dir}")
+        except Exception as e:
+            logger.error(f"性能剖析自动结束失败: {e}", exc_info=True)
+
+    def _sample_loop(self) -> None:
+        """采样线程：定期读取所有线程的当前帧并累计插件调用栈"""
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.sample_interval):
+            frames = sys._current_frames()
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                stack = collapse_stack(frame)
+                if stack is not None:
+                    self._stacks[stack] += 1
+            self._samples += 1
+            del frames
+
+    async def stop(self, from_timer: bool = False) -> Optional[ProfileResult]:
+        """结束剖析并写入结果文件
+
+        Args:
+            from_timer: 是否由自动结束任务调用
+
+        Returns:
+            剖析结果，没有进行中的剖析时返回 None
+        """
+        async with self._lock:
+            if not self.running:
+                return None
+            if self._timer is not None and not from_timer:
+                self._timer.cancel()
+            self._timer = None
+            self._stop.set()
+            thread, self._thread = self._thread, None
+            await asyncio.to_thread(thread.join)
+            duration = time.monotonic() - self._started_at
+
+            current = await asyncio.to_thread(tracemalloc.take_snapshot)
+            baseline, self._baseline = self._baseline, None
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+
+            output_dir = StarTools.get_data_dir(PLUGIN_NAME) / "profiles" / time.strftime(
+                "%Y%m%d-%H%M%S"
+            )
+            result = await asyncio.to_thread(
+                self._write_results, output_dir, duration, dict(self._stacks), baseline, current
+            )
+            self.last_result = result
+            self.debug_log(
+                "剖析结束: samples=%s, plugin_samples=%s, output=%s",
+                result.samples, result.plugin_samples, output_dir,
+            )
+            return result
+
+    def _write_results(
+        self,
+        output_dir: Path,
+        duration: float,
+        stacks: dict[str, int],
+        baseline: Optional[tracemalloc.Snapshot],
+        current: tracemalloc.Snapshot,
+    ) -> ProfileResult:
+        """生成并写入结果文件（在线程池中执行）
+
+        Args:
+            output_dir: 输出目录
+            duration: 剖析时长（秒）
+            stacks: 折叠调用栈到样本数的映射
+            baseline: 开始时的内存快照
+            current: 结束时的内存快照
+
+        Returns:
+            剖析结果
+        """
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        # 折叠调用栈，可直接交给 flamegraph.pl 或 speedscope
+        with open(output_dir / "cpu.collapsed", "w", encoding="utf-8") as f:
+            for stack, count in sorted(stacks.items(), key=lambda item: item[1], reverse=True):
+                f.write(f"{stack} {count}\n")
+
+        # 按栈顶函数统计自身耗时
+        self_time: Counter[str] = Counter()
+        for stack, count in stacks.items():
+            self_time[stack.rsplit(";", 1)[-1]] += count
+        top_functions = self_time.most_common(10)
+
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ]
+        current = current.filter_traces(filters)
+        top_allocations: list[str] = []
+        if baseline is not None:
+            diff = current.compare_to(baseline.filter_traces(filters), "lineno")
+            top_allocations = [str(stat) for stat in diff[: self.top_n]]
+        with open(output_dir / "memory_top.txt", "w", encoding="utf-8") as f:
+            f.write(f"# 内存增长排行（前 {self.top_n} 项，按源代码行）\n")
+            f.writelines(f"{line}\n" for line in top_allocations)
+            f.write("\n# 结束时的内存占用排行（按源代码行）\n")
+            f.writelines(f"{stat}\n" for stat in current.statistics("lineno")[: self.top_n])
+
+        with open(output_dir / "summary.txt", "w", encoding="utf-8") as f:
+            f.write(
+                f"duration={duration:.1f}s samples={self._samples} "
+                f"interval={self.sample_interval}s\n"
+            )
+            for function, count in top_functions:
+                f.write(f"{count}\t{function}\n")
+
+        return ProfileResult(
+            output_dir=output_dir,
+            duration=duration,
+            samples=self._samples,
+            plugin_samples=sum(stacks.values()),
+            top_functions=top_functions,
+            top_allocations=top_allocations[:5],
+        )
+
+    async def close(self) -> None:
+        """插件卸载时结束进行中的剖析"""
+        if self.running:
+            await self.stop()
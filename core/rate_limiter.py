@@ -1,52 +1,172 @@
 """防抖和并发控制模块
 
-负责请求防抖检查和并发控制。
+负责请求防抖检查、令牌桶限流和并发控制。
 """
 
 import time
-from typing import Set
+from collections import OrderedDict
+from typing import Optional
 
-from astrbot.api import logger
+from .config import (
+    DEBOUNCE_SECONDS,
+    DEFAULT_COMMAND_COSTS,
+    OPERATION_CACHE_TTL,
+    SHARED_STATE_BUSY_TIMEOUT,
+)
+from .debug_logger import DebugLogger
+from .shared_state import SharedState, SharedStateBusyError
 
-from .config import DEBOUNCE_SECONDS, OPERATION_CACHE_TTL
+
+class TokenBucket:
+    """令牌桶，按固定速率补充令牌，请求按消耗扣减令牌"""
+
+    __slots__ = ("capacity", "refill_rate", "tokens", "updated_at")
+
+    def __init__(self, capacity: float, refill_rate: float, now: float) -> None:
+        """初始化令牌桶
+
+        Args:
+            capacity: 桶容量（最大令牌数）
+            refill_rate: 每秒补充的令牌数
+            now: 当前时间戳
+        """
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self.updated_at = now
+
+    def refill(self, now: float) -> None:
+        """根据流逝时间补充令牌
+
+        Args:
+            now: 当前时间戳
+        """
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
+            self.updated_at = now
+
+    def wait_time(self, cost: float) -> float:
+        """计算令牌足够前需要等待的时间（需先调用 refill）
+
+        Args:
+            cost: 本次请求消耗的令牌数
+
+        Returns:
+            需要等待的秒数，0 表示令牌充足
+        """
+        if self.tokens >= cost:
+            return 0.0
+        if cost > self.capacity:
+            return float("inf")
+        return (cost - self.tokens) / self.refill_rate
+
+    def full_at(self) -> float:
+        """返回令牌桶重新装满的时间戳，装满后的桶与新建桶等价，可以安全淘汰"""
+        return self.updated_at + (self.capacity - self.tokens) / self.refill_rate
 
 
 class RateLimiter:
-    """速率限制器，负责防抖检查和并发控制"""
+    """速率限制器，负责防抖检查、分级令牌桶限流和并发控制
+
+    令牌桶分为用户、群组和全局三级，请求需同时满足所有已启用的层级才会放行。
+    桶和防抖记录都保存在按最近访问时间排序的 OrderedDict 中，过期条目从头部
+    逐个淘汰，每次请求的清理开销为均摊 O(1)。
+    配置了共享状态时，桶和防抖记录改为保存在多个实例共享的 SQLite 文件中。等锁超时时
+    请求按被拦截处理，不会回退到与其他实例不同步的内存状态；只有共享状态文件本身
+    读写失败时才回退到本实例的内存状态。
+    """
 
-    def __init__(self, debug_mode: bool = False) -> None:
+    def __init__(
+        self,
+        debug_mode: bool = False,
+        user_limit: Optional[tuple[float, float]] = None,
+        group_limit: Optional[tuple[float, float]] = None,
+        global_limit: Optional[tuple[float, float]] = None,
+        command_costs: Optional[dict[str, float]] = None,
+        shared: Optional[SharedState] = None,
+    ) -> None:
         """初始化速率限制器
 
         Args:
             debug_mode: 是否启用 Debug 日志
+            user_limit: 用户级令牌桶 (容量, 每秒补充数)，None 表示不限制
+            group_limit: 群组级令牌桶 (容量, 每秒补充数)，None 表示不限制
+            global_limit: 全局令牌桶 (容量, 每秒补充数)，None 表示不限制
+            command_costs: 各命令消耗的令牌数
+            shared: 多实例共享状态，默认只使用本实例的内存状态
         """
         self.debug_mode = debug_mode
-        self.processing_users: Set[str] = set()
-        self.last_operations: dict[str, float] = {}
-        self.debug_log(f"初始化速率限制器: debug_mode={debug_mode}")
+        self.debug_log = DebugLogger("RateLimiter", self.debug_mode)
+        # 请求标识 -> 处理中的任务数，同一用户可以有多个任务在排队或执行
+        self.processing_users: dict[str, int] = {}
+        self.last_operations: OrderedDict[str, float] = OrderedDict()
+        self.user_limit = user_limit
+        self.group_limit = group_limit
+        self.global_limit = global_limit
+        self.command_costs = command_costs if command_costs is not None else dict(DEFAULT_COMMAND_COSTS)
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        self.shared = shared
+        self.debug_log(
+            "初始化速率限制器: debug_mode=%s, user_limit=%s, group_limit=%s, global_limit=%s",
+            debug_mode, user_limit, group_limit, global_limit,
+        )
 
-    def debug_log(self, message: str) -> None:
-        """输出 Debug 日志
+    def _cleanup_expired_operations(self, current_time: float) -> None:
+        """从头部淘汰过期的操作记录，防止内存泄漏
+
+        记录按最近操作时间排序，遇到第一个未过期的记录即可停止。
 
         Args:
-            message: 日志消息
+            current_time: 当前时间戳
         """
-        if self.debug_mode:
-            logger.debug(f"[RateLimiter] {message}")
+        operations = self.last_operations
+        while operations:
+            key, timestamp = next(iter(operations.items()))
+            if current_time - timestamp <= OPERATION_CACHE_TTL:
+                break
+            del operations[key]
 
-    def _cleanup_expired_operations(self) -> None:
-        """清理过期的操作记录，防止内存泄漏"""
-        current_time = time.time()
-        expired_keys = [
-            key
-            for key, timestamp in self.last_operations.items()
-            if current_time - timestamp > OPERATION_CACHE_TTL
-        ]
-        for key in expired_keys:
-            del self.last_operations[key]
+    def _cleanup_expired_buckets(self, current_time: float) -> None:
+        """从头部淘汰已装满的令牌桶
+
+        已装满的桶与新建的桶状态一致，删除不会改变限流结果。
+
+        Args:
+            current_time: 当前时间戳
+        """
+        buckets = self._buckets
+        while buckets:
+            key, bucket = next(iter(buckets.items()))
+            if bucket.full_at() > current_time:
+                break
+            del buckets[key]
+
+    async def is_debounced(self, request_id: str) -> bool:
+        """检查防抖，配置了共享状态时使用所有实例共享的防抖记录
+
+        Args:
+            request_id: 请求标识符
+
+        Returns:
+            True 表示需要拒绝请求（包括等待共享状态锁超时），False 表示允许请求
+        """
+        if self.shared is not None:
+            try:
+                elapsed = await self.shared.check_debounce(request_id, DEBOUNCE_SECONDS)
+            except SharedStateBusyError:
+                self.debug_log("防抖拦截（共享状态繁忙）: request_id=%s", request_id)
+                return True
+            if elapsed is not None:
+                if elapsed < DEBOUNCE_SECONDS:
+                    self.debug_log("防抖拦截（共享）: request_id=%s, elapsed=%.2fs", request_id, elapsed)
+                    return True
+                self.debug_log.sampled("防抖通过（共享）: request_id=%s", request_id)
+                return False
+        return self.check_debounce(request_id)
 
     def check_debounce(self, request_id: str) -> bool:
-        """检查防抖，返回 True 表示需要拒绝请求
+        """检查本实例内存中的防抖记录，返回 True 表示需要拒绝请求
 
         Args:
             request_id: 请求标识符
@@ -56,20 +176,156 @@ class RateLimiter:
         """
         current_time = time.time()
 
-        # 定期清理过期记录
-        if len(self.last_operations) > 100:
-            self._cleanup_expired_operations()
+        # 淘汰过期记录
+        self._cleanup_expired_operations(current_time)
 
-        if request_id in self.last_operations:
-            elapsed = current_time - self.last_operations[request_id]
+        last_time = self.last_operations.get(request_id)
+        if last_time is not None:
+            elapsed = current_time - last_time
             if elapsed < DEBOUNCE_SECONDS:
-                self.debug_log(f"防抖拦截: request_id={request_id}, elapsed={elapsed:.2f}s")
+                self.debug_log("防抖拦截: request_id=%s, elapsed=%.2fs", request_id, elapsed)
                 return True
 
         self.last_operations[request_id] = current_time
-        self.debug_log(f"防抖通过: request_id={request_id}")
+        self.last_operations.move_to_end(request_id)
+        self.debug_log.sampled("防抖通过: request_id=%s", request_id)
         return False
 
+    def _get_bucket(self, key: str, limit: tuple[float, float], now: float) -> TokenBucket:
+        """获取或创建令牌桶，并将其移动到最近访问位置
+
+        Args:
+            key: 令牌桶键
+            limit: (容量, 每秒补充数)
+            now: 当前时间戳
+
+        Returns:
+            令牌桶实例
+        """
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(limit[0], limit[1], now)
+            self._buckets[key] = bucket
+        else:
+            bucket.refill(now)
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def get_command_cost(self, command: str) -> float:
+        """获取命令消耗的令牌数
+
+        Args:
+            command: 命令名称
+
+        Returns:
+            令牌消耗，未配置的命令消耗 1 个令牌
+        """
+        return self.command_costs.get(command, 1.0)
+
+    async def acquire(
+        self, user_id: str, group_id: str = "", command: str = "generate"
+    ) -> tuple[float, str]:
+        """尝试从用户、群组和全局令牌桶中扣减令牌
+
+        只有所有已启用的层级都有足够令牌时才会扣减，否则不扣减任何令牌。
+
+        Args:
+            user_id: 用户 ID
+            group_id: 群组 ID，私聊时为空
+            command: 命令名称，用于确定令牌消耗
+
+        Returns:
+            (需要等待的秒数, 触发限制的层级)，等待时间为 0 表示放行
+        """
+        cost = self.get_command_cost(command)
+        if self.shared is not None:
+            result = await self._acquire_shared(user_id, group_id, command, cost)
+            if result is not None:
+                return result
+        return self._acquire_local(user_id, group_id, command, cost)
+
+    def _acquire_local(
+        self, user_id: str, group_id: str, command: str, cost: float
+    ) -> tuple[float, str]:
+        """在本实例的内存令牌桶中扣减令牌，参数和返回值同 acquire"""
+        now = time.time()
+        self._cleanup_expired_buckets(now)
+
+        tiers: list[tuple[str, TokenBucket]] = []
+        if self.user_limit:
+            tiers.append(("user", self._get_bucket(f"user:{user_id}", self.user_limit, now)))
+        if self.group_limit and group_id:
+            tiers.append(("group", self._get_bucket(f"group:{group_id}", self.group_limit, now)))
+        if self.global_limit:
+            tiers.append(("global", self._get_bucket("global", self.global_limit, now)))
+
+        max_wait = 0.0
+        blocked_tier = ""
+        for tier, bucket in tiers:
+            wait = bucket.wait_time(cost)
+            if wait > max_wait:
+                max_wait = wait
+                blocked_tier = tier
+
+        if max_wait > 0:
+            self.debug_log(
+                "令牌桶拦截: user_id=%s, group_id=%s, command=%s, tier=%s, wait=%.2fs",
+                user_id, group_id, command, blocked_tier, max_wait,
+            )
+            return max_wait, blocked_tier
+
+        for _, bucket in tiers:
+            bucket.tokens -= cost
+
+        self.debug_log.sampled(
+            "令牌桶通过: user_id=%s, group_id=%s, command=%s, cost=%s, buckets=%s",
+            user_id, group_id, command, cost, len(self._buckets),
+        )
+        return 0.0, ""
+
+    async def _acquire_shared(
+        self, user_id: str, group_id: str, command: str, cost: float
+    ) -> Optional[tuple[float, str]]:
+        """在共享状态中扣减令牌，参数和返回值同 acquire，共享状态不可用时返回 None
+
+        等锁超时说明其他实例正在大量占用共享状态，按限流处理（层级为 shared），
+        等待一个超时周期后重试。
+        """
+        tiers: list[tuple[str, str, tuple[float, float]]] = []
+        if self.user_limit:
+            tiers.append(("user", f"user:{user_id}", self.user_limit))
+        if self.group_limit and group_id:
+            tiers.append(("group", f"group:{group_id}", self.group_limit))
+        if self.global_limit:
+            tiers.append(("global", "global", self.global_limit))
+        if not tiers:
+            return 0.0, ""
+
+        try:
+            result = await self.shared.acquire_tokens(  # type: ignore[union-attr]
+                [(key, limit[0], limit[1]) for _, key, limit in tiers], cost
+            )
+        except SharedStateBusyError:
+            self.debug_log(
+                "令牌桶拦截（共享状态繁忙）: user_id=%s, group_id=%s, command=%s",
+                user_id, group_id, command,
+            )
+            return SHARED_STATE_BUSY_TIMEOUT, "shared"
+        if result is None:
+            return None
+        wait, index = result
+        if wait > 0:
+            self.debug_log(
+                "令牌桶拦截（共享）: user_id=%s, group_id=%s, command=%s, tier=%s, wait=%.2fs",
+                user_id, group_id, command, tiers[index][0], wait,
+            )
+            return wait, tiers[index][0]
+        self.debug_log.sampled(
+            "令牌桶通过（共享）: user_id=%s, group_id=%s, command=%s, cost=%s",
+            user_id, group_id, command, cost,
+        )
+        return 0.0, ""
+
     def is_processing(self, request_id: str) -> bool:
         """检查请求是否正在处理中
 
@@ -87,14 +343,22 @@ class RateLimiter:
         Args:
             request_id: 请求标识符
         """
-        self.processing_users.add(request_id)
-        self.debug_log(f"添加到处理队列: request_id={request_id}, queue_size={len(self.processing_users)}")
+        self.processing_users[request_id] = self.processing_users.get(request_id, 0) + 1
+        self.debug_log.sampled(
+            "添加到处理队列: request_id=%s, queue_size=%s", request_id, len(self.processing_users),
+        )
 
     def remove_processing(self, request_id: str) -> None:
-        """从处理中列表移除请求
+        """从处理中列表移除请求（每次调用移除一个任务）
 
         Args:
             request_id: 请求标识符
         """
-        self.processing_users.discard(request_id)
-        self.debug_log(f"从处理队列移除: request_id={request_id}, queue_size={len(self.processing_users)}")
+        remaining = self.processing_users.get(request_id, 0) - 1
+        if remaining > 0:
+            self.processing_users[request_id] = remaining
+        else:
+            self.processing_users.pop(request_id, None)
+        self.debug_log.sampled(
+            "从处理队列移除: request_id=%s, queue_size=%s", request_id, len(self.processing_users),
+        )
@@ -0,0 +1,495 @@
+"""任务调度模块
+
+负责生图任务的排队和调度，在全局并发上限内按优先级通道和公平份额执行任务。
+"""
+
+import asyncio
+import contextvars
+import itertools
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Coroutine, Optional, TypeVar
+
+from .config import SHUTDOWN_CANCEL_TIMEOUT
+from .deadline import Deadline, current_deadline
+from .debug_logger import DebugLogger
+
+# 优先级通道，数值越小越优先
+LANE_LLM = 0  # LLM 工具调用
+LANE_COMMAND = 1  # 交互式命令
+LANE_BATCH = 2  # 批量任务
+LANE_NAMES = {LANE_LLM: "llm", LANE_COMMAND: "command", LANE_BATCH: "batch"}
+
+T = TypeVar("T")
+
+# 当前正在执行的任务凭证，API 客户端通过它登记远程任务的取消回调
+current_job: contextvars.ContextVar[Optional["JobTicket"]] = contextvars.ContextVar(
+    "current_job", default=None
+)
+
+
+class QueueFullError(RuntimeError):
+    """用户排队任务数达到上限时抛出"""
+
+
+class SchedulerClosedError(RuntimeError):
+    """调度器正在关闭，不再接受新任务时抛出"""
+
+
+class JobTicket:
+    """排队凭证，代表一个已提交的任务
+
+    使用方式：提交后调用 wait() 等待轮到执行，通过 run() 执行可取消的上游调用，
+    结束后无论成功与否都必须调用 release()。
+    """
+
+    __slots__ = (
+        "job_id",
+        "user_id",
+        "group_key",
+        "lane",
+        "command",
+        "position",
+        "estimated_wait",
+        "submitted_at",
+        "started_at",
+        "state",
+        "cancelled",
+        "deadline",
+        "_scheduler",
+        "_future",
+        "_task",
+        "_remote_cancel",
+    )
+
+    def __init__(
+        self,
+        scheduler: "JobScheduler",
+        job_id: int,
+        user_id: str,
+        group_key: str,
+        lane: int,
+        command: str,
+    ) -> None:
+        """初始化排队凭证
+
+        Args:
+            scheduler: 所属调度器
+            job_id: 任务 ID
+            user_id: 用户 ID
+            group_key: 公平份额分组键（群组 ID，私聊时为用户）
+            lane: 优先级通道
+            command: 命令名称
+        """
+        self._scheduler = scheduler
+        self.job_id = job_id
+        self.user_id = user_id
+        self.group_key = group_key
+        self.lane = lane
+        self.command = command
+        self.position = 0
+        self.estimated_wait = 0.0
+        self.submitted_at = time.monotonic()
+        self.started_at = 0.0
+        self.state = "queued"
+        self.cancelled = False
+        self.deadline: Optional[Deadline] = None
+        self._future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._task: Optional[asyncio.Task[Any]] = None
+        self._remote_cancel: Optional[Callable[[], Awaitable[Any]]] = None
+
+    async def wait(self) -> float:
+        """等待轮到执行
+
+        Returns:
+            排队等待的秒数
+        """
+        await asyncio.shield(self._future)
+        return self.started_at - self.submitted_at
+
+    async def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        """在可取消的子任务中执行上游调用
+
+        子任务的上下文中 current_job 指向本凭证，以便登记远程任务的取消回调；
+        current_deadline 指向本任务的时限，供各阶段计算剩余时间。
+
+        Args:
+            coro: 要执行的协程
+
+        Returns:
+            协程的返回值
+
+        Raises:
+            asyncio.CancelledError: 任务被取消时抛出
+        """
+        if self.cancelled:
+            coro.close()
+            raise asyncio.CancelledError()
+        context = contextvars.copy_context()
+        context.run(current_job.set, self)
+        context.run(current_deadline.set, self.deadline)
+        self._task = asyncio.get_running_loop().create_task(coro, context=context)
+        try:
+            return await self._task
+        finally:
+            self._task = None
+            self._remote_cancel = None
+
+    def set_remote_cancel(self, callback: Optional[Callable[[], Awaitable[Any]]]) -> None:
+        """登记远程任务的取消回调，任务被取消时调用以释放上游容量
+
+        Args:
+            callback: 取消远程任务的异步回调，None 表示清除
+        """
+        self._remote_cancel = callback
+
+    def cancel(self) -> bool:
+        """取消任务：排队中的任务直接出队，执行中的任务取消本地协程和远程任务
+
+        Returns:
+            True 表示成功发起取消，False 表示任务已结束
+        """
+        return self._scheduler._cancel(self)
+
+    def release(self) -> None:
+        """释放凭证：排队中的任务出队，执行中的任务归还并发名额，可重复调用"""
+        self._scheduler._release(self)
+
+
+class JobScheduler:
+    """公平份额任务调度器
+
+    任务按优先级通道严格排序；同一通道内先在群组之间轮转，再在群组内的用户之间轮转，
+    每个用户的任务按提交顺序执行，避免单个群组或用户的突发请求饿死其他人。
+    """
+
+    def __init__(
+        self,
+        debug_mode: bool = False,
+        max_concurrency: int = 8,
+        max_jobs_per_user: int = 3,
+    ) -> None:
+        """初始化任务调度器
+
+        Args:
+            debug_mode: 是否启用 Debug 日志
+            max_concurrency: 同时执行的任务数上限
+            max_jobs_per_user: 每个用户排队和执行中的任务数上限
+        """
+        self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("JobScheduler", self.debug_mode)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_jobs_per_user = max(1, max_jobs_per_user)
+        # 通道 -> 分组 -> 用户 -> 任务队列，OrderedDict 的顺序即轮转顺序
+        self._lanes: dict[int, OrderedDict[str, OrderedDict[str, deque[JobTicket]]]] = {
+            lane: OrderedDict() for lane in LANE_NAMES
+        }
+        self._user_jobs: dict[str, int] = {}
+        self._running: dict[int, JobTicket] = {}
+        self._tickets: dict[int, JobTicket] = {}
+        self._background_tasks: set[asyncio.Task[Any]] = set()
+        self._queued = 0
+        self._ids = itertools.count(1)
+        self.closed = False
+        self._idle: Optional[asyncio.Event] = None
+        self.debug_log(
+            "初始化任务调度器: max_concurrency=%s, max_jobs_per_user=%s",
+            max_concurrency, max_jobs_per_user,
+        )
+
+    @property
+    def queued_count(self) -> int:
+        """排队中的任务数"""
+        return self._queued
+
+    @property
+    def running_count(self) -> int:
+        """执行中的任务数"""
+        return len(self._running)
+
+    def submit(
+        self,
+        user_id: str,
+        group_id: str = "",
+        lane: int = LANE_COMMAND,
+        command: str = "generate",
+    ) -> JobTicket:
+        """提交任务
+
+        Args:
+            user_id: 用户 ID
+            group_id: 群组 ID，私聊时为空
+            lane: 优先级通道
+            command: 命令名称
+
+        Returns:
+            排队凭证，position 为前面还有多少个任务（0 表示立即执行）
+
+        Raises:
+            QueueFullError: 用户的任务数达到上限时抛出
+            SchedulerClosedError: 调度器正在关闭时抛出
+        """
+        if self.closed:
+            raise SchedulerClosedError("插件正在重启或关闭，暂不接受新任务，请稍后再试。")
+        if self._user_jobs.get(user_id, 0) >= self.max_jobs_per_user:
+            raise QueueFullError(f"您已有 {self.max_jobs_per_user} 个任务在排队或执行中，请稍后再试。")
+
+        group_key = group_id or f"private:{user_id}"
+        ticket = JobTicket(self, next(self._ids), user_id, group_key, lane, command)
+        self._user_jobs[user_id] = self._user_jobs.get(user_id, 0) + 1
+        self._tickets[ticket.job_id] = ticket
+
+        groups = self._lanes[lane]
+        users = groups.setdefault(group_key, OrderedDict())
+        users.setdefault(user_id, deque()).append(ticket)
+        self._queued += 1
+
+        self._dispatch()
+        if ticket.state == "queued":
+            ticket.position = self._estimate_position(ticket)
+
+        self.debug_log(
+            "提交任务: job_id=%s, user_id=%s, lane=%s, position=%s, queued=%s, running=%s",
+            ticket.job_id, user_id, LANE_NAMES.get(lane), ticket.position, self._queued,
+            len(self._running),
+        )
+        return ticket
+
+    def _pop_next(self) -> Optional[JobTicket]:
+        """按通道优先级和公平轮转取出下一个任务
+
+        Returns:
+            下一个任务，没有排队任务时返回 None
+        """
+        for lane in sorted(self._lanes):
+            groups = self._lanes[lane]
+            if not groups:
+                continue
+            group_key, users = groups.popitem(last=False)
+            user_id, tickets = users.popitem(last=False)
+            ticket = tickets.popleft()
+            if tickets:
+                users[user_id] = tickets
+            if users:
+                groups[group_key] = users
+            self._queued -= 1
+            return ticket
+        return None
+
+    def _dispatch(self) -> None:
+        """在并发上限内启动排队中的任务"""
+        while len(self._running) < self.max_concurrency:
+            ticket = self._pop_next()
+            if ticket is None:
+                break
+            ticket.state = "running"
+            ticket.started_at = time.monotonic()
+            self._running[ticket.job_id] = ticket
+            if not ticket._future.done():
+                ticket._future.set_result(None)
+            self.debug_log(
+                "开始执行任务: job_id=%s, user_id=%s, waited=%.2fs",
+                ticket.job_id, ticket.user_id, ticket.started_at - ticket.submitted_at,
+            )
+
+    def _estimate_position(self, target: JobTicket) -> int:
+        """模拟调度顺序，计算目标任务前面还有多少个排队任务
+
+        Args:
+            target: 目标任务
+
+        Returns:
+            排在前面的任务数（加上执行中的任务数，用于提示用户）
+        """
+        ahead = 0
+        for lane in sorted(self._lanes):
+            groups = self._lanes[lane]
+            if lane < target.lane:
+                ahead += sum(len(t) for users in groups.values() for t in users.values())
+                continue
+            if lane > target.lane:
+                break
+            # 复制轮转状态并模拟出队顺序
+            rotation = deque(
+                (group_key, deque((user_id, deque(tickets)) for user_id, tickets in users.items()))
+                for group_key, users in groups.items()
+            )
+            while rotation:
+                group_key, users = rotation.popleft()
+                user_id, tickets = users.popleft()
+                ticket = tickets.popleft()
+                if ticket is target:
+                    return ahead + len(self._running)
+                ahead += 1
+                if tickets:
+                    users.append((user_id, tickets))
+                if users:
+                    rotation.append((group_key, users))
+        return ahead + len(self._running)
+
+    def _release(self, ticket: JobTicket) -> None:
+        """释放任务占用的排队位置或并发名额
+
+        Args:
+            ticket: 排队凭证
+        """
+        if ticket.state == "done":
+            return
+
+        if ticket.state == "queued":
+            groups = self._lanes[ticket.lane]
+            users = groups.get(ticket.group_key)
+            tickets = users.get(ticket.user_id) if users is not None else None
+            if tickets is not None and ticket in tickets:
+                tickets.remove(ticket)
+                self._queued -= 1
+                if not tickets:
+                    del users[ticket.user_id]  # type: ignore[union-attr]
+                if not users:
+                    del groups[ticket.group_key]
+            if not ticket._future.done():
+                ticket._future.cancel()
+        else:
+            self._running.pop(ticket.job_id, None)
+
+        ticket.state = "done"
+        self._tickets.pop(ticket.job_id, None)
+        remaining = self._user_jobs.get(ticket.user_id, 0) - 1
+        if remaining > 0:
+            self._user_jobs[ticket.user_id] = remaining
+        else:
+            self._user_jobs.pop(ticket.user_id, None)
+
+        self.debug_log(
+            "释放任务: job_id=%s, queued=%s, running=%s", ticket.job_id, self._queued, len(self._running)
+        )
+        self._dispatch()
+        if self._idle is not None and not self._running and not self._queued:
+            self._idle.set()
+
+    def _cancel(self, ticket: JobTicket) -> bool:
+        """取消任务
+
+        Args:
+            ticket: 排队凭证
+
+        Returns:
+            True 表示成功发起取消，False 表示任务已结束
+        """
+        if ticket.state == "done" or ticket.cancelled:
+            return False
+        ticket.cancelled = True
+
+        if ticket.state == "queued":
+            # 出队后等待中的 wait() 会抛出 CancelledError
+            self._release(ticket)
+        else:
+            if ticket._remote_cancel is not None:
+                task = asyncio.create_task(ticket._remote_cancel())
+                self._background_tasks.add(task)
+                task.add_done_callback(self._background_tasks.discard)
+            if ticket._task is not None:
+                ticket._task.cancel()
+
+        self.debug_log("取消任务: job_id=%s, user_id=%s", ticket.job_id, ticket.user_id)
+        return True
+
+    def get_user_jobs(self, user_id: str) -> list[JobTicket]:
+        """获取用户排队和执行中的任务
+
+        Args:
+            user_id: 用户 ID
+
+        Returns:
+            按提交顺序排列的任务凭证列表
+        """
+        return [ticket for ticket in self._tickets.values() if ticket.user_id == user_id]
+
+    def cancel(self, job_id: int) -> bool:
+        """按任务 ID 取消任务
+
+        Args:
+            job_id: 任务 ID
+
+        Returns:
+            True 表示成功发起取消
+        """
+        ticket = self._tickets.get(job_id)
+        return ticket.cancel() if ticket is not None else False
+
+    def cancel_user_jobs(self, user_id: str) -> int:
+        """取消用户的所有任务
+
+        Args:
+            user_id: 用户 ID
+
+        Returns:
+            成功发起取消的任务数
+        """
+        return sum(1 for ticket in self.get_user_jobs(user_id) if ticket.cancel())
+
+    async def _wait_idle(self, timeout: float) -> bool:
+        """等待所有任务释放
+
+        Args:
+            timeout: 最长等待秒数
+
+        Returns:
+            True 表示所有任务都已释放
+        """
+        if not self._running and not self._queued:
+            return True
+        self._idle = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def drain(self, grace: float) -> tuple[list[JobTicket], list[JobTicket]]:
+        """关闭调度器：停止接受新任务，等待执行中的任务完成，超过宽限期后取消剩余任务
+
+        排队中的任务还没有占用上游容量，立即取消；执行中的任务最多等待 grace 秒。
+        取消后再等待任务处理完取消（最多 SHUTDOWN_CANCEL_TIMEOUT 秒），并等待远程取消请求发出。
+
+        Args:
+            grace: 执行中任务的宽限期（秒）
+
+        Returns:
+            (在宽限期内完成的任务, 被取消的任务)
+        """
+        self.closed = True
+        queued = [ticket for ticket in self._tickets.values() if ticket.state == "queued"]
+        running = list(self._running.values())
+        self.debug_log(
+            "开始关闭调度器: queued=%s, running=%s, grace=%.1fs", len(queued), len(running), grace
+        )
+        for ticket in queued:
+            ticket.cancel()
+
+        await self._wait_idle(grace)
+        abandoned = [ticket for ticket in running if ticket.state != "done"]
+        for ticket in abandoned:
+            ticket.cancel()
+        if abandoned:
+            await self._wait_idle(SHUTDOWN_CANCEL_TIMEOUT)
+        if self._background_tasks:
+            await asyncio.wait(self._background_tasks, timeout=SHUTDOWN_CANCEL_TIMEOUT)
+
+        drained = [ticket for ticket in running if ticket not in abandoned]
+        return drained, queued + abandoned
+
+    def snapshot(self) -> dict[str, Any]:
+        """导出当前队列状态，用于监控
+
+        Returns:
+            包含各通道排队数、执行中任务数和并发上限的字典
+        """
+        return {
+            "running": len(self._running),
+            "max_concurrency": self.max_concurrency,
+            "queued": {
+                LANE_NAMES[lane]: sum(len(t) for users in groups.values() for t in users.values())
+                for lane, groups in self._lanes.items()
+            },
+        }
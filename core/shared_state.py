@@ -0,0 +1,266 @@
+"""共享状态模块
+
+同一主机上的多个 AstrBot 实例使用相同的 API Key 时，通过 WAL 模式的 SQLite 文件
+共享令牌桶、防抖记录和各 API Key 的用量，使限流和 Key 轮换对所有实例整体生效。
+每个操作都是一个 BEGIN IMMEDIATE 短事务，读改写在文件锁内原子完成。事务在工作线程中执行，
+等待其他实例释放锁时不阻塞事件循环；等锁超时抛出 SharedStateBusyError，由调用方按限流处理，
+而不是回退到与其他实例不同步的内存状态。
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional, TypeVar
+
+from astrbot.api import logger
+
+from .config import OPERATION_CACHE_TTL, SHARED_STATE_BUSY_TIMEOUT, SHARED_STATE_CLEANUP_EVERY
+from .debug_logger import DebugLogger
+from .metrics import registry
+from .traffic_recorder import hash_text
+
+T = TypeVar("T")
+
+SHARED_STATE_ERRORS = registry.counter(
+    "shared_state_errors_total", "共享状态读写失败或等锁超时的次数", ("op",)
+)
+
+KEY_USAGE_WINDOW = 60  # Key 用量的统计窗口（秒）
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS buckets ("
+    "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS debounce (key TEXT PRIMARY KEY, last_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS key_usage ("
+    "key_hash TEXT NOT NULL, window INTEGER NOT NULL, count INTEGER NOT NULL, "
+    "PRIMARY KEY (key_hash, window))",
+)
+
+
+class SharedStateBusyError(Exception):
+    """等待其他实例释放共享状态数据库锁超时"""
+
+
+class SharedState:
+    """基于 SQLite WAL 的跨实例共享状态
+
+    数据库中不保存 API Key 原文，只保存其哈希。等锁超时抛出 SharedStateBusyError；
+    其他读写失败（如文件不可写）返回 None 并记录警告，调用方回退到本地状态。
+    """
+
+    def __init__(self, path: str, debug_mode: bool = False) -> None:
+        """初始化共享状态
+
+        Args:
+            path: SQLite 文件路径，多个实例需配置同一路径
+            debug_mode: 是否启用 Debug 日志
+        """
+        self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("SharedState", self.debug_mode)
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._ops = 0
+        self.debug_log("初始化共享状态: path=%s", path)
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开数据库连接（延迟初始化）"""
+        if self._conn is None:
+            conn = sqlite3.connect(
+                self.path,
+                timeout=SHARED_STATE_BUSY_TIMEOUT,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            self._conn = conn
+        return self._conn
+
+    def _transaction(self, op: str, func: Callable[..., T], *args: object) -> Optional[T]:
+        """在 BEGIN IMMEDIATE 事务中执行操作（在工作线程中调用）
+
+        Args:
+            op: 操作名称，用于错误计数
+            func: 接收连接和 args 的函数
+            *args: 传给 func 的参数
+
+        Returns:
+            func 的返回值，失败时返回 None
+
+        Raises:
+            SharedStateBusyError: 等待其他实例释放锁超时
+        """
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    result = func(conn, *args)
+                    self._ops += 1
+                    if self._ops % SHARED_STATE_CLEANUP_EVERY == 0:
+                        self._cleanup(conn, time.time())
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                conn.execute("COMMIT")
+                return result
+            except sqlite3.Error as e:
+                SHARED_STATE_ERRORS.inc(op)
+                if isinstance(e, sqlite3.OperationalError) and "locked" in str(e):
+                    self.debug_log.sampled("共享状态 %s 等锁超时", op)
+                    raise SharedStateBusyError(op) from e
+                logger.warning(f"共享状态 {op} 失败，回退到本地状态: {e}")
+                return None
+
+    @staticmethod
+    def _cleanup(conn: sqlite3.Connection, now: float) -> None:
+        """删除已装满的令牌桶、过期的防抖记录和过期的用量窗口"""
+        conn.execute("DELETE FROM buckets WHERE full_at <= ?", (now,))
+        conn.execute("DELETE FROM debounce WHERE last_at < ?", (now - OPERATION_CACHE_TTL,))
+        conn.execute(
+            "DELETE FROM key_usage WHERE window < ?", (int(now // KEY_USAGE_WINDOW) - 1,)
+        )
+
+    async def check_debounce(self, key: str, window: float) -> Optional[float]:
+        """检查并记录防抖
+
+        Args:
+            key: 请求标识符
+            window: 防抖时间窗口（秒）
+
+        Returns:
+            距上次操作的秒数（小于 window 表示应拒绝，此时不更新记录），
+            没有记录时返回 inf，共享状态不可用时返回 None
+
+        Raises:
+            SharedStateBusyError: 等锁超时
+        """
+        def op(conn: sqlite3.Connection, now: float) -> float:
+            row = conn.execute("SELECT last_at FROM debounce WHERE key = ?", (key,)).fetchone()
+            elapsed = now - row[0] if row is not None else float("inf")
+            if elapsed >= window:
+                conn.execute(
+                    "INSERT INTO debounce (key, last_at) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET last_at = excluded.last_at",
+                    (key, now),
+                )
+            return elapsed
+
+        return await asyncio.to_thread(self._transaction, "debounce", op, time.time())
+
+    async def acquire_tokens(
+        self, tiers: list[tuple[str, float, float]], cost: float
+    ) -> Optional[tuple[float, int]]:
+        """原子地从多个令牌桶中扣减令牌，所有桶都足够时才扣减
+
+        Args:
+            tiers: (桶键, 容量, 每秒补充数) 列表
+            cost: 本次请求消耗的令牌数
+
+        Returns:
+            (需要等待的秒数, 触发限制的层级下标)，等待时间为 0 表示已扣减并放行；
+            共享状态不可用时返回 None
+
+        Raises:
+            SharedStateBusyError: 等锁超时
+        """
+        def op(conn: sqlite3.Connection, now: float) -> tuple[float, int]:
+            states = []
+            max_wait, blocked = 0.0, -1
+            for index, (key, capacity, rate) in enumerate(tiers):
+                row = conn.execute(
+                    "SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens = capacity
+                if row is not None:
+                    tokens = min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+                states.append((key, capacity, rate, tokens))
+                if tokens >= cost:
+                    continue
+                wait = float("inf") if cost > capacity else (cost - tokens) / rate
+                if wait > max_wait:
+                    max_wait, blocked = wait, index
+            if max_wait > 0:
+                return max_wait, blocked
+            for key, capacity, rate, tokens in states:
+                tokens -= cost
+                conn.execute(
+                    "INSERT INTO buckets (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, "
+                    "updated_at = excluded.updated_at, full_at = excluded.full_at",
+                    (key, tokens, now, now + (capacity - tokens) / rate),
+                )
+            return 0.0, -1
+
+        return await asyncio.to_thread(self._transaction, "acquire", op, time.time())
+
+    async def pick_key(self, api_keys: list[str], exclude: str = "") -> Optional[str]:
+        """选择当前统计窗口内所有实例合计用量最少的 API Key，并记录一次用量
+
+        Args:
+            api_keys: 可选的 API Key 列表
+            exclude: 不参与选择的 API Key（例如对冲请求需要避开主请求的 Key）
+
+        Returns:
+            选中的 API Key，共享状态不可用或等锁超时时返回 None（Key 选择不影响限流，
+            调用方可以安全地回退到本实例的轮询）
+        """
+        candidates = [key for key in dict.fromkeys(api_keys) if key != exclude] or api_keys
+
+        def op(conn: sqlite3.Connection, now: float) -> str:
+            window = int(now // KEY_USAGE_WINDOW)
+            hashes = {hash_text(key): key for key in candidates}
+            counts = dict.fromkeys(hashes, 0)
+            placeholders = ",".join("?" * len(hashes))
+            for key_hash, count in conn.execute(
+                f"SELECT key_hash, count FROM key_usage WHERE window = ? "
+                f"AND key_hash IN ({placeholders})",
+                (window, *hashes),
+            ):
+                counts[key_hash] = count
+            # 用量相同时保持配置顺序
+            chosen = min(counts, key=counts.__getitem__)
+            conn.execute(
+                "INSERT INTO key_usage (key_hash, window, count) VALUES (?, ?, 1) "
+                "ON CONFLICT(key_hash, window) DO UPDATE SET count = count + 1",
+                (chosen, window),
+            )
+            return hashes[chosen]
+
+        try:
+            return await asyncio.to_thread(self._transaction, "pick_key", op, time.time())
+        except SharedStateBusyError:
+            return None
+
+    async def key_usage(self, api_keys: list[str]) -> dict[str, int]:
+        """读取当前统计窗口内各 API Key 的合计用量，用于统计展示
+
+        Args:
+            api_keys: API Key 列表
+
+        Returns:
+            API Key -> 本窗口内的请求数，共享状态不可用或等锁超时时返回空字典
+        """
+        def op(conn: sqlite3.Connection, now: float) -> dict[str, int]:
+            window = int(now // KEY_USAGE_WINDOW)
+            rows = dict(conn.execute(
+                "SELECT key_hash, count FROM key_usage WHERE window = ?", (window,)
+            ).fetchall())
+            return {key: rows.get(hash_text(key), 0) for key in api_keys}
+
+        try:
+            usage = await asyncio.to_thread(self._transaction, "key_usage", op, time.time())
+        except SharedStateBusyError:
+            return {}
+        return usage or {}
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
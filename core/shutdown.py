@@ -0,0 +1,80 @@
+"""插件关闭模块
+
+记录关闭时被取消的任务，并生成关闭摘要。
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Optional
+
+from astrbot.api.star import StarTools
+
+from .config import PLUGIN_NAME, SHUTDOWN_JOURNAL_FILE
+from .scheduler import LANE_NAMES, JobTicket
+
+
+def write_shutdown_journal(tickets: list[JobTicket], path: Optional[Path] = None) -> Path:
+    """把关闭时被取消的任务追加写入 JSONL 记录文件（在线程池中执行）
+
+    记录用户、群组和命令，便于在重启后通知用户或人工补发。
+
+    Args:
+        tickets: 被取消的任务
+        path: 记录文件路径，默认为插件数据目录下的 shutdown_journal.jsonl
+
+    Returns:
+        记录文件路径
+    """
+    if path is None:
+        path = StarTools.get_data_dir(PLUGIN_NAME) / SHUTDOWN_JOURNAL_FILE
+    now = time.monotonic()
+    ts = round(time.time(), 3)
+    lines = []
+    for ticket in tickets:
+        started = ticket.started_at or now
+        lines.append(json.dumps({
+            "ts": ts,
+            "job_id": ticket.job_id,
+            "command": ticket.command,
+            "user_id": ticket.user_id,
+            "group": ticket.group_key,
+            "lane": LANE_NAMES.get(ticket.lane, str(ticket.lane)),
+            "stage": "running" if ticket.started_at else "queued",
+            "queue_wait": round(started - ticket.submitted_at, 3),
+            "run_time": round(now - ticket.started_at, 3) if ticket.started_at else 0.0,
+        }, ensure_ascii=False) + "\n")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.writelines(lines)
+    return path
+
+
+def format_shutdown_summary(
+    elapsed: float,
+    drained: list[JobTicket],
+    abandoned: list[JobTicket],
+    background: tuple[int, int],
+    journal: Optional[Path] = None,
+) -> str:
+    """生成关闭摘要日志
+
+    Args:
+        elapsed: 关闭耗时（秒）
+        drained: 在宽限期内完成的任务
+        abandoned: 被取消的任务
+        background: (已完成, 被取消) 的后台任务数
+        journal: 被取消任务的记录文件
+
+    Returns:
+        摘要文本
+    """
+    running = sum(1 for ticket in abandoned if ticket.started_at)
+    summary = (
+        f"插件已关闭，耗时 {elapsed:.1f} 秒: 完成 {len(drained)} 个执行中的任务, "
+        f"取消 {len(abandoned)} 个任务（排队 {len(abandoned) - running}, 执行中 {running}）, "
+        f"后台任务完成 {background[0]} 个、取消 {background[1]} 个"
+    )
+    if journal is not None:
+        summary += f", 被取消的任务已记录到 {journal}"
+    return summary
@@ -0,0 +1,251 @@
+"""风格库模块
+
+负责加载、校验和热更新风格提示词，并预先生成风格列表和用法说明。
+"""
+
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from astrbot.api import logger
+
+from .debug_logger import DebugLogger
+
+# 无法解析出风格名称的行使用的错误键
+_FILE_ERROR_KEY = "<文件>"
+# 从单行中提取风格名称，用于定位解析失败的条目
+_ENTRY_NAME_PATTERN = re.compile(r'^\s*"((?:[^"\\]|\\.)+)"\s*:')
+
+
+def _pairs(pairs: list[tuple[str, Any]]) -> list[tuple[str, Any]]:
+    """json.loads 的 object_pairs_hook，保留重复键和定义顺序"""
+    return pairs
+
+
+class StyleCatalog:
+    """风格库
+
+    首次使用时加载风格提示词文件，之后按 check_interval 检查文件的修改时间和大小，
+    变化时重新加载，无需重启插件。整个文件无法解析时逐行解析，只丢弃有问题的条目，
+    每个条目的问题记录在 errors 中。排序后的风格列表和用法说明在加载时生成一次。
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        check_interval: float = 2.0,
+        debug_mode: bool = False,
+    ) -> None:
+        """初始化风格库
+
+        Args:
+            path: 风格提示词 JSON 文件路径
+            check_interval: 检查文件是否变化的最小间隔（秒）
+            debug_mode: 是否启用 Debug 日志
+        """
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("StyleCatalog", self.debug_mode)
+        self.errors: dict[str, str] = {}
+        self.loaded_at = 0.0
+        self.reloads = 0
+        self._prompts: dict[str, str] = {}
+        self._names: tuple[str, ...] = ()
+        self._listing = ""
+        self._inline_names = ""
+        self._usage_text = ""
+        self._signature: Optional[tuple[int, int]] = None
+        self._checked_at = 0.0
+        self._loaded = False
+
+    def _refresh(self) -> None:
+        """首次使用时加载，之后在文件变化时重新加载"""
+        now = time.monotonic()
+        if self._loaded and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            stat = os.stat(self.path)
+        except OSError as e:
+            if not self._loaded:
+                logger.error(f"风格提示词文件未找到: {self.path}")
+                self._apply({}, {_FILE_ERROR_KEY: f"无法读取文件: {e}"})
+            return
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return
+        self._signature = signature
+        self._load()
+
+    def _load(self) -> None:
+        """读取、解析并校验风格提示词文件"""
+        try:
+            text = self.path.read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError) as e:
+            logger.error(f"读取风格提示词文件失败: {e}")
+            # 保留上一次加载成功的风格
+            if not self._loaded:
+                self._apply({}, {_FILE_ERROR_KEY: f"无法读取文件: {e}"})
+            return
+
+        errors: dict[str, str] = {}
+        try:
+            pairs = json.loads(text, object_pairs_hook=_pairs)
+            if not isinstance(pairs, list):
+                raise ValueError("顶层必须是对象")
+        except json.JSONDecodeError as e:
+            logger.error(f"风格提示词文件解析失败，改为逐条解析: {e}")
+            pairs = self._parse_lines(text, errors)
+        except ValueError as e:
+            logger.error(f"风格提示词文件格式错误: {e}")
+            pairs = []
+            errors[_FILE_ERROR_KEY] = str(e)
+
+        prompts: dict[str, str] = {}
+        for name, prompt in pairs:
+            error = self._validate(name, prompt)
+            if error:
+                errors[str(name)] = error
+                continue
+            if name in prompts:
+                errors[name] = "重复定义，使用最后一个"
+            prompts[name] = prompt.strip()
+
+        for name, error in errors.items():
+            logger.warning(f"风格提示词 {name}: {error}")
+        self._apply(prompts, errors)
+
+    @staticmethod
+    def _parse_lines(text: str, errors: dict[str, str]) -> list[tuple[str, Any]]:
+        """逐行解析 "名称": "提示词" 形式的条目，跳过无法解析的行
+
+        Args:
+            text: 文件内容
+            errors: 解析错误输出，键为风格名称或行号
+
+        Returns:
+            (风格名称, 提示词) 列表
+        """
+        pairs: list[tuple[str, Any]] = []
+        for lineno, line in enumerate(text.splitlines(), 1):
+            entry = line.strip().rstrip(",")
+            if entry in ("", "{", "}"):
+                continue
+            try:
+                pairs.extend(json.loads(f"{{{entry}}}", object_pairs_hook=_pairs))
+            except json.JSONDecodeError as e:
+                match = _ENTRY_NAME_PATTERN.match(entry)
+                key = match.group(1) if match else f"第 {lineno} 行"
+                errors[key] = f"第 {lineno} 行第 {e.colno - 1} 列解析失败: {e.msg}"
+        return pairs
+
+    @staticmethod
+    def _validate(name: Any, prompt: Any) -> str:
+        """校验单个条目
+
+        Args:
+            name: 风格名称
+            prompt: 风格提示词
+
+        Returns:
+            错误描述，条目有效时返回空字符串
+        """
+        if not isinstance(name, str) or not name.strip():
+            return "风格名称为空"
+        if any(ch.isspace() for ch in name):
+            return "风格名称不能包含空白字符"
+        if not isinstance(prompt, str):
+            return f"提示词必须是字符串，实际为 {type(prompt).__name__}"
+        if not prompt.strip():
+            return "提示词为空"
+        return ""
+
+    def _apply(self, prompts: dict[str, str], errors: dict[str, str]) -> None:
+        """替换当前风格并生成列表和用法说明
+
+        Args:
+            prompts: 风格名称到提示词的映射
+            errors: 各条目的错误
+        """
+        names = tuple(sorted(prompts))
+        self._prompts = prompts
+        self._names = names
+        self._listing = "\n".join(f"- {name}" for name in names)
+        self._inline_names = ", ".join(names)
+        self._usage_text = (
+            f"请指定风格名称！\n\n"
+            f"使用方法：/ai-gitee style <风格名称> [自定义描述] [比例]\n\n"
+            f"可用风格：\n{self._listing}\n\n"
+            f"支持比例：1:1, 4:3, 3:4, 3:2, 2:3, 16:9, 9:16\n\n"
+            f"示例：\n"
+            f"/ai-gitee style 手办化\n"
+            f"/ai-gitee style Q版化 一个可爱的女孩\n"
+            f"/ai-gitee style cos化 猫娘 9:16\n\n"
+            f"提示：发送图片时将进行图生图转换，不发送图片则为文生图"
+        )
+        self.errors = errors
+        if self._loaded:
+            self.reloads += 1
+        self._loaded = True
+        self.loaded_at = time.time()
+        self.debug_log(
+            "风格库已加载: styles=%s, errors=%s, reloads=%s", len(names), len(errors), self.reloads
+        )
+
+    def get(self, name: str) -> Optional[str]:
+        """获取风格提示词
+
+        Args:
+            name: 风格名称
+
+        Returns:
+            风格提示词，不存在时返回 None
+        """
+        self._refresh()
+        return self._prompts.get(name)
+
+    @property
+    def names(self) -> tuple[str, ...]:
+        """排序后的风格名称"""
+        self._refresh()
+        return self._names
+
+    @property
+    def usage_text(self) -> str:
+        """未指定风格时的用法说明，包含全部可用风格"""
+        self._refresh()
+        return self._usage_text
+
+    def unknown_style_text(self, name: str) -> str:
+        """风格不存在时的提示
+
+        Args:
+            name: 用户输入的风格名称
+
+        Returns:
+            提示文本
+        """
+        self._refresh()
+        error = self.errors.get(name)
+        if error:
+            return (
+                f"风格 '{name}' 配置有误，暂时不可用：{error}\n\n"
+                f"请联系管理员修复风格提示词文件。"
+            )
+        return (
+            f"风格 '{name}' 不存在！\n\n"
+            f"可用风格：{self._inline_names}\n\n"
+            f"使用方法：/ai-gitee style <风格名称> [自定义描述] [比例]"
+        )
+
+    def __len__(self) -> int:
+        self._refresh()
+        return len(self._prompts)
+
+    def __contains__(self, name: object) -> bool:
+        self._refresh()
+        return name in self._prompts
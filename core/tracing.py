@@ -0,0 +1,347 @@
+"""请求追踪模块
+
+为每个请求记录根 Span 和各阶段的子 Span，按采样率写入与 OpenTelemetry Span 模型兼容的 JSONL 文件。
+"""
+
+import asyncio
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from astrbot.api import logger
+from astrbot.api.star import StarTools
+
+from .config import PLUGIN_NAME
+from .debug_logger import DebugLogger
+
+# 阶段名称到展示名称的映射，用于在回复中附加耗时明细
+PHASE_NAMES: dict[str, str] = {
+    "queue.wait": "排队",
+    "admission.wait": "并发等待",
+    "upstream.generate": "生成推理",
+    "upstream.edit_submit": "提交编辑",
+    "upstream.poll": "任务轮询",
+    "image.upload_read": "读取图片",
+    "image.download": "下载图片",
+    "image.decode": "解码图片",
+    "image.save": "写入磁盘",
+    "platform.send": "发送消息",
+}
+
+# OpenTelemetry 状态码
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+class Trace:
+    """一次请求的追踪数据，收集其下所有 Span"""
+
+    __slots__ = ("trace_id", "sampled", "spans", "tracer")
+
+    def __init__(self, tracer: "Tracer", sampled: bool) -> None:
+        """初始化追踪
+
+        Args:
+            tracer: 所属追踪器
+            sampled: 是否写入文件
+        """
+        self.trace_id = os.urandom(16).hex()
+        self.sampled = sampled
+        self.spans: list[Span] = []
+        self.tracer = tracer
+
+
+class Span:
+    """单个阶段的耗时记录"""
+
+    __slots__ = (
+        "trace",
+        "span_id",
+        "parent_id",
+        "name",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "status",
+        "status_message",
+        "_token",
+    )
+
+    def __init__(
+        self, trace: Trace, name: str, parent_id: str = "", attributes: Optional[dict[str, Any]] = None
+    ) -> None:
+        """初始化 Span 并记录开始时间
+
+        Args:
+            trace: 所属追踪
+            name: 阶段名称
+            parent_id: 父 Span ID
+            attributes: 附加属性
+        """
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes or {}
+        self.status = STATUS_UNSET
+        self.status_message = ""
+        self._token: Optional[contextvars.Token[Optional[Span]]] = None
+        trace.spans.append(self)
+
+    @property
+    def duration(self) -> float:
+        """耗时（秒），未结束时返回到当前为止的耗时"""
+        end_ns = self.end_ns or time.time_ns()
+        return (end_ns - self.start_ns) / 1e9
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """设置属性
+
+        Args:
+            key: 属性名
+            value: 属性值
+        """
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException) -> None:
+        """记录错误状态
+
+        Args:
+            error: 异常
+        """
+        self.status = STATUS_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def _activate(self) -> None:
+        """将当前 Span 设置为上下文中的活动 Span"""
+        self._token = _current_span.set(self)
+
+    def _deactivate(self) -> None:
+        """恢复上下文中的父 Span；跨上下文结束时（如生成器在其他任务中关闭）忽略"""
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                pass
+            self._token = None
+
+    def end(self) -> None:
+        """结束根 Span 并提交整个追踪（可重复调用）"""
+        if self.end_ns:
+            return
+        self.end_ns = time.time_ns()
+        if self.status == STATUS_UNSET:
+            self.status = STATUS_OK
+        self._deactivate()
+        if not self.parent_id:
+            self.trace.tracer._finish(self.trace)
+
+    def breakdown(self) -> str:
+        """按阶段汇总子 Span 耗时，用于附加到回复中
+
+        同一阶段中嵌套或并发的 Span 按时间区间合并，只计一次墙钟时间。
+
+        Returns:
+            例如 "排队 1.20s | 生成推理 8.31s | 下载图片 0.42s"
+        """
+        now_ns = time.time_ns()
+        intervals: dict[str, list[tuple[int, int]]] = {}
+        for span in self.trace.spans:
+            if span is self or not span.parent_id:
+                continue
+            intervals.setdefault(span.name, []).append((span.start_ns, span.end_ns or now_ns))
+        totals: dict[str, float] = {}
+        for name, spans in intervals.items():
+            covered_ns = 0
+            merged_start, merged_end = 0, -1
+            for start_ns, end_ns in sorted(spans):
+                if start_ns > merged_end:
+                    covered_ns += max(merged_end - merged_start, 0)
+                    merged_start, merged_end = start_ns, end_ns
+                else:
+                    merged_end = max(merged_end, end_ns)
+            covered_ns += max(merged_end - merged_start, 0)
+            totals[name] = covered_ns / 1e9
+        return " | ".join(
+            f"{PHASE_NAMES.get(name, name)} {seconds:.2f}s" for name, seconds in totals.items()
+        )
+
+    def to_otel(self) -> dict[str, Any]:
+        """转换为 OpenTelemetry OTLP/JSON 的 Span 结构
+
+        Returns:
+            Span 字典
+        """
+        attributes = []
+        for key, value in self.attributes.items():
+            if isinstance(value, bool):
+                typed = {"boolValue": value}
+            elif isinstance(value, int):
+                typed = {"intValue": str(value)}
+            elif isinstance(value, float):
+                typed = {"doubleValue": value}
+            else:
+                typed = {"stringValue": str(value)}
+            attributes.append({"key": key, "value": typed})
+        span: dict[str, Any] = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": attributes,
+            "status": {"code": self.status},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.status_message:
+            span["status"]["message"] = self.status_message
+        return span
+
+
+@contextmanager
+def trace_span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """在当前追踪下创建子 Span，没有活动追踪时不做任何事
+
+    Args:
+        name: 阶段名称
+        **attributes: 附加属性
+
+    Yields:
+        子 Span，没有活动追踪时为 None
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    span = Span(parent.trace, name, parent.span_id, attributes)
+    span._activate()
+    try:
+        yield span
+    except BaseException as e:
+        span.record_error(e)
+        raise
+    finally:
+        span.end_ns = time.time_ns()
+        if span.status == STATUS_UNSET:
+            span.status = STATUS_OK
+        span._deactivate()
+
+
+def current_span() -> Optional[Span]:
+    """获取当前活动的 Span"""
+    return _current_span.get()
+
+
+class Tracer:
+    """追踪器，负责创建根 Span、采样并写入轮转的 JSONL 文件"""
+
+    def __init__(
+        self,
+        sample_rate: float = 0.1,
+        path: Optional[Path] = None,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 3,
+        debug_mode: bool = False,
+    ) -> None:
+        """初始化追踪器
+
+        Args:
+            sample_rate: 写入文件的采样率（0-1）
+            path: JSONL 文件路径，默认为插件数据目录下的 traces/traces.jsonl
+            max_bytes: 单个文件的最大字节数，超过后轮转
+            backup_count: 保留的历史文件数
+            debug_mode: 是否启用 Debug 日志
+        """
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self._path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("Tracer", self.debug_mode)
+        self._lock = threading.Lock()
+        self._background_tasks: set[asyncio.Future[Any]] = set()
+
+    @property
+    def path(self) -> Path:
+        """JSONL 文件路径（延迟解析插件数据目录）"""
+        if self._path is None:
+            self._path = StarTools.get_data_dir(PLUGIN_NAME) / "traces" / "traces.jsonl"
+        return self._path
+
+    def start_trace(self, name: str, **attributes: Any) -> Span:
+        """开始一次请求追踪，返回的根 Span 需要在请求结束时调用 end()
+
+        Args:
+            name: 根 Span 名称（通常为命令名）
+            **attributes: 附加属性
+
+        Returns:
+            根 Span
+        """
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        root = Span(Trace(self, sampled), name, "", attributes)
+        root._activate()
+        return root
+
+    def _finish(self, trace: Trace) -> None:
+        """根 Span 结束时调用，采样命中的追踪在线程池中写入文件
+
+        Args:
+            trace: 已结束的追踪
+        """
+        if not trace.sampled:
+            return
+        lines = "".join(
+            json.dumps(span.to_otel(), ensure_ascii=False) + "\n" for span in trace.spans
+        )
+        try:
+            future = asyncio.get_running_loop().run_in_executor(None, self._write, lines)
+        except RuntimeError:
+            self._write(lines)
+            return
+        self._background_tasks.add(future)
+        future.add_done_callback(self._background_tasks.discard)
+
+    async def close(self) -> None:
+        """等待未完成的写入"""
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+
+    def _write(self, lines: str) -> None:
+        """追加写入并在超过大小时轮转（在线程池中执行）
+
+        Args:
+            lines: 要写入的 JSONL 文本
+        """
+        try:
+            with self._lock:
+                path = self.path
+                path.parent.mkdir(parents=True, exist_ok=True)
+                if path.exists() and path.stat().st_size >= self.max_bytes:
+                    for index in range(self.backup_count - 1, 0, -1):
+                        source = path.with_name(f"{path.name}.{index}")
+                        if source.exists():
+                            os.replace(source, path.with_name(f"{path.name}.{index + 1}"))
+                    if self.backup_count > 0:
+                        os.replace(path, path.with_name(f"{path.name}.1"))
+                    else:
+                        path.unlink()
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+        except OSError as e:
+            logger.warning(f"写入追踪文件失败: {e}")
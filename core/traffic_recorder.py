@@ -0,0 +1,248 @@
+"""流量录制模块
+
+在 GiteeAIClient 边界记录脱敏后的请求形态和耗时，写入 JSONL 文件，
+供 benchmarks/replay.py 在本地模拟服务上按原速或倍速回放。
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from astrbot.api import logger
+from astrbot.api.star import StarTools
+
+from .config import PLUGIN_NAME, TRAFFIC_HASH_SECRET_FILE
+from .debug_logger import DebugLogger
+from .metrics import error_class
+from .scheduler import current_job
+
+# 提示词录制方式：hash 只保留哈希和长度，keep 保留原文
+PROMPT_MODES = ("hash", "keep")
+
+
+def hash_text(text: str) -> str:
+    """计算文本的短哈希（不带密钥），用于 API Key 等高熵内容的标识
+
+    用户 ID 等低熵内容可被穷举还原，录制时应使用 TrafficRecorder 的带密钥哈希。
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        16 位十六进制哈希
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def load_hash_secret(path: Path) -> bytes:
+    """读取本机的哈希密钥，不存在时随机生成并以仅属主可读的权限保存
+
+    Args:
+        path: 密钥文件路径
+
+    Returns:
+        32 字节密钥
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        secret = path.read_bytes()
+        if secret:
+            return secret
+        raise OSError(f"哈希密钥文件为空: {path}") from None
+    secret = secrets.token_bytes(32)
+    with os.fdopen(fd, "wb") as f:
+        f.write(secret)
+    return secret
+
+
+class TrafficRecorder:
+    """流量录制器
+
+    每次上游调用写入一行记录，包含操作类型、模型、尺寸、步数、附件大小、发起命令、
+    排队时间、耗时和结果分类。API Key 不会写入记录；用户和群组 ID 只保留带密钥的哈希，
+    密钥随机生成并保存在插件数据目录下（不在 traffic 目录中），分享录制文件不会泄露密钥；
+    错误只记录异常类型名，避免错误消息中夹带的敏感内容落盘。
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        prompt_mode: str = "hash",
+        path: Optional[Path] = None,
+        max_bytes: int = 50 * 1024 * 1024,
+        secret_path: Optional[Path] = None,
+        debug_mode: bool = False,
+    ) -> None:
+        """初始化录制器
+
+        Args:
+            enabled: 是否启用录制
+            prompt_mode: 提示词录制方式，hash 或 keep
+            path: JSONL 文件路径，默认为插件数据目录下的 traffic/traffic.jsonl
+            max_bytes: 文件的最大字节数，超过后停止录制
+            secret_path: 哈希密钥文件路径，默认为插件数据目录下的 traffic_hash_secret
+            debug_mode: 是否启用 Debug 日志
+        """
+        self.enabled = enabled
+        self.prompt_mode = prompt_mode if prompt_mode in PROMPT_MODES else "hash"
+        self._path = path
+        self._secret_path = secret_path
+        self._secret: Optional[bytes] = None
+        self.max_bytes = max_bytes
+        self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("TrafficRecorder", self.debug_mode)
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._background_tasks: set[asyncio.Future[Any]] = set()
+
+    @property
+    def path(self) -> Path:
+        """JSONL 文件路径（延迟解析插件数据目录）"""
+        if self._path is None:
+            self._path = StarTools.get_data_dir(PLUGIN_NAME) / "traffic" / "traffic.jsonl"
+        return self._path
+
+    def anonymize(self, text: str) -> str:
+        """计算带密钥的短哈希，同一安装内相同文本得到相同结果，便于回放时保留重复请求的分布
+
+        Args:
+            text: 原始文本（用户 ID、群组 ID 或提示词）
+
+        Returns:
+            16 位十六进制哈希
+        """
+        return hmac.new(self._get_secret(), text.encode("utf-8"), hashlib.sha256).hexdigest()[:16]
+
+    def _get_secret(self) -> bytes:
+        """获取哈希密钥（延迟读取，首次录制时生成）"""
+        if self._secret is None:
+            if self._secret_path is None:
+                self._secret_path = StarTools.get_data_dir(PLUGIN_NAME) / TRAFFIC_HASH_SECRET_FILE
+            self._secret = load_hash_secret(self._secret_path)
+        return self._secret
+
+    @contextmanager
+    def capture(self, op: str, prompt: str, **shape: Any) -> Iterator[dict[str, Any]]:
+        """记录一次上游调用，退出时补充耗时和结果并写入文件
+
+        调用方可以在 with 块内向返回的字典补充字段（如 output_bytes）。
+
+        Args:
+            op: 操作类型，generate 或 edit
+            prompt: 提示词
+            **shape: 请求形态（模型、尺寸、步数、附件等）
+
+        Yields:
+            本次调用的记录
+        """
+        entry: dict[str, Any] = {"op": op}
+        if not self.enabled:
+            yield entry
+            return
+
+        try:
+            self._get_secret()
+        except OSError as e:
+            # 没有密钥时不能安全地脱敏，停止录制
+            self.enabled = False
+            logger.warning(f"读取流量录制哈希密钥失败，停止录制: {e}")
+            yield entry
+            return
+
+        entry["ts"] = round(time.time(), 3)
+        job = current_job.get()
+        if job is not None:
+            entry["command"] = job.command
+            entry["user"] = self.anonymize(job.user_id)
+            entry["group"] = self.anonymize(job.group_key)
+            entry["queue_wait"] = round(max(0.0, job.started_at - job.submitted_at), 3)
+        if self.prompt_mode == "keep":
+            entry["prompt"] = prompt
+        else:
+            entry["prompt_hash"] = self.anonymize(prompt)
+        entry["prompt_chars"] = len(prompt)
+        entry.update(shape)
+
+        start = time.perf_counter()
+        try:
+            yield entry
+        except asyncio.CancelledError:
+            entry["outcome"] = "cancelled"
+            raise
+        except Exception as e:
+            entry["outcome"] = error_class(e)
+            raise
+        else:
+            entry["outcome"] = "ok"
+        finally:
+            entry["duration"] = round(time.perf_counter() - start, 4)
+            self._submit(entry)
+
+    def _submit(self, entry: dict[str, Any]) -> None:
+        """在线程池中追加写入一条记录
+
+        Args:
+            entry: 录制记录
+        """
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        try:
+            future = asyncio.get_running_loop().run_in_executor(None, self._write, line)
+        except RuntimeError:
+            self._write(line)
+            return
+        self._background_tasks.add(future)
+        future.add_done_callback(self._background_tasks.discard)
+
+    def _write(self, line: str) -> None:
+        """追加写入，文件超过上限后停止录制（在线程池中执行）
+
+        Args:
+            line: 要写入的 JSONL 行
+        """
+        try:
+            with self._lock:
+                if not self.enabled:
+                    return
+                path = self.path
+                path.parent.mkdir(parents=True, exist_ok=True)
+                if path.exists() and path.stat().st_size >= self.max_bytes:
+                    self.enabled = False
+                    logger.warning(f"流量录制文件已达到上限，停止录制: {path}")
+                    return
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(line)
+                self.recorded += 1
+        except OSError as e:
+            logger.warning(f"写入流量录制文件失败: {e}")
+
+    async def close(self) -> None:
+        """等待未完成的写入"""
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        if self.recorded:
+            self.debug_log("流量录制结束: records=%s, path=%s", self.recorded, self.path)
+
+
+def file_size(path: str) -> int:
+    """获取本地文件大小，文件不存在时返回 0
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        字节数
+    """
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
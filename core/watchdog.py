@@ -0,0 +1,240 @@
+"""事件循环卡顿检测模块
+
+插件与 AstrBot 的其他插件共享同一个事件循环，任何同步阻塞都会拖慢所有插件。
+看门狗在事件循环中定期发送心跳，并由独立线程检查心跳是否超时；超过阈值时
+抓取事件循环线程当前的调用栈，并归因到插件内的函数。
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from pathlib import Path
+from types import FrameType
+from typing import Any, Optional
+
+from astrbot.api import logger
+
+from .debug_logger import DebugLogger
+from .metrics import registry
+
+# 插件根目录，用于判断调用栈中的帧是否属于插件
+PLUGIN_ROOT = str(Path(__file__).resolve().parent.parent)
+
+LOOP_LAG = registry.histogram(
+    "event_loop_lag_seconds",
+    "事件循环心跳延迟",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+LOOP_STALLS = registry.counter("event_loop_stalls_total", "事件循环卡顿次数", ("function",))
+
+# 调用栈中没有插件帧时的归因
+OUTSIDE_PLUGIN = "<插件外>"
+
+
+class Stall:
+    """一次事件循环卡顿记录"""
+
+    __slots__ = ("started_at", "duration", "function", "stack")
+
+    def __init__(self, started_at: float, function: str, stack: list[str]) -> None:
+        """初始化卡顿记录
+
+        Args:
+            started_at: 卡顿开始的时间戳
+            function: 归因的插件函数（模块:函数:行号）
+            stack: 格式化的调用栈（从外到内）
+        """
+        self.started_at = started_at
+        self.duration = 0.0
+        self.function = function
+        self.stack = stack
+
+
+def attribute_frame(frame: Optional[FrameType]) -> tuple[str, list[str]]:
+    """从最内层开始查找第一个属于插件的帧，并格式化调用栈
+
+    Args:
+        frame: 事件循环线程当前的帧
+
+    Returns:
+        (归因的函数, 调用栈文本行)
+    """
+    if frame is None:
+        return OUTSIDE_PLUGIN, []
+    summary = traceback.extract_stack(frame)
+    function = OUTSIDE_PLUGIN
+    for entry in reversed(summary):
+        if entry.filename.startswith(PLUGIN_ROOT) and not entry.filename.endswith("watchdog.py"):
+            module = Path(entry.filename).relative_to(PLUGIN_ROOT).with_suffix("").as_posix()
+            function = f"{module}:{entry.name}:{entry.lineno}"
+            break
+    stack = [
+        f"{entry.filename}:{entry.lineno} {entry.name}"
+        + (f" | {entry.line}" if entry.line else "")
+        for entry in summary
+    ]
+    return function, stack
+
+
+class LoopWatchdog:
+    """事件循环卡顿看门狗
+
+    心跳任务每隔 interval 秒醒来一次，记录实际延迟；监控线程在心跳超过 threshold
+    未更新时抓取一次事件循环线程的调用栈。正常情况下只有一个定时任务和一个休眠线程，
+    抓栈只在卡顿时发生。
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.0,
+        interval: float = 0.1,
+        max_records: int = 50,
+        debug_mode: bool = False,
+    ) -> None:
+        """初始化看门狗
+
+        Args:
+            threshold: 判定为卡顿的延迟（秒），0 表示不启用
+            interval: 心跳间隔（秒）
+            max_records: 保留的最近卡顿记录数
+            debug_mode: 是否启用 Debug 日志
+        """
+        self.threshold = threshold
+        self.interval = interval
+        self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("LoopWatchdog", self.debug_mode)
+        self.stalls: deque[Stall] = deque(maxlen=max_records)
+        self.max_lag = 0.0
+        self.started_at = 0.0
+        self._heartbeat = 0.0
+        self._pending: Optional[Stall] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task[None]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用"""
+        return self.threshold > 0
+
+    @property
+    def running(self) -> bool:
+        """心跳任务是否在运行"""
+        return self._task is not None and not self._task.done()
+
+    def ensure_started(self) -> None:
+        """在事件循环中启动心跳任务和监控线程（幂等）"""
+        if not self.enabled or self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self.started_at = time.time()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._run())
+        self._thread = threading.Thread(
+            target=self._monitor, name="gitee-ai-loop-watchdog", daemon=True
+        )
+        self._thread.start()
+        self.debug_log(
+            "启动事件循环看门狗: threshold=%.3fs, interval=%.3fs", self.threshold, self.interval
+        )
+
+    async def _run(self) -> None:
+        """心跳循环，测量每次唤醒相对预期时间的延迟"""
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - expected)
+            LOOP_LAG.observe(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+            if lag >= self.threshold:
+                self._record(lag)
+
+    def _record(self, lag: float) -> None:
+        """登记一次卡顿，优先使用监控线程抓到的调用栈
+
+        Args:
+            lag: 心跳延迟（秒）
+        """
+        stall = self._pending
+        self._pending = None
+        if stall is None:
+            # 卡顿时间短于监控线程的检查间隔，没有抓到调用栈
+            stall = Stall(time.time() - lag, OUTSIDE_PLUGIN, [])
+        stall.duration = lag
+        self.stalls.append(stall)
+        LOOP_STALLS.inc(stall.function)
+        logger.warning(f"事件循环卡顿 {lag * 1000:.0f}ms，归因: {stall.function}")
+
+    def _monitor(self) -> None:
+        """监控线程：心跳超时时抓取事件循环线程的调用栈（每次卡顿只抓一次）"""
+        check_interval = max(0.005, min(self.interval, self.threshold) / 2)
+        captured_for = 0.0
+        while not self._stop.wait(check_interval):
+            heartbeat = self._heartbeat
+            overdue = time.monotonic() - heartbeat - self.interval
+            if overdue < self.threshold or captured_for == heartbeat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id or 0)
+            function, stack = attribute_frame(frame)
+            del frame
+            self._pending = Stall(time.time() - overdue, function, stack)
+            captured_for = heartbeat
+
+    def top_functions(self, limit: int = 5) -> list[tuple[str, int, float, float]]:
+        """按累计卡顿时间汇总归因函数
+
+        Args:
+            limit: 返回的条数
+
+        Returns:
+            (函数, 次数, 累计秒数, 最长秒数) 列表
+        """
+        totals: dict[str, list[float]] = {}
+        for stall in self.stalls:
+            entry = totals.setdefault(stall.function, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += stall.duration
+            entry[2] = max(entry[2], stall.duration)
+        ranked = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+        return [(name, int(v[0]), v[1], v[2]) for name, v in ranked[:limit]]
+
+    def snapshot(self) -> dict[str, Any]:
+        """导出看门狗状态，用于报告
+
+        Returns:
+            包含延迟分位数、卡顿次数和归因汇总的字典
+        """
+        # 分桶插值的分位数可能超过实际最大值
+        p50, p99 = LOOP_LAG.quantile(0.5), LOOP_LAG.quantile(0.99)
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "threshold": self.threshold,
+            "lag_p50": min(p50, self.max_lag) if p50 is not None else None,
+            "lag_p99": min(p99, self.max_lag) if p99 is not None else None,
+            "max_lag": self.max_lag,
+            "stalls": len(self.stalls),
+            "top": self.top_functions(),
+        }
+
+    async def close(self) -> None:
+        """停止心跳任务和监控线程"""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
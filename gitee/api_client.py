@@ -4,12 +4,32 @@
 """
 
 import asyncio
+import contextlib
+import os
+import time
 from typing import Any
 
 from astrbot.api import logger
-from openai import AuthenticationError, RateLimitError, APIError
 
-from ..core import ClientManager, ImageManager
+from ..core import AdmissionController, ClientManager, DebugLogger, ImageManager, ModelRouter, deps
+from ..core.circuit_breaker import CircuitBreaker, CircuitOpenError, EndpointPool
+from ..core.deadline import DeadlineExceeded, stage_timeout, with_deadline
+from ..core.degradation import QualityGovernor
+from ..core.hedging import (
+    HEDGES,
+    OUTCOME_BOTH_FAILED,
+    OUTCOME_HEDGE_WON,
+    OUTCOME_PRIMARY_WON,
+    OUTCOME_SPARE_USED,
+    HedgePolicy,
+)
+from ..core.job_queue import JobDispatcher
+from ..core.memory_budget import MemoryBudget
+from ..core.metrics import UPSTREAM_LATENCY
+from ..core.scheduler import current_job
+from ..core.shared_state import SharedState
+from ..core.tracing import trace_span
+from ..core.traffic_recorder import TrafficRecorder, file_size
 
 
 class GiteeAIClient:
@@ -24,6 +44,16 @@ class GiteeAIClient:
         negative_prompt: str,
         base_url: str,
         debug_mode: bool = False,
+        per_key_concurrency: int = 4,
+        max_concurrency: int = 16,
+        recorder: TrafficRecorder | None = None,
+        router: ModelRouter | None = None,
+        quality: QualityGovernor | None = None,
+        hedge: HedgePolicy | None = None,
+        endpoints: EndpointPool | None = None,
+        memory: MemoryBudget | None = None,
+        shared: SharedState | None = None,
+        jobs: JobDispatcher | None = None,
     ) -> None:
         """初始化 Gitee AI 客户端
 
@@ -35,8 +65,20 @@ class GiteeAIClient:
             negative_prompt: 负面提示词
             base_url: API 基础 URL
             debug_mode: 是否启用 Debug 日志
+            per_key_concurrency: 每个 API Key 的最大并发请求数
+            max_concurrency: 全局最大并发请求数
+            recorder: 流量录制器，默认不录制
+            router: 文生图模型路由器，默认不启用路由
+            quality: 负载自适应降级策略，默认不降级
+            hedge: 请求对冲策略，默认不对冲
+            endpoints: 带熔断的端点池，默认只使用 base_url 且不熔断
+            memory: 图片内存预算，默认只统计不限制
+            shared: 多实例共享状态，配置后按所有实例合计的用量选择 API Key，默认本地轮询
+            jobs: 任务队列发起端，配置后文生图和图片编辑的上游调用交给工作进程执行，
+                默认在本进程中调用
         """
         self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("GiteeAIClient", self.debug_mode)
         self.api_keys = api_keys
         self.model = model
         self.default_size = default_size
@@ -45,37 +87,41 @@ class GiteeAIClient:
         self.base_url = base_url
 
         self.client_manager = ClientManager(base_url, debug_mode=debug_mode)
-        self.image_manager = ImageManager(debug_mode=debug_mode)
-
-        self.current_key_index = 0
-        self._generation_count = 0
-        self._background_tasks: set[asyncio.Task[Any]] = set()
-
-        self.debug_log(
-            f"初始化 Gitee AI 客户端: model={model}, size={default_size}, "
-            f"api_keys={len(api_keys)}, debug_mode={debug_mode}"
+        self.image_manager = ImageManager(debug_mode=debug_mode, memory=memory)
+        self.admission = AdmissionController(
+            debug_mode=debug_mode,
+            per_key_max=per_key_concurrency,
+            global_max=max_concurrency,
+            key_label=self._key_label,
+        )
+        self.recorder = recorder if recorder is not None else TrafficRecorder(debug_mode=debug_mode)
+        self.router = router if router is not None else ModelRouter(debug_mode=debug_mode)
+        self.quality = quality if quality is not None else QualityGovernor(
+            default_size, num_inference_steps, debug_mode=debug_mode
+        )
+        self.hedge = hedge if hedge is not None else HedgePolicy(debug_mode=debug_mode)
+        self.endpoints = endpoints if endpoints is not None else EndpointPool(
+            [base_url], failure_threshold=0, debug_mode=debug_mode
         )
 
+        self.shared = shared
+        self.jobs = jobs
         self.current_key_index = 0
         self._generation_count = 0
         self._background_tasks: set[asyncio.Task[Any]] = set()
 
         self.debug_log(
-            f"初始化 Gitee AI 客户端: model={model}, size={default_size}, "
-            f"api_keys={len(api_keys)}, debug_mode={debug_mode}"
+            "初始化 Gitee AI 客户端: model=%s, size=%s, api_keys=%s, debug_mode=%s",
+            model, default_size, len(api_keys), debug_mode,
         )
 
-    def debug_log(self, message: str) -> None:
-        """输出 Debug 日志
+    async def _get_next_api_key(self, exclude: str = "") -> str:
+        """获取下一个 API Key
 
-        Args:
-            message: 日志消息
-        """
-        if self.debug_mode:
-            logger.debug(f"[GiteeAIClient] {message}")
+        配置了共享状态时选择所有实例合计用量最少的 Key，否则在本实例内轮询。
 
-    def _get_next_api_key(self) -> str:
-        """轮询获取下一个 API Key
+        Args:
+            exclude: 尽量避开的 API Key（只有这一个 Key 时仍会返回它）
 
         Returns:
             API Key
@@ -86,17 +132,57 @@ class GiteeAIClient:
         if not self.api_keys:
             raise ValueError("请先配置 API Key")
 
+        if self.shared is not None:
+            api_key = await self.shared.pick_key(self.api_keys, exclude)
+            if api_key is not None:
+                self.debug_log.sampled("选择共享用量最少的 API Key: %s", self._key_label(api_key))
+                return api_key
+
+        api_key = self._rotate_api_key()
+        if exclude and len(set(self.api_keys)) > 1:
+            while api_key == exclude:
+                api_key = self._rotate_api_key()
+        return api_key
+
+    def _rotate_api_key(self) -> str:
+        """在本实例内轮询下一个 API Key
+
+        Returns:
+            API Key
+        """
         api_key = self.api_keys[self.current_key_index]
         self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
-        self.debug_log(f"轮询 API Key: index={self.current_key_index - 1}, api_key={api_key[:10]}...")
+        self.debug_log.sampled(
+            "轮询 API Key: index=%s, api_key=%.10s...", self.current_key_index - 1, api_key,
+        )
         return api_key
 
-    async def generate_image(self, prompt: str, size: str = "") -> str:
+    def _key_label(self, api_key: str) -> str:
+        """生成用于指标标签的 API Key 标识，避免泄露 Key 内容
+
+        Args:
+            api_key: API Key
+
+        Returns:
+            形如 "key0" 的标识
+        """
+        try:
+            return f"key{self.api_keys.index(api_key)}"
+        except ValueError:
+            return "unknown"
+
+    async def generate_image(
+        self, prompt: str, size: str = "", model: str = "", steps: int = 0, preview: bool = False
+    ) -> str:
         """调用 Gitee AI API 生成图片，返回本地文件路径
 
         Args:
             prompt: 图片提示词
             size: 图片大小（可选）
+            model: 模型名称（可选），默认使用 self.model
+            steps: 推理步数（可选），默认使用 self.num_inference_steps
+            preview: 是否为预览图；预览图不录制流量，成功耗时也不计入模型路由的延迟统计
+                （失败仍计入错误率），避免低分辨率、少步数的耗时拉低模型的平均延迟
 
         Returns:
             生成的图片本地文件路径
@@ -104,15 +190,150 @@ class GiteeAIClient:
         Raises:
             Exception: API 调用失败时抛出异常
         """
-        self.debug_log(f"开始生成图片: prompt={prompt[:50]}..., size={size or self.default_size}")
+        model = model or self.model
+        size = size or self.default_size
+        steps = steps or self.num_inference_steps
+        if self.jobs is None:
+            spare = await self._take_hedge_spare((prompt, model, size, steps))
+            if spare is not None:
+                return spare
+        start = time.perf_counter()
+        capture = contextlib.nullcontext({}) if preview else self.recorder.capture(
+            "generate",
+            prompt,
+            model=model,
+            size=size,
+            steps=steps,
+            negative_prompt=bool(self.negative_prompt),
+        )
+        with capture as entry:
+            try:
+                if self.jobs is not None:
+                    filepath = await self.jobs.run("generate", {
+                        "prompt": prompt, "size": size, "model": model, "steps": steps,
+                    })
+                else:
+                    filepath = await self._generate_hedged(prompt, size, model, steps)
+            except Exception:
+                self.router.record(model, time.perf_counter() - start, ok=False)
+                raise
+            elapsed = time.perf_counter() - start
+            if not preview:
+                self.router.record(model, elapsed, ok=True)
+            self.quality.record(elapsed, size, steps)
+            if not preview and self.recorder.enabled:
+                entry["output_bytes"] = file_size(filepath)
+        return filepath
+
+    async def _generate_hedged(self, prompt: str, size: str, model: str, steps: int) -> str:
+        """生成图片，超过近期耗时分位数仍未完成时在另一个 API Key 上发出对冲请求
+
+        先成功的请求胜出。取消 HTTP 请求并不能停止服务端的推理，因此落败请求在后台继续完成，
+        图片按请求参数暂存，之后参数相同的请求直接使用；调用方取消时两个请求都会被取消。
+        参数和返回值同 generate_image。
+        """
+        request = (prompt, model, size, steps)
+        shape = (model, size, steps)
+        delay = self.hedge.delay(shape) if len(set(self.api_keys)) > 1 else None
+        if delay is None:
+            api_key = await self._get_next_api_key()
+            return await self._timed_generate(prompt, size, model, steps, api_key)
+
+        primary_key = await self._get_next_api_key()
+        primary = asyncio.ensure_future(
+            self._timed_generate(prompt, size, model, steps, primary_key)
+        )
+        tasks = {primary}
+        won = False
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or not self.hedge.try_spend():
+                return await primary
+
+            hedge_key = await self._get_next_api_key(exclude=primary_key)
+            self.debug_log(
+                "发出对冲请求: delay=%.2fs, primary=%s, hedge=%s",
+                delay, self._key_label(primary_key), self._key_label(hedge_key),
+            )
+            hedge = asyncio.ensure_future(
+                self._timed_generate(prompt, size, model, steps, hedge_key)
+            )
+            tasks.add(hedge)
+            while True:
+                done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.discard(task)
+                    if task.exception() is None:
+                        HEDGES.inc(OUTCOME_HEDGE_WON if task is hedge else OUTCOME_PRIMARY_WON)
+                        won = True
+                        return task.result()
+                    if not tasks:
+                        HEDGES.inc(OUTCOME_BOTH_FAILED)
+                        return task.result()
+        finally:
+            for task in tasks:
+                if won:
+                    self._keep_hedge_loser(task, request)
+                else:
+                    task.cancel()
+
+    async def _take_hedge_spare(self, request: tuple[Any, ...]) -> str | None:
+        """取出之前落败的对冲请求为相同参数生成的图片
+
+        暂存图片不经过上游，因此不计入路由、降级和流量录制的统计。
+
+        Args:
+            request: 请求参数（提示词、模型、尺寸、步数）
+
+        Returns:
+            图片本地路径，没有可用的暂存图片时返回 None
+        """
+        spare = self.hedge.take_spare(request)
+        # 暂存期间图片可能已被定期清理删除
+        if spare is None or not await asyncio.to_thread(os.path.exists, spare):
+            return None
+        HEDGES.inc(OUTCOME_SPARE_USED)
+        self.debug_log("使用落败对冲请求暂存的图片: %s", spare)
+        return spare
+
+    def _keep_hedge_loser(self, task: "asyncio.Future[str]", request: tuple[Any, ...]) -> None:
+        """让落败的对冲请求在后台完成，成功时暂存其图片
+
+        Args:
+            task: 落败请求的任务
+            request: 请求参数（提示词、模型、尺寸、步数）
+        """
+        def on_done(finished: "asyncio.Future[str]") -> None:
+            self._background_tasks.discard(finished)
+            if finished.cancelled() or finished.exception() is not None:
+                return
+            self.hedge.store_spare(request, finished.result())
+
+        self._background_tasks.add(task)
+        task.add_done_callback(on_done)
+
+    async def _timed_generate(
+        self, prompt: str, size: str, model: str, steps: int, api_key: str
+    ) -> str:
+        """使用指定 API Key 生成图片，成功时记录耗时供对冲策略使用"""
+        start = time.perf_counter()
+        filepath = await self._generate_image(prompt, size, model, steps, api_key)
+        self.hedge.record((model, size, steps), time.perf_counter() - start)
+        return filepath
+
+    async def _generate_image(
+        self, prompt: str, size: str, model: str, steps: int, api_key: str
+    ) -> str:
+        """使用指定 API Key 生成图片的实现，参数和返回值同 generate_image"""
+        self.debug_log(
+            "开始生成图片: prompt=%.50s..., size=%s, model=%s, steps=%s", prompt, size, model, steps
+        )
 
-        api_key = self._get_next_api_key()
-        client = self.client_manager.get_openai_client(api_key)
-        target_size = size if size else self.default_size
+        target_size = size
 
         # 构建请求参数
         extra_body: dict[str, Any] = {
-            "num_inference_steps": self.num_inference_steps,
+            "num_inference_steps": steps,
         }
 
         if self.negative_prompt:
@@ -120,31 +341,47 @@ class GiteeAIClient:
 
         kwargs: dict[str, Any] = {
             "prompt": prompt,
-            "model": self.model,
+            "model": model,
             "extra_body": extra_body,
         }
 
         if target_size:
             kwargs["size"] = target_size
 
-        self.debug_log(f"发送 API 请求: model={self.model}, size={target_size}")
+        self.debug_log("发送 API 请求: model=%s, size=%s", model, target_size)
 
         try:
-            response = await client.images.generate(**kwargs)  # type: ignore
+            async with self.admission.slot(api_key):
+                request_start = time.perf_counter()
+                with (
+                    self.endpoints.guard() as endpoint,
+                    trace_span("upstream.generate", model=model, size=target_size),
+                ):
+                    client = self.client_manager.get_openai_client(api_key, endpoint.base_url)
+                    response = await with_deadline(
+                        "inference", client.images.generate(**kwargs)  # type: ignore
+                    )
+                UPSTREAM_LATENCY.observe(
+                    time.perf_counter() - request_start,
+                    "generate", model, target_size, self._key_label(api_key),
+                )
             self.debug_log("API 响应接收成功")
-        except AuthenticationError as e:
-            self.debug_log(f"API 认证失败: {e}")
+        except (CircuitOpenError, DeadlineExceeded):
+            raise
+        except deps.openai.AuthenticationError as e:
+            self.debug_log("API 认证失败: %s", e)
             raise RuntimeError("API Key 无效或已过期，请检查配置。") from e
-        except RateLimitError as e:
-            self.debug_log(f"API 速率限制: {e}")
+        except deps.openai.RateLimitError as e:
+            self.debug_log("API 速率限制: %s", e)
             raise RuntimeError("API 调用次数超限或并发过高，请稍后再试。") from e
-        except APIError as e:
-            self.debug_log(f"API 错误: {e}")
-            if e.status_code == 500:
+        except deps.openai.APIError as e:
+            self.debug_log("API 错误: %s", e)
+            # APIConnectionError 等没有 status_code
+            if getattr(e, "status_code", None) == 500:
                 raise RuntimeError("Gitee AI 服务器内部错误，请稍后再试。") from e
             raise RuntimeError(f"API调用失败: {e}") from e
         except Exception as e:
-            self.debug_log(f"未知错误: {e}")
+            self.debug_log("未知错误: %s", e)
             raise RuntimeError(f"API调用失败: {e}") from e
 
         if not response.data:  # type: ignore
@@ -156,14 +393,18 @@ class GiteeAIClient:
         if hasattr(image_data, "url") and image_data.url:
             self.debug_log("图片数据格式: URL")
             session = await self.client_manager.get_http_session()
-            filepath = await self.image_manager.download_image(image_data.url, session)
+            filepath = await with_deadline(
+                "download", self.image_manager.download_image(image_data.url, session)
+            )
         elif hasattr(image_data, "b64_json") and image_data.b64_json:
             self.debug_log("图片数据格式: Base64")
-            filepath = await self.image_manager.save_base64_image(image_data.b64_json)
+            # SDK 已把整个响应读入内存，这里只统计 Base64 字符串的占用
+            async with self.image_manager.memory.track(len(image_data.b64_json)):
+                filepath = await self.image_manager.save_base64_image(image_data.b64_json)
         else:
             raise RuntimeError("生成图片失败：未返回 URL 或 Base64 数据")
 
-        self.debug_log(f"图片保存成功: {filepath}")
+        self.debug_log("图片保存成功: %s", filepath)
 
         # 每 N 次生成执行一次清理
         from ..core import CLEANUP_INTERVAL
@@ -192,9 +433,9 @@ class GiteeAIClient:
         Raises:
             RuntimeError: API 调用失败时抛出异常
         """
-        self.debug_log(f"开始获取模型列表: vendor={vendor}, type={type}")
+        self.debug_log("开始获取模型列表: vendor=%s, type=%s", vendor, type)
 
-        api_key = self._get_next_api_key()
+        api_key = await self._get_next_api_key()
         session = await self.client_manager.get_http_session()
 
         # 构建查询参数
@@ -204,20 +445,23 @@ class GiteeAIClient:
         if type:
             params.append(("type", type))
 
-        self.debug_log(f"发送模型列表请求: params={params}")
+        self.debug_log("发送模型列表请求: params=%s", params)
 
         try:
             # 使用原始 HTTP 请求调用 Gitee AI 的 models API
-            url = f"{self.base_url}/models"
             headers = {
                 "Authorization": f"Bearer {api_key}",
             }
 
-            response = await session.get(url, params=params, headers=headers)
-            response.raise_for_status()
-
-            data = await response.json()
-            self.debug_log(f"模型列表获取成功: response_type={data.get('object')}, count={len(data.get('data', []))}")
+            with self.endpoints.guard() as endpoint:
+                url = f"{endpoint.base_url}/models"
+                response = await session.get(url, params=params, headers=headers)
+                response.raise_for_status()
+                data = await response.json()
+            self.debug_log(
+                "模型列表获取成功: response_type=%s, count=%s",
+                data.get('object'), len(data.get('data', [])),
+            )
 
             # 转换为字典列表
             models_data = []
@@ -230,8 +474,10 @@ class GiteeAIClient:
 
             return models_data
 
+        except (CircuitOpenError, DeadlineExceeded):
+            raise
         except Exception as e:
-            self.debug_log(f"API 调用失败: {e}")
+            self.debug_log("API 调用失败: %s", e)
             # 根据错误类型返回友好的错误信息
             error_msg = str(e)
             if "401" in error_msg or "403" in error_msg:
@@ -270,12 +516,60 @@ class GiteeAIClient:
         Raises:
             Exception: API 调用失败时抛出异常
         """
+        # 录制附件形态：URL 只记录类型，本地文件记录大小
+        images: list[dict[str, Any]] = []
+        if self.recorder.enabled:
+            for path in image_paths:
+                if path.startswith(("http://", "https://")):
+                    images.append({"kind": "url"})
+                else:
+                    images.append({"kind": "file", "bytes": file_size(path)})
+        with self.recorder.capture(
+            "edit",
+            prompt,
+            model=model,
+            steps=num_inference_steps,
+            guidance_scale=guidance_scale,
+            task_types=task_types or ["style"],
+            images=images,
+            download_urls=download_urls,
+        ) as entry:
+            if self.jobs is not None:
+                filepath = await self.jobs.run("edit", {
+                    "prompt": prompt,
+                    "image_paths": image_paths,
+                    "task_types": task_types,
+                    "model": model,
+                    "num_inference_steps": num_inference_steps,
+                    "guidance_scale": guidance_scale,
+                    "download_urls": download_urls,
+                })
+            else:
+                filepath = await self._edit_image(
+                    prompt, image_paths, task_types, model,
+                    num_inference_steps, guidance_scale, download_urls,
+                )
+            if self.recorder.enabled:
+                entry["output_bytes"] = file_size(filepath)
+        return filepath
+
+    async def _edit_image(
+        self,
+        prompt: str,
+        image_paths: list[str],
+        task_types: list[str] | None,
+        model: str,
+        num_inference_steps: int,
+        guidance_scale: float,
+        download_urls: bool,
+    ) -> str:
+        """编辑图片的实现，参数和返回值同 edit_image"""
         self.debug_log(
-            f"开始编辑图片: prompt={prompt[:50]}..., "
-            f"images={len(image_paths)}, task_types={task_types}, download_urls={download_urls}"
+            "开始编辑图片: prompt=%.50s..., images=%s, task_types=%s, download_urls=%s",
+            prompt, len(image_paths), task_types, download_urls,
         )
 
-        api_key = self._get_next_api_key()
+        api_key = await self._get_next_api_key()
         session = await self.client_manager.get_http_session()
 
         # 构建请求参数
@@ -298,90 +592,170 @@ class GiteeAIClient:
                 import json
                 fields.append(("task_types", json.dumps(item)))
 
-        # 添加图片
-        import mimetypes
-        import os
-
-        for filepath in image_paths:
-            name = os.path.basename(filepath)
-            if filepath.startswith(("http://", "https://")):
-                if download_urls:
-                    # 下载远程图片后再上传
-                    response = await session.get(filepath, timeout=10)
-                    response.raise_for_status()
-                    content = await response.read()
-                    mime_type = response.headers.get("Content-Type", "application/octet-stream")
-                    fields.append(("image", (name, content, mime_type)))
-                else:
-                    # 直接传递 URL
-                    fields.append(("image_url", filepath))
-            else:
-                # 读取本地图片
-                mime_type, _ = mimetypes.guess_type(filepath)
-                with open(filepath, "rb") as f:
-                    content = f.read()
-                fields.append(("image", (name, content, mime_type or "application/octet-stream")))
-
         # 构建请求头
         headers = {
             "Authorization": f"Bearer {api_key}",
             "X-Failover-Enabled": "true",
         }
 
-        # 发送请求
-        import aiohttp
-
-        data = aiohttp.FormData()
-        for field in fields:
-            if isinstance(field[1], tuple):
-                # 文件字段
-                name, value, content_type = field[1]
-                data.add_field(field[0], value, filename=name, content_type=content_type)
-            else:
-                # 普通字段
-                data.add_field(field[0], field[1])
-
-        self.debug_log("发送图片编辑请求")
-
         try:
-            async with session.post(
-                f"{self.base_url}/async/images/edits",
-                headers=headers,
-                data=data
-            ) as response:
-                response.raise_for_status()
-                result = await response.json()
+            # 图片内容只在提交期间占用内存预算，提交完成后即释放
+            async with contextlib.AsyncExitStack() as uploads:
+                fields.extend(
+                    await self._read_edit_images(image_paths, download_urls, session, uploads)
+                )
+
+                # 发送请求
+                data = deps.aiohttp.FormData()
+                for field in fields:
+                    if isinstance(field[1], tuple):
+                        # 文件字段
+                        name, value, content_type = field[1]
+                        data.add_field(field[0], value, filename=name, content_type=content_type)
+                    else:
+                        # 普通字段
+                        data.add_field(field[0], field[1])
+
+                self.debug_log("发送图片编辑请求")
+
+                async with self.admission.slot(api_key):
+                    request_start = time.perf_counter()
+                    with (
+                        self.endpoints.guard() as endpoint,
+                        trace_span("upstream.edit_submit", model=model, images=len(image_paths)),
+                    ):
+                        async with session.post(
+                            f"{endpoint.base_url}/async/images/edits",
+                            headers=headers,
+                            data=data,
+                            timeout=stage_timeout("upload", 300),
+                        ) as response:
+                            response.raise_for_status()
+                            result = await response.json()
+                    UPSTREAM_LATENCY.observe(
+                        time.perf_counter() - request_start,
+                        "edit_submit", model, "", self._key_label(api_key),
+                    )
 
             task_id = result.get("task_id")
             if not task_id:
                 raise RuntimeError("未返回任务 ID")
 
-            self.debug_log(f"任务创建成功: task_id={task_id}")
+            self.debug_log("任务创建成功: task_id=%s", task_id)
 
-            # 轮询任务状态
-            filepath = await self._poll_edit_task(task_id, session, api_key)
-            self.debug_log(f"图片编辑完成: {filepath}")
+            # 登记远程任务的取消回调，用户取消时释放上游容量
+            job = current_job.get()
+            if job is not None:
+                job.set_remote_cancel(
+                    lambda: self.cancel_task(task_id, api_key, endpoint.base_url)
+                )
+
+            # 轮询任务状态，任务只能在创建它的端点上查询
+            try:
+                filepath = await self._poll_edit_task(task_id, session, api_key, endpoint)
+            except DeadlineExceeded:
+                # 超出总时限后结果已无人等待，取消远程任务以释放上游容量
+                await self.cancel_task(task_id, api_key, endpoint.base_url)
+                raise
+            self.debug_log("图片编辑完成: %s", filepath)
 
             return filepath
 
+        except (CircuitOpenError, DeadlineExceeded):
+            raise
         except Exception as e:
-            self.debug_log(f"图片编辑失败: {e}")
+            self.debug_log("图片编辑失败: %s", e)
             raise RuntimeError(f"图片编辑失败: {str(e)}") from e
 
+    async def _read_edit_images(
+        self,
+        image_paths: list[str],
+        download_urls: bool,
+        session: Any,
+        uploads: contextlib.AsyncExitStack,
+    ) -> list[tuple[str, Any]]:
+        """读取要上传的图片，生成表单字段
+
+        内存预算足够时把图片读入内存，不足时改为上传时从磁盘流式读取。
+        占用的预算和打开的文件登记在 uploads 上，提交完成后统一释放。
+
+        Args:
+            image_paths: 图片路径列表（支持本地路径或 URL）
+            download_urls: 是否下载 URL 图片后再上传
+            session: aiohttp Session 实例
+            uploads: 管理预算占用和文件句柄的退出栈
+
+        Returns:
+            表单字段列表，文件字段的值为 (文件名, 内容, MIME 类型)
+        """
+        import mimetypes
+
+        memory = self.image_manager.memory
+        fields: list[tuple[str, Any]] = []
+        for filepath in image_paths:
+            name = os.path.basename(filepath)
+            if filepath.startswith(("http://", "https://")):
+                if not download_urls:
+                    # 直接传递 URL
+                    fields.append(("image_url", filepath))
+                    continue
+                # 下载远程图片后再上传
+                response = await uploads.enter_async_context(
+                    session.get(filepath, timeout=stage_timeout("upload", 10))
+                )
+                response.raise_for_status()
+                mime_type = response.headers.get("Content-Type", "application/octet-stream")
+                length = response.content_length
+                buffered = await uploads.enter_async_context(
+                    memory.reserve(length or 0, spill=True)
+                )
+                if buffered and length is not None:
+                    content = await response.read()
+                else:
+                    # 中转文件放在临时目录，提交完成后删除，不占用图片缓存的数量上限
+                    local_path = self.image_manager.get_temp_path(
+                        os.path.splitext(name)[1] or ".jpg"
+                    )
+                    uploads.push_async_callback(self.image_manager.remove_file, local_path)
+                    await self.image_manager.stream_to_file(response, local_path)
+                    content = uploads.enter_context(
+                        await asyncio.to_thread(open, local_path, "rb")
+                    )
+                fields.append(("image", (name, content, mime_type)))
+                continue
+
+            # 读取本地图片
+            mime_type, _ = mimetypes.guess_type(filepath)
+            size = await asyncio.to_thread(os.path.getsize, filepath)
+            buffered = await uploads.enter_async_context(memory.reserve(size, spill=True))
+            if buffered:
+                with trace_span("image.upload_read", path=name):
+                    async with deps.aiofiles.open(filepath, "rb") as f:
+                        content = await f.read()
+            else:
+                # 上传时从磁盘分块读取
+                content = uploads.enter_context(await asyncio.to_thread(open, filepath, "rb"))
+            fields.append(("image", (name, content, mime_type or "application/octet-stream")))
+        return fields
+
     async def _poll_edit_task(
         self,
         task_id: str,
         session,
         api_key: str,
+        endpoint: CircuitBreaker,
         timeout: int = 30 * 60,
         retry_interval: int = 10,
     ) -> str:
         """轮询图片编辑任务状态
 
+        轮询结果计入端点的熔断统计，但端点熔断时不中断轮询。
+
         Args:
             task_id: 任务 ID
             session: HTTP 会话
             api_key: API Key
+            endpoint: 创建任务的端点
             timeout: 超时时间（秒）
             retry_interval: 重试间隔（秒）
 
@@ -398,54 +772,119 @@ class GiteeAIClient:
             "Authorization": f"Bearer {api_key}",
         }
 
-        while attempts < max_attempts:
-            attempts += 1
-            self.debug_log(f"轮询任务状态 [{attempts}/{max_attempts}]...")
-
-            try:
-                async with session.get(
-                    f"{self.base_url}/task/{task_id}",
-                    headers=headers,
-                    timeout=10
-                ) as response:
-                    response.raise_for_status()
-                    result = await response.json()
-
-                if result.get("error"):
-                    error_msg = result.get("message", "未知错误")
-                    raise RuntimeError(f"任务错误: {error_msg}")
-
-                status = result.get("status", "unknown")
-                self.debug_log(f"任务状态: {status}")
-
-                if status == "success":
-                    if "output" in result and "file_url" in result["output"]:
-                        file_url = result["output"]["file_url"]
-                        completed_at = result.get('completed_at', 0)
-                        started_at = result.get('started_at', 0)
-                        duration = (completed_at - started_at) / 1000 if completed_at and started_at else 0
-                        self.debug_log(f"任务完成，耗时: {duration:.2f}秒")
-                        # 下载图片
-                        return await self.image_manager.download_image(file_url, session)
+        file_url = ""
+        with trace_span("upstream.poll", task_id=task_id):
+            while attempts < max_attempts:
+                attempts += 1
+                self.debug_log.sampled("轮询任务状态 [%s/%s]...", attempts, max_attempts)
+
+                try:
+                    async with self.admission.slot(api_key):
+                        poll_start = time.perf_counter()
+                        try:
+                            async with session.get(
+                                f"{endpoint.base_url}/task/{task_id}",
+                                headers=headers,
+                                timeout=stage_timeout("polling", 10),
+                            ) as response:
+                                response.raise_for_status()
+                                result = await response.json()
+                        except BaseException as e:
+                            self.endpoints.record(endpoint, time.perf_counter() - poll_start, e)
+                            raise
+                        self.endpoints.record(endpoint, time.perf_counter() - poll_start)
+
+                    if result.get("error"):
+                        error_msg = result.get("message", "未知错误")
+                        raise RuntimeError(f"任务错误: {error_msg}")
+
+                    status = result.get("status", "unknown")
+                    self.debug_log.sampled("任务状态: %s", status)
+
+                    if status == "success":
+                        if "output" in result and "file_url" in result["output"]:
+                            file_url = result["output"]["file_url"]
+                            completed_at = result.get('completed_at', 0)
+                            started_at = result.get('started_at', 0)
+                            duration = (completed_at - started_at) / 1000 if completed_at and started_at else 0
+                            self.debug_log("任务完成，耗时: %.2f秒", duration)
+                            break
+                        else:
+                            raise RuntimeError("任务成功但未返回图片 URL")
+                    elif status in ["failed", "cancelled"]:
+                        raise RuntimeError(f"任务失败: {status}")
                     else:
-                        raise RuntimeError("任务成功但未返回图片 URL")
-                elif status in ["failed", "cancelled"]:
-                    raise RuntimeError(f"任务失败: {status}")
-                else:
-                    # 任务仍在进行中，等待重试
-                    await asyncio.sleep(retry_interval)
-                    continue
+                        # 任务仍在进行中，等待重试
+                        await asyncio.sleep(stage_timeout("polling", retry_interval))
+                        continue
+
+                except DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    if attempts >= max_attempts:
+                        raise RuntimeError(f"任务轮询失败: {str(e)}") from e
+                    self.debug_log("轮询失败，等待重试: %s", e)
+                    await asyncio.sleep(stage_timeout("polling", retry_interval))
+
+        if not file_url:
+            raise RuntimeError(f"任务超时（已等待 {timeout} 秒）")
+
+        # 下载图片
+        return await with_deadline("download", self.image_manager.download_image(file_url, session))
 
-            except Exception as e:
-                if attempts >= max_attempts:
-                    raise RuntimeError(f"任务轮询失败: {str(e)}") from e
-                self.debug_log(f"轮询失败，等待重试: {e}")
-                await asyncio.sleep(retry_interval)
+    async def cancel_task(self, task_id: str, api_key: str, base_url: str = "") -> bool:
+        """取消远程异步任务
 
-        raise RuntimeError(f"任务超时（已等待 {timeout} 秒）")
+        Args:
+            task_id: 任务 ID
+            api_key: 创建任务时使用的 API Key
+            base_url: 创建任务的端点地址（可选），默认使用 self.base_url
+
+        Returns:
+            True 表示取消成功，False 表示取消失败（任务可能已结束）
+        """
+        self.debug_log("取消远程任务: task_id=%s", task_id)
+        session = await self.client_manager.get_http_session()
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+        }
+        try:
+            async with session.post(
+                f"{base_url or self.base_url}/task/{task_id}/cancel",
+                headers=headers,
+                timeout=10
+            ) as response:
+                response.raise_for_status()
+            self.debug_log("远程任务已取消: task_id=%s", task_id)
+            return True
+        except Exception as e:
+            logger.warning(f"取消远程任务失败: task_id={task_id}, error={e}")
+            return False
+
+    async def drain_background_tasks(self, timeout: float) -> tuple[int, int]:
+        """等待后台任务（图片清理等）结束，超时后取消
+
+        Args:
+            timeout: 最长等待秒数
+
+        Returns:
+            (已完成, 被取消) 的任务数
+        """
+        tasks = set(self._background_tasks)
+        if not tasks:
+            return 0, 0
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        finished = len(tasks) - len(pending)
+        self.debug_log("后台任务已结束: finished=%s, cancelled=%s", finished, len(pending))
+        return finished, len(pending)
 
     async def close(self) -> None:
         """清理资源"""
         self.debug_log("开始清理 API 客户端资源")
+        await self.recorder.close()
         await self.client_manager.close()
         self.debug_log("API 客户端资源清理完成")
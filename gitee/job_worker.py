@@ -0,0 +1,465 @@
+"""任务队列工作进程
+
+从 SQLite 任务队列领取文生图和图片编辑任务，在独立进程的事件循环中调用 Gitee AI，
+把图片路径或错误写回队列，由发起任务的实例取回并发送。工作进程和发起实例需在同一主机上，
+图片通过本地文件传递。
+
+插件开启任务队列模式时会自动启动工作进程；也可以在 AstrBot 根目录下单独启动，
+使用插件的配置文件：
+
+    python -m data.plugins.astrbot_plugin_models_ai.gitee.job_worker \\
+        --db /path/to/job_queue.db --config data/config/astrbot_plugin_models_ai_config.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Any, Optional
+
+from astrbot.api import logger
+
+from ..core import (
+    CIRCUIT_OPEN_SECONDS,
+    DEFAULT_BASE_URL,
+    DEFAULT_CIRCUIT_FAILURE_THRESHOLD,
+    DEFAULT_CIRCUIT_SLOW_CALL_SECONDS,
+    DEFAULT_DEBUG_SAMPLE_EVERY,
+    DEFAULT_HEDGE_BUDGET,
+    DEFAULT_HEDGE_PERCENTILE,
+    DEFAULT_IMAGE_MEMORY_BUDGET_MB,
+    DEFAULT_INFERENCE_STEPS,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_MIRROR_BASE_URLS,
+    DEFAULT_MODEL,
+    DEFAULT_NEGATIVE_PROMPT,
+    DEFAULT_PER_KEY_CONCURRENCY,
+    DEFAULT_SHARED_STATE_PATH,
+    DEFAULT_SIZE,
+    SHUTDOWN_CANCEL_TIMEOUT,
+    Deadline,
+    DebugLogger,
+    EndpointPool,
+    HedgePolicy,
+    JobQueue,
+    MemoryBudget,
+    SharedState,
+    configure_debug_logging,
+    current_deadline,
+    parse_api_keys,
+    parse_base_urls,
+    parse_debug_levels,
+)
+from ..core.config import (
+    JOB_QUEUE_POLL_INTERVAL,
+    JOB_WORKER_CHECK_INTERVAL,
+    JOB_WORKER_CONCURRENCY,
+    JOB_WORKER_MAX_RESTARTS,
+    JOB_WORKER_RESTART_BACKOFF,
+    JOB_WORKER_RESTART_BACKOFF_MAX,
+    JOB_WORKER_STABLE_SECONDS,
+)
+from .api_client import GiteeAIClient
+
+WORKER_MODULE = __name__
+
+
+class JobWorker:
+    """领取并执行队列任务的工作进程主循环"""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        client: GiteeAIClient,
+        worker_id: str,
+        concurrency: int = JOB_WORKER_CONCURRENCY,
+        parent_pid: int = 0,
+        debug_mode: bool = False,
+    ) -> None:
+        """初始化工作进程
+
+        Args:
+            queue: 任务队列
+            client: 在本进程中直接调用上游的 API 客户端
+            worker_id: 工作进程标识
+            concurrency: 同时执行的任务数
+            parent_pid: 启动本进程的插件进程 ID，该进程退出后停止；0 表示不检查
+            debug_mode: 是否启用 Debug 日志
+        """
+        self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("JobWorker", self.debug_mode)
+        self.queue = queue
+        self.client = client
+        self.worker_id = worker_id
+        self.concurrency = max(1, concurrency)
+        self.parent_pid = parent_pid
+        self._running: dict[int, asyncio.Task[None]] = {}
+        self._stopping = False
+
+    def stop(self) -> None:
+        """停止领取新任务，执行中的任务放回队列（可在信号处理中调用）"""
+        self._stopping = True
+
+    def _should_stop(self) -> bool:
+        """是否收到停止信号，或启动本进程的插件进程已退出"""
+        return self._stopping or bool(self.parent_pid and os.getppid() != self.parent_pid)
+
+    async def run(self) -> None:
+        """领取任务直到收到停止信号"""
+        self.debug_log("工作进程启动: worker=%s, concurrency=%s", self.worker_id, self.concurrency)
+        while not self._should_stop():
+            try:
+                while len(self._running) < self.concurrency:
+                    job = self.queue.claim(self.worker_id)
+                    if job is None:
+                        break
+                    self._start(*job)
+                # 每次轮询都为执行中的任务续约，并取消已被发起实例取消的任务
+                cancelled = self.queue.renew(self.worker_id, list(self._running))
+                for job_id in cancelled:
+                    task = self._running.get(job_id)
+                    if task is not None:
+                        self.debug_log("任务已被发起实例取消: job_id=%s", job_id)
+                        task.cancel()
+            except Exception as e:
+                logger.warning(f"工作进程 {self.worker_id} 读写任务队列失败: {e}")
+            await asyncio.sleep(JOB_QUEUE_POLL_INTERVAL)
+        self._stopping = True
+
+        # 执行中的任务放回队列，由其他工作进程重新执行
+        job_ids = list(self._running)
+        for task in self._running.values():
+            task.cancel()
+        await asyncio.gather(*self._running.values(), return_exceptions=True)
+        try:
+            self.queue.requeue(self.worker_id, job_ids)
+        except Exception as e:
+            logger.warning(f"放回任务失败，任务将在租约过期后重新排队: {e}")
+        self.debug_log("工作进程停止: worker=%s, requeued=%s", self.worker_id, len(job_ids))
+
+    def _start(self, job_id: int, kind: str, payload: dict[str, Any], queue_wait: float) -> None:
+        """在新的任务中执行领取到的队列任务"""
+        self.debug_log.sampled(
+            "领取任务: job_id=%s, kind=%s, queue_wait=%.2fs", job_id, kind, queue_wait
+        )
+        task = asyncio.create_task(self._execute(job_id, kind, payload, queue_wait))
+        self._running[job_id] = task
+        task.add_done_callback(lambda _: self._running.pop(job_id, None))
+
+    async def _execute(
+        self, job_id: int, kind: str, payload: dict[str, Any], queue_wait: float
+    ) -> None:
+        """调用上游并写回结果"""
+        limit = payload.pop("deadline", None)
+        if limit is not None:
+            # 沿用发起实例的总时限，扣除在队列中等待的时间
+            deadline = Deadline(limit["command"], limit["budget"])
+            deadline.expires_at = deadline.started_at + limit["remaining"] - queue_wait
+            current_deadline.set(deadline)
+
+        result: dict[str, Any] = {"queue_wait": round(queue_wait, 3)}
+        try:
+            if kind == "generate":
+                path = await self.client.generate_image(**payload)
+            elif kind == "edit":
+                path = await self.client.edit_image(**payload)
+            else:
+                raise ValueError(f"未知的任务类型: {kind}")
+            result["path"] = os.path.abspath(path)
+        except asyncio.CancelledError:
+            if not self._stopping:
+                # 发起实例已取消，写回结果时会直接删除该任务
+                self._finish(job_id, {"error": "任务已取消", "type": "CancelledError"})
+            raise
+        except Exception as e:
+            result.update(error=str(e), type=type(e).__name__, stage=getattr(e, "stage", ""))
+        self._finish(job_id, result)
+
+    def _finish(self, job_id: int, result: dict[str, Any]) -> None:
+        """写回结果，失败时任务在租约过期后重新排队"""
+        try:
+            if not self.queue.finish(job_id, self.worker_id, result):
+                self.debug_log("任务已被重新领取，丢弃结果: job_id=%s", job_id)
+        except Exception as e:
+            logger.warning(f"写回任务结果失败: job_id={job_id}, error={e}")
+
+
+class JobWorkerPool:
+    """由插件启动和回收的工作进程组
+
+    工作进程通过 python -m 以独立解释器启动，配置经标准输入传入，避免 API Key 出现在命令行中。
+    一个后台监督任务负责启动工作进程，并在进程退出后按指数退避重启；连续快速退出
+    （如导入或配置错误）超过 JOB_WORKER_MAX_RESTARTS 次的工作进程不再重启。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        config: dict[str, Any],
+        workers: int = 0,
+        name: str = "",
+        debug_mode: bool = False,
+    ) -> None:
+        """初始化工作进程组
+
+        Args:
+            path: 任务队列文件路径
+            config: 插件配置，传给工作进程创建 API 客户端
+            workers: 工作进程数，0 表示不启动
+            name: 工作进程标识前缀，通常为实例标识
+            debug_mode: 是否启用 Debug 日志
+        """
+        self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("JobWorkerPool", self.debug_mode)
+        self.path = path
+        self.config = dict(config)
+        self.workers = max(0, workers)
+        self.name = name or str(os.getpid())
+        self._procs: list[Optional[subprocess.Popen[bytes]]] = [None] * self.workers
+        self._started_at = [0.0] * self.workers
+        self._failures = [0] * self.workers
+        self._retry_at = [0.0] * self.workers
+        self._task: Optional[asyncio.Task[None]] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._closed = False
+
+    @property
+    def alive_count(self) -> int:
+        """运行中的工作进程数"""
+        return sum(1 for proc in self._procs if proc is not None and proc.poll() is None)
+
+    def _spawn(self, index: int) -> subprocess.Popen[bytes]:
+        """启动一个工作进程"""
+        proc = subprocess.Popen(
+            [
+                sys.executable, "-m", WORKER_MODULE,
+                "--db", self.path,
+                "--worker-id", f"{self.name}-w{index}",
+                "--parent-pid", str(os.getpid()),
+            ],
+            stdin=subprocess.PIPE,
+            cwd=os.getcwd(),
+        )
+        assert proc.stdin is not None
+        proc.stdin.write(json.dumps(self.config, ensure_ascii=False).encode("utf-8"))
+        proc.stdin.close()
+        return proc
+
+    def start(self) -> None:
+        """启动监督任务（需在事件循环中调用，重复调用无效）"""
+        if self._closed or self._task is not None or not self.workers:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._supervise())
+
+    async def _supervise(self) -> None:
+        """启动工作进程，之后定期检查并重启已退出的进程，直到进程组关闭"""
+        assert self._wakeup is not None
+        while not self._closed:
+            for index in range(self.workers):
+                if self._closed:
+                    return
+                try:
+                    await self._check(index)
+                except Exception as e:
+                    logger.error(f"检查任务队列工作进程 {index} 失败: {e}", exc_info=True)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), JOB_WORKER_CHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _check(self, index: int) -> None:
+        """检查一个工作进程，已退出且到了重试时间时重新启动
+
+        Args:
+            index: 工作进程序号
+        """
+        proc = self._procs[index]
+        if proc is not None:
+            if proc.poll() is None:
+                return
+            self._procs[index] = None
+            self._record_failure(index, f"已退出（退出码 {proc.returncode}）")
+        if self._failures[index] > JOB_WORKER_MAX_RESTARTS:
+            return
+        if time.monotonic() < self._retry_at[index]:
+            return
+        try:
+            proc = await asyncio.to_thread(self._spawn, index)
+        except OSError as e:
+            self._record_failure(index, f"启动失败: {e}")
+            return
+        self._procs[index] = proc
+        self._started_at[index] = time.monotonic()
+        self.debug_log("启动工作进程: index=%s, pid=%s", index, proc.pid)
+
+    def _record_failure(self, index: int, reason: str) -> None:
+        """记录一次退出或启动失败，并安排下一次重启时间
+
+        Args:
+            index: 工作进程序号
+            reason: 日志中显示的原因
+        """
+        now = time.monotonic()
+        if self._started_at[index] and now - self._started_at[index] >= JOB_WORKER_STABLE_SECONDS:
+            # 运行了较长时间后退出，视为偶发故障
+            self._failures[index] = 0
+        self._started_at[index] = 0.0
+        self._failures[index] += 1
+        failures = self._failures[index]
+        if failures > JOB_WORKER_MAX_RESTARTS:
+            logger.error(f"任务队列工作进程 {index} {reason}，已连续失败 {failures} 次，不再重启")
+            return
+        delay = min(
+            JOB_WORKER_RESTART_BACKOFF_MAX, JOB_WORKER_RESTART_BACKOFF * 2 ** (failures - 1)
+        )
+        self._retry_at[index] = now + delay
+        logger.warning(f"任务队列工作进程 {index} {reason}，{delay:.0f} 秒后重新启动")
+
+    async def close(self, timeout: float) -> int:
+        """通知工作进程停止并等待退出，超时后强制结束
+
+        Args:
+            timeout: 最长等待秒数
+
+        Returns:
+            被强制结束的进程数
+        """
+        self._closed = True
+        if self._task is not None:
+            # 等待监督任务退出，避免关闭过程中又启动新的工作进程
+            assert self._wakeup is not None
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        procs = [proc for proc in self._procs if proc is not None and proc.poll() is None]
+        for proc in procs:
+            proc.terminate()
+        deadline = time.monotonic() + timeout
+        killed = 0
+        for proc in procs:
+            try:
+                await asyncio.to_thread(proc.wait, max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                await asyncio.to_thread(proc.wait)
+                killed += 1
+        self.debug_log("工作进程已停止: total=%s, killed=%s", len(procs), killed)
+        return killed
+
+
+def create_worker_client(
+    config: dict[str, Any], shared: Optional[SharedState] = None
+) -> GiteeAIClient:
+    """按插件配置创建工作进程使用的 API 客户端
+
+    模型路由、降级和流量录制由发起实例负责，工作进程只需要 Key 轮换、对冲、熔断和内存预算。
+
+    Args:
+        config: 插件配置
+        shared: 多实例共享状态（可选）
+
+    Returns:
+        API 客户端
+    """
+    debug_mode = config.get("debug_mode", False)
+    base_url = config.get("base_url", DEFAULT_BASE_URL)
+    mirror_base_urls = parse_base_urls(config.get("mirror_base_urls", DEFAULT_MIRROR_BASE_URLS))
+    image_memory_budget_mb = config.get("image_memory_budget_mb", DEFAULT_IMAGE_MEMORY_BUDGET_MB)
+    return GiteeAIClient(
+        api_keys=parse_api_keys(config.get("api_key", [])),
+        model=config.get("model", DEFAULT_MODEL),
+        default_size=config.get("size", DEFAULT_SIZE),
+        num_inference_steps=config.get("num_inference_steps", DEFAULT_INFERENCE_STEPS),
+        negative_prompt=config.get("negative_prompt", DEFAULT_NEGATIVE_PROMPT),
+        base_url=base_url,
+        debug_mode=debug_mode,
+        per_key_concurrency=config.get("per_key_concurrency", DEFAULT_PER_KEY_CONCURRENCY),
+        max_concurrency=config.get("max_concurrency", DEFAULT_MAX_CONCURRENCY),
+        hedge=HedgePolicy(
+            percentile=config.get("hedge_percentile", DEFAULT_HEDGE_PERCENTILE),
+            budget=config.get("hedge_budget", DEFAULT_HEDGE_BUDGET),
+            debug_mode=debug_mode,
+        ),
+        endpoints=EndpointPool(
+            [base_url] + mirror_base_urls,
+            failure_threshold=config.get(
+                "circuit_failure_threshold", DEFAULT_CIRCUIT_FAILURE_THRESHOLD
+            ),
+            slow_call_seconds=config.get(
+                "circuit_slow_call_seconds", DEFAULT_CIRCUIT_SLOW_CALL_SECONDS
+            ),
+            open_seconds=CIRCUIT_OPEN_SECONDS,
+            debug_mode=debug_mode,
+        ),
+        memory=MemoryBudget(
+            limit_bytes=int(image_memory_budget_mb * 1024 * 1024),
+            debug_mode=debug_mode,
+        ),
+        shared=shared,
+    )
+
+
+async def serve(
+    path: str, config: dict[str, Any], worker_id: str, parent_pid: int = 0
+) -> None:
+    """运行一个工作进程直到收到 SIGTERM/SIGINT 或插件进程退出
+
+    Args:
+        path: 任务队列文件路径
+        config: 插件配置
+        worker_id: 工作进程标识
+        parent_pid: 启动本进程的插件进程 ID，0 表示不检查
+    """
+    debug_mode = config.get("debug_mode", False)
+    configure_debug_logging(
+        parse_debug_levels(config.get("debug_levels", "")),
+        config.get("debug_sample_every", DEFAULT_DEBUG_SAMPLE_EVERY),
+    )
+    shared_state_path = config.get("shared_state_path", DEFAULT_SHARED_STATE_PATH)
+    shared = SharedState(shared_state_path, debug_mode) if shared_state_path else None
+    client = create_worker_client(config, shared)
+    queue = JobQueue(path, debug_mode=debug_mode)
+    worker = JobWorker(queue, client, worker_id, parent_pid=parent_pid, debug_mode=debug_mode)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, worker.stop)
+        except (NotImplementedError, RuntimeError):
+            # Windows 不支持，依赖插件进程退出检查和强制结束
+            pass
+
+    try:
+        await worker.run()
+    finally:
+        await client.drain_background_tasks(SHUTDOWN_CANCEL_TIMEOUT)
+        await client.close()
+        queue.close()
+        if shared is not None:
+            shared.close()
+
+
+def main() -> None:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="任务队列工作进程")
+    parser.add_argument("--db", required=True, help="任务队列文件路径")
+    parser.add_argument("--worker-id", default=f"worker-{os.getpid()}", help="工作进程标识")
+    parser.add_argument("--config", default="-", help="插件配置 JSON 文件，- 表示从标准输入读取")
+    parser.add_argument("--parent-pid", type=int, default=0, help="该进程退出后停止，0 表示不检查")
+    args = parser.parse_args()
+
+    if args.config == "-":
+        config = json.load(sys.stdin)
+    else:
+        with open(args.config, encoding="utf-8") as f:
+            config = json.load(f)
+    asyncio.run(serve(args.db, config, args.worker_id, args.parent_pid))
+
+
+if __name__ == "__main__":
+    main()
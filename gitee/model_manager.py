@@ -3,12 +3,16 @@
 负责获取和展示 Gitee AI 模型列表。
 """
 
-from typing import Any
+import time
+from typing import Any, Optional
 
 from astrbot.api import logger
 
+from ..core import DebugLogger
 from .api_client import GiteeAIClient
 
+MODEL_LIST_CACHE_TTL = 600  # 切换模型时用于校验模型名称的列表缓存时长（秒）
+
 # 支持的模型类型列表
 MODEL_TYPES = [
     "all",
@@ -55,17 +59,32 @@ class ModelLister:
         """
         self.api_client = api_client
         self.debug_mode = debug_mode
+        self.debug_log = DebugLogger("ModelLister", self.debug_mode)
+        self._known_models: Optional[set[str]] = None
+        self._known_at = 0.0
 
         self.debug_log("模型列表管理器初始化完成")
 
-    def debug_log(self, message: str) -> None:
-        """输出 Debug 日志
+    async def known_models(self) -> Optional[set[str]]:
+        """获取可用的文生图模型名称，用于校验切换的模型，结果缓存 MODEL_LIST_CACHE_TTL 秒
 
-        Args:
-            message: 日志消息
+        Returns:
+            模型名称集合，获取失败或列表为空时返回 None（无法校验）
         """
-        if self.debug_mode:
-            logger.debug(f"[ModelLister] {message}")
+        now = time.monotonic()
+        if self._known_models is not None and now - self._known_at < MODEL_LIST_CACHE_TTL:
+            return self._known_models
+        try:
+            models = await self.api_client.get_models(type="text2image")
+        except Exception as e:
+            logger.warning(f"获取模型列表失败，跳过模型名称校验: {e}")
+            return None
+        if not models:
+            return None
+        self._known_models = {model["id"] for model in models}
+        self._known_at = now
+        self.debug_log("缓存模型列表: count=%s", len(self._known_models))
+        return self._known_models
 
     @staticmethod
     def _parse_type_param(type_param: str) -> str:
@@ -130,14 +149,14 @@ class ModelLister:
         Returns:
             tuple[bool, str]: (是否成功, 结果消息)
         """
-        self.debug_log(f"收到模型列表请求: type_param={type_param}")
+        self.debug_log("收到模型列表请求: type_param=%s", type_param)
 
         # 解析类型参数
         model_type = self._parse_type_param(type_param)
 
         # 验证类型参数
         if model_type and not self._validate_model_type(model_type):
-            self.debug_log(f"无效的类型参数: {model_type}")
+            self.debug_log("无效的类型参数: %s", model_type)
             error_msg = (
                 f"无效的模型类型: {model_type}\n"
                 f"支持的类型: {', '.join(MODEL_TYPES)}\n"
@@ -145,7 +164,7 @@ class ModelLister:
             )
             return False, error_msg
 
-        self.debug_log(f"解析类型参数: type={model_type}")
+        self.debug_log("解析类型参数: type=%s", model_type)
 
         try:
             self.debug_log("开始获取模型列表")
@@ -156,7 +175,7 @@ class ModelLister:
             # 调用 API 获取模型列表
             models = await self.api_client.get_models(type=api_type)
 
-            self.debug_log(f"模型列表获取成功: count={len(models)}")
+            self.debug_log("模型列表获取成功: count=%s", len(models))
 
             if not models:
                 self.debug_log("模型列表为空")
@@ -166,10 +185,10 @@ class ModelLister:
             # 格式化输出
             output = self._format_models_output(models)
 
-            self.debug_log(f"准备返回结果: count={len(models)}")
+            self.debug_log("准备返回结果: count=%s", len(models))
             return True, output
 
         except Exception as e:
             logger.error(f"获取模型列表失败: {e}", exc_info=True)
-            self.debug_log(f"获取模型列表失败: error={str(e)}")
+            self.debug_log("获取模型列表失败: error=%s", e)
             return False, f"获取模型列表失败: {str(e)}"
\ No newline at end of file
@@ -3,13 +3,25 @@
 提供 LLM 工具调用生成图片的功能。
 """
 
+import asyncio
 import time
 
 from astrbot.api import logger
 from astrbot.api.event import AstrMessageEvent
 from astrbot.api.message_components import Image, Plain
 
-from ..core import parse_prompt_and_size
+from ..core import get_rate_limit_rejection, parse_prompt_and_size
+from ..core.command_utils import (
+    format_phase_breakdown,
+    format_queue_position,
+    plan_quality,
+    record_completion,
+    record_failure,
+    submit_job,
+)
+from ..core.deadline import with_deadline
+from ..core.scheduler import LANE_LLM
+from ..core.tracing import trace_span
 
 
 async def draw_image_tool(
@@ -30,49 +42,72 @@ async def draw_image_tool(
     user_id = event.get_sender_id()
     request_id = user_id
 
-    plugin.debug_log(f"[LLM工具] 收到生图请求: user_id={user_id}, prompt={prompt[:50]}...")
+    plugin.debug_log("[LLM工具] 收到生图请求: user_id=%s, prompt=%.50s...", user_id, prompt)
 
-    # 防抖检查
-    if plugin.rate_limiter.check_debounce(request_id):
-        plugin.debug_log(f"[LLM工具] 请求被防抖拦截: user_id={user_id}")
-        return "操作太快了，请稍后再试。"
-
-    if plugin.rate_limiter.is_processing(request_id):
-        plugin.debug_log(f"[LLM工具] 用户正在处理中: user_id={user_id}")
-        return "您有正在进行的生图任务，请稍候..."
-
-    plugin.rate_limiter.add_processing(request_id)
+    # 检查速率限制和防抖
+    rejection = await get_rate_limit_rejection(plugin, event, "LLM工具", request_id, "draw")
+    if rejection:
+        return rejection
 
     # 解析提示词和目标尺寸
     try:
         prompt, target_size = parse_prompt_and_size(plugin, prompt)
     except ValueError as e:
-        plugin.debug_log(f"[LLM工具] 参数解析失败: {e}")
+        plugin.debug_log("[LLM工具] 参数解析失败: %s", e)
+        plugin.rate_limiter.remove_processing(request_id)
         return f"{e}。请提供完整的提示词和可选的比例参数。"
 
+    # 选择模型并提交到任务队列，LLM 工具调用使用最高优先级通道
+    model = plugin.api_client.router.route(user_id, "draw", plugin.api_client.model)
+    ticket, rejection = submit_job(plugin, event, "draw", LANE_LLM, model)
+    if ticket is None:
+        plugin.rate_limiter.remove_processing(request_id)
+        return rejection
+
+    root = plugin.tracer.start_trace(
+        "draw", user_id=user_id, job_id=ticket.job_id, size=target_size,
+        model=model,
+    )
     try:
-        plugin.debug_log(f"[LLM工具] 开始生成图片: user_id={user_id}, size={target_size}")
+        queue_message = format_queue_position(ticket)
+        if queue_message:
+            await event.send(event.plain_result(queue_message))
+        with trace_span("queue.wait"):
+            await with_deadline("queue", ticket.wait(), ticket.deadline)
+
+        plugin.debug_log("[LLM工具] 开始生成图片: user_id=%s, size=%s", user_id, target_size)
         # 先发送提示消息
         await event.send(event.plain_result("正在生成图片，请稍候..."))
+        plan = plan_quality(plugin, target_size)
         start_time = time.time()
-        image_path = await plugin.api_client.generate_image(prompt, size=target_size)
+        image_path = await ticket.run(plugin.api_client.generate_image(
+            prompt, size=plan.size, model=model, steps=plan.steps
+        ))
         end_time = time.time()
         elapsed_time = end_time - start_time
-        plugin.debug_log(
-            f"[LLM工具] 图片生成成功: path={image_path},"
-            f"耗时={elapsed_time:.2f}秒"
-        )
+        record_completion(plugin, "draw", model, elapsed_time)
+        plugin.debug_log("[LLM工具] 图片生成成功: path=%s,耗时=%.2f秒", image_path, elapsed_time)
         # 将图片和耗时信息合并到一个消息中发送
-        await event.send(event.chain_result([
-            Image.fromFileSystem(image_path),  # type: ignore
-            Plain(f"图片生成完成，耗时：{elapsed_time:.2f}秒")
-        ]))
+        breakdown = format_phase_breakdown(plugin, root)
+        with trace_span("platform.send"):
+            await with_deadline("send", event.send(event.chain_result([
+                Image.fromFileSystem(image_path),  # type: ignore
+                Plain(f"图片生成完成，耗时：{elapsed_time:.2f}秒{plan.describe()}{breakdown}")
+            ])), ticket.deadline)
         return f"图片已生成并发送。耗时：{elapsed_time:.2f}秒。Prompt: {prompt}"
 
+    except asyncio.CancelledError:
+        if not ticket.cancelled:
+            raise
+        plugin.debug_log("[LLM工具] 任务已取消: user_id=%s", user_id)
+        return "用户已取消本次生图任务。"
     except Exception as e:
+        record_failure("draw", e)
         logger.error(f"生图失败: {e}", exc_info=True)
-        plugin.debug_log(f"[LLM工具] 图片生成失败: error={str(e)}")
+        plugin.debug_log("[LLM工具] 图片生成失败: error=%s", e)
         return f"生成图片时遇到问题: {str(e)}"
     finally:
+        root.end()
+        ticket.release()
         plugin.rate_limiter.remove_processing(request_id)
-        plugin.debug_log(f"[LLM工具] 处理完成: user_id={user_id}")
\ No newline at end of file
+        plugin.debug_log("[LLM工具] 处理完成: user_id=%s", user_id)
\ No newline at end of file
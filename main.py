@@ -3,24 +3,114 @@
 支持 /ai 命令调用，支持多种图片比例和多 Key 轮询。
 """
 
+import asyncio
+import os
+import time
+import uuid
 from typing import Any, AsyncGenerator
 
 from astrbot.api import logger
 from astrbot.api.event import AstrMessageEvent, filter as filter_cmd
-from astrbot.api.star import Context, Star
-from .commands import generate_image_command, list_models_command, help_command, switch_model_command, ai_edit_image_command, style_command
+from astrbot.api.star import Context, Star, StarTools
+from .commands import (
+    ai_edit_image_command,
+    cancel_command,
+    generate_image_command,
+    help_command,
+    list_models_command,
+    loop_report_command,
+    profile_command,
+    stats_command,
+    style_command,
+    switch_model_command,
+)
 from .core import (
+    CIRCUIT_OPEN_SECONDS,
     DEFAULT_BASE_URL,
+    DEFAULT_CIRCUIT_FAILURE_THRESHOLD,
+    DEFAULT_CIRCUIT_SLOW_CALL_SECONDS,
+    DEFAULT_DEBUG_SAMPLE_EVERY,
+    DEFAULT_DEGRADE_LATENCY,
+    DEFAULT_DEGRADE_QUEUE_DEPTH,
+    DEFAULT_DRAFT_PREVIEW,
+    DEFAULT_GLOBAL_RATE_LIMIT,
+    DEFAULT_GROUP_RATE_LIMIT,
+    DEFAULT_HEDGE_BUDGET,
+    DEFAULT_HEDGE_PERCENTILE,
+    DEFAULT_IMAGE_MEMORY_BUDGET_MB,
+    DEFAULT_LOOP_STALL_THRESHOLD_MS,
     DEFAULT_INFERENCE_STEPS,
+    DEFAULT_JOB_CONCURRENCY,
+    DEFAULT_JOB_QUEUE_MODE,
+    DEFAULT_JOB_QUEUE_PATH,
+    DEFAULT_JOB_QUEUE_WORKERS,
+    DEFAULT_LOAD_SHED_MODE,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_MAX_ESTIMATED_WAIT,
+    DEFAULT_MAX_JOBS_PER_USER,
+    DEFAULT_METRICS_EXPORT_INTERVAL,
+    DEFAULT_MIRROR_BASE_URLS,
     DEFAULT_MODEL,
+    DEFAULT_MODEL_PINS,
+    DEFAULT_MODEL_POOL,
     DEFAULT_NEGATIVE_PROMPT,
+    DEFAULT_PER_KEY_CONCURRENCY,
+    DEFAULT_SHARED_STATE_PATH,
+    DEFAULT_SHUTDOWN_GRACE_SECONDS,
     DEFAULT_SIZE,
+    DEFAULT_TRACE_IN_REPLY,
+    DEFAULT_TRACE_SAMPLE_RATE,
+    DEFAULT_TRAFFIC_RECORD,
+    DEFAULT_TRAFFIC_RECORD_PROMPTS,
+    DEFAULT_USER_RATE_LIMIT,
+    JOB_QUEUE_FILE,
+    LOOP_WATCHDOG_INTERVAL,
+    PLUGIN_NAME,
+    PROFILE_MAX_DURATION,
+    PROFILE_SAMPLE_INTERVAL,
+    PROFILE_TOP_N,
+    ROUTER_EXPLORE_RATE,
+    ROUTER_MIN_SAMPLES,
+    SHUTDOWN_CANCEL_TIMEOUT,
+    STYLE_RELOAD_CHECK_INTERVAL,
     SUPPORTED_RATIOS,
+    DebugLogger,
+    EndpointPool,
+    HedgePolicy,
+    JobDispatcher,
+    JobQueue,
+    JobScheduler,
+    JobTicket,
+    LoadShedder,
+    MemoryBudget,
+    LoopWatchdog,
+    MetricsExporter,
+    ModelRouter,
+    PluginProfiler,
+    QualityGovernor,
     RateLimiter,
+    SharedState,
+    StyleCatalog,
+    Tracer,
+    TrafficRecorder,
+    configure_debug_logging,
+    deps,
+    format_shutdown_summary,
     parse_api_keys,
+    parse_base_urls,
+    parse_command_costs,
+    parse_debug_levels,
+    parse_model_pins,
+    parse_model_pool,
     parse_prompt_and_size,
+    parse_rate_limit,
+    parse_request_deadlines,
+    registry,
+    write_shutdown_journal,
 )
+from .commands.style import STYLE_PROMPTS_FILE
 from .gitee import GiteeAIClient, ModelLister
+from .gitee.job_worker import JobWorkerPool
 from .llm_tools import draw_image_tool
 
 
@@ -40,7 +130,15 @@ class AIImage(Star):
         super().__init__(context)
         self.config = config
         self.debug_mode = config.get("debug_mode", False)
+        configure_debug_logging(
+            parse_debug_levels(config.get("debug_levels", "")),
+            config.get("debug_sample_every", DEFAULT_DEBUG_SAMPLE_EVERY),
+        )
+        self.debug_log = DebugLogger("AstrBot-GiteeAI", self.debug_mode)
         self.download_image_urls = config.get("download_image_urls", False)
+        self.draft_preview = config.get("draft_preview", DEFAULT_DRAFT_PREVIEW)
+        self.request_deadlines = parse_request_deadlines(config.get("request_deadlines", ""))
+        self.shutdown_grace = config.get("shutdown_grace_seconds", DEFAULT_SHUTDOWN_GRACE_SECONDS)
 
         self.debug_log("开始初始化插件")
 
@@ -51,14 +149,42 @@ class AIImage(Star):
         default_size = config.get("size", DEFAULT_SIZE)
         num_inference_steps = config.get("num_inference_steps", DEFAULT_INFERENCE_STEPS)
         negative_prompt = config.get("negative_prompt", DEFAULT_NEGATIVE_PROMPT)
+        mirror_base_urls = parse_base_urls(config.get("mirror_base_urls", DEFAULT_MIRROR_BASE_URLS))
+        image_memory_budget_mb = config.get(
+            "image_memory_budget_mb", DEFAULT_IMAGE_MEMORY_BUDGET_MB
+        )
+        user_pins, command_pins = parse_model_pins(config.get("model_pins", DEFAULT_MODEL_PINS))
 
         self.debug_log(
-            f"配置解析完成: model={model}, size={default_size}, "
-            f"api_keys_count={len(api_keys)}, debug_mode={self.debug_mode}, "
-            f"download_image_urls={self.download_image_urls}"
+            "配置解析完成: model=%s, size=%s, api_keys_count=%s, debug_mode=%s, download_image_urls=%s",
+            model, default_size, len(api_keys), self.debug_mode, self.download_image_urls,
         )
 
         # 初始化组件
+        shared_state_path = config.get("shared_state_path", DEFAULT_SHARED_STATE_PATH)
+        self.shared_state = None
+        if shared_state_path:
+            self.shared_state = SharedState(shared_state_path, debug_mode=self.debug_mode)
+        # 任务队列模式：上游调用交给工作进程执行，结果按实例标识取回
+        self.job_dispatcher = None
+        self.worker_pool = None
+        if config.get("job_queue_mode", DEFAULT_JOB_QUEUE_MODE):
+            job_queue_path = config.get("job_queue_path", DEFAULT_JOB_QUEUE_PATH) or str(
+                StarTools.get_data_dir(PLUGIN_NAME) / JOB_QUEUE_FILE
+            )
+            instance_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+            self.job_dispatcher = JobDispatcher(
+                JobQueue(job_queue_path, debug_mode=self.debug_mode),
+                instance_id,
+                debug_mode=self.debug_mode,
+            )
+            self.worker_pool = JobWorkerPool(
+                job_queue_path,
+                config,
+                workers=config.get("job_queue_workers", DEFAULT_JOB_QUEUE_WORKERS),
+                name=instance_id,
+                debug_mode=self.debug_mode,
+            )
         self.api_client = GiteeAIClient(
             api_keys=api_keys,
             model=model,
@@ -67,23 +193,158 @@ class AIImage(Star):
             negative_prompt=negative_prompt,
             base_url=base_url,
             debug_mode=self.debug_mode,
+            per_key_concurrency=config.get("per_key_concurrency", DEFAULT_PER_KEY_CONCURRENCY),
+            max_concurrency=config.get("max_concurrency", DEFAULT_MAX_CONCURRENCY),
+            recorder=TrafficRecorder(
+                enabled=config.get("traffic_record", DEFAULT_TRAFFIC_RECORD),
+                prompt_mode=config.get("traffic_record_prompts", DEFAULT_TRAFFIC_RECORD_PROMPTS),
+                debug_mode=self.debug_mode,
+            ),
+            router=ModelRouter(
+                pool=parse_model_pool(config.get("model_pool", DEFAULT_MODEL_POOL)),
+                user_pins=user_pins,
+                command_pins=command_pins,
+                explore_rate=ROUTER_EXPLORE_RATE,
+                min_samples=ROUTER_MIN_SAMPLES,
+                debug_mode=self.debug_mode,
+            ),
+            quality=QualityGovernor(
+                default_size,
+                num_inference_steps,
+                queue_threshold=config.get("degrade_queue_depth", DEFAULT_DEGRADE_QUEUE_DEPTH),
+                latency_threshold=config.get("degrade_latency", DEFAULT_DEGRADE_LATENCY),
+                debug_mode=self.debug_mode,
+            ),
+            hedge=HedgePolicy(
+                percentile=config.get("hedge_percentile", DEFAULT_HEDGE_PERCENTILE),
+                budget=config.get("hedge_budget", DEFAULT_HEDGE_BUDGET),
+                debug_mode=self.debug_mode,
+            ),
+            endpoints=EndpointPool(
+                [base_url] + mirror_base_urls,
+                failure_threshold=config.get(
+                    "circuit_failure_threshold", DEFAULT_CIRCUIT_FAILURE_THRESHOLD
+                ),
+                slow_call_seconds=config.get(
+                    "circuit_slow_call_seconds", DEFAULT_CIRCUIT_SLOW_CALL_SECONDS
+                ),
+                open_seconds=CIRCUIT_OPEN_SECONDS,
+                debug_mode=self.debug_mode,
+            ),
+            memory=MemoryBudget(
+                limit_bytes=int(image_memory_budget_mb * 1024 * 1024),
+                debug_mode=self.debug_mode,
+            ),
+            shared=self.shared_state,
+            jobs=self.job_dispatcher,
+        )
+        self.rate_limiter = RateLimiter(
+            debug_mode=self.debug_mode,
+            user_limit=parse_rate_limit(config.get("user_rate_limit", DEFAULT_USER_RATE_LIMIT)),
+            group_limit=parse_rate_limit(config.get("group_rate_limit", DEFAULT_GROUP_RATE_LIMIT)),
+            global_limit=parse_rate_limit(config.get("global_rate_limit", DEFAULT_GLOBAL_RATE_LIMIT)),
+            command_costs=parse_command_costs(config.get("command_costs", "")),
+            shared=self.shared_state,
+        )
+        self.scheduler = JobScheduler(
+            debug_mode=self.debug_mode,
+            max_concurrency=config.get("job_concurrency", DEFAULT_JOB_CONCURRENCY),
+            max_jobs_per_user=config.get("max_jobs_per_user", DEFAULT_MAX_JOBS_PER_USER),
+        )
+        # 已发送预览图、正在生成完整画质的任务，用户发送新的提示词时取消
+        self.pending_refines: dict[str, JobTicket] = {}
+        self.load_shedder = LoadShedder(
+            debug_mode=self.debug_mode,
+            max_wait_seconds=config.get("max_estimated_wait", DEFAULT_MAX_ESTIMATED_WAIT),
+            mode=config.get("load_shed_mode", DEFAULT_LOAD_SHED_MODE),
+        )
+        self.style_catalog = StyleCatalog(
+            STYLE_PROMPTS_FILE,
+            check_interval=STYLE_RELOAD_CHECK_INTERVAL,
+            debug_mode=self.debug_mode,
         )
-        self.rate_limiter = RateLimiter(debug_mode=self.debug_mode)
         self.model_lister = ModelLister(
             api_client=self.api_client,
             debug_mode=self.debug_mode,
         )
+        self.metrics_exporter = MetricsExporter(
+            interval=config.get("metrics_export_interval", DEFAULT_METRICS_EXPORT_INTERVAL),
+            debug_mode=self.debug_mode,
+        )
+        self.tracer = Tracer(
+            sample_rate=float(config.get("trace_sample_rate", DEFAULT_TRACE_SAMPLE_RATE)),
+            debug_mode=self.debug_mode,
+        )
+        self.trace_in_reply = config.get("trace_in_reply", DEFAULT_TRACE_IN_REPLY)
+        self.loop_watchdog = LoopWatchdog(
+            threshold=config.get("loop_stall_threshold_ms", DEFAULT_LOOP_STALL_THRESHOLD_MS) / 1000,
+            interval=LOOP_WATCHDOG_INTERVAL,
+            debug_mode=self.debug_mode,
+        )
+        self.profiler = PluginProfiler(
+            sample_interval=PROFILE_SAMPLE_INTERVAL,
+            max_duration=PROFILE_MAX_DURATION,
+            top_n=PROFILE_TOP_N,
+            debug_mode=self.debug_mode,
+        )
+        self._register_metrics()
 
         self.debug_log("插件初始化完成")
 
-    def debug_log(self, message: str) -> None:
-        """输出 Debug 日志
+    async def initialize(self) -> None:
+        """插件加载完成后启动后台任务
+
+        在工作线程中预热第三方依赖（openai 等依赖的导入需要约 1 秒，延迟到首个请求时导入
+        会阻塞事件循环），并启动指标导出、事件循环看门狗和任务队列工作进程的监督任务。
+        """
+        self._preload_task = asyncio.create_task(asyncio.to_thread(deps.preload))
+        self.metrics_exporter.ensure_started()
+        self.loop_watchdog.ensure_started()
+        if self.worker_pool is not None:
+            self.worker_pool.start()
+
+    def _register_metrics(self) -> None:
+        """注册队列深度和并发占用等运行时仪表盘，导出时通过回调读取当前值"""
+        registry.gauge(
+            "queue_depth", "排队中的任务数", ("lane",),
+            callback=lambda: [((lane,), count) for lane, count in self.scheduler.snapshot()["queued"].items()],
+        )
+        registry.gauge(
+            "jobs_running", "执行中的任务数",
+            callback=lambda: [((), self.scheduler.running_count)],
+        )
+        registry.gauge(
+            "jobs_capacity", "同时执行的任务数上限",
+            callback=lambda: [((), self.scheduler.max_concurrency)],
+        )
+        registry.gauge(
+            "upstream_window", "上游并发窗口大小", ("scope",),
+            callback=lambda: self._admission_values("limit"),
+        )
+        registry.gauge(
+            "upstream_in_flight", "进行中的上游请求数", ("scope",),
+            callback=lambda: self._admission_values("in_flight"),
+        )
+        registry.gauge(
+            "upstream_waiting", "等待上游并发槽位的请求数",
+            callback=lambda: [((), self.api_client.admission.snapshot()["waiting"])],
+        )
+
+    def _admission_values(self, field: str) -> list[tuple[tuple[str, ...], float]]:
+        """读取全局和各 API Key 的并发窗口数据
 
         Args:
-            message: 日志消息
+            field: limit 或 in_flight
+
+        Returns:
+            (标签值, 数值) 列表
         """
-        if self.debug_mode:
-            logger.debug(f"[AstrBot-GiteeAI] {message}")
+        snapshot = self.api_client.admission.snapshot()
+        values = [(("global",), snapshot["global"][field])]
+        # 各 Key 窗口已按 GiteeAIClient._key_label 标识，与其他指标中的 key 标签一致
+        for label, window in snapshot["keys"].items():
+            values.append(((label,), window[field]))
+        return values
 
     @filter_cmd.command_group("ai-gitee")
     async def ai_gitee_group(self):
@@ -138,9 +399,10 @@ class AIImage(Star):
 
         切换当前使用的 AI 模型。
 
-        用法: /ai-gitee switch-model <模型名称>
+        用法: /ai-gitee switch-model <模型名称|auto>
         示例: /ai-gitee switch-model z-image-turbo
               /ai-gitee switch-model flux-schnell
+              /ai-gitee switch-model auto
 
         Args:
             event: 消息事件对象
@@ -281,11 +543,126 @@ class AIImage(Star):
         async for result in style_command(self, event, style_name, prompt):
             yield result
 
+    @ai_gitee_group.command("cancel")
+    async def cancel_command_wrapper(
+        self, event: "AstrMessageEvent", job_id: str = ""
+    ) -> AsyncGenerator[Any, None]:
+        """取消任务命令
+
+        取消当前用户排队中或执行中的任务，执行中的远程异步任务也会一并取消。
+
+        用法: /ai-gitee cancel [任务编号]
+        示例: /ai-gitee cancel        # 取消自己的所有任务
+              /ai-gitee cancel 12     # 只取消编号为 12 的任务
+
+        Args:
+            event: 消息事件对象
+            job_id: 任务编号（可选）
+
+        Yields:
+            取消结果
+        """
+        async for result in cancel_command(self, event, job_id):
+            yield result
+
+    @filter_cmd.permission_type(filter_cmd.PermissionType.ADMIN)
+    @ai_gitee_group.command("stats")
+    async def stats_command_wrapper(self, event: "AstrMessageEvent") -> AsyncGenerator[Any, None]:
+        """运行统计命令（仅管理员）
+
+        展示各命令和模型的耗时分布、错误统计、缓存命中率、队列深度和并发占用。
+        指标同时会定期写入插件数据目录下的 metrics.prom，供 node_exporter 采集。
+
+        用法: /ai-gitee stats
+
+        Args:
+            event: 消息事件对象
+
+        Yields:
+            统计信息
+        """
+        async for result in stats_command(self, event):
+            yield result
+
+    @filter_cmd.permission_type(filter_cmd.PermissionType.ADMIN)
+    @ai_gitee_group.command("lag")
+    async def loop_report_command_wrapper(
+        self, event: "AstrMessageEvent"
+    ) -> AsyncGenerator[Any, None]:
+        """事件循环卡顿报告命令（仅管理员）
+
+        展示事件循环心跳延迟、卡顿次数和按插件函数归因的阻塞调用栈。
+        需要在配置中设置 loop_stall_threshold_ms 启用看门狗。
+
+        用法: /ai-gitee lag
+
+        Args:
+            event: 消息事件对象
+
+        Yields:
+            卡顿报告
+        """
+        async for result in loop_report_command(self, event):
+            yield result
+
+    @filter_cmd.permission_type(filter_cmd.PermissionType.ADMIN)
+    @ai_gitee_group.command("profile")
+    async def profile_command_wrapper(
+        self,
+        event: "AstrMessageEvent",
+        action: str = "",
+        duration: str = "",
+    ) -> AsyncGenerator[Any, None]:
+        """性能剖析命令（仅管理员）
+
+        在线上流量下按时间窗口采样插件代码的 CPU 调用栈并比较 tracemalloc 内存快照，
+        结果（折叠调用栈和内存增长排行）写入插件数据目录下的 profiles 目录。
+
+        用法: /ai-gitee profile start [秒数]
+              /ai-gitee profile stop
+
+        Args:
+            event: 消息事件对象
+            action: start 或 stop
+            duration: 剖析时长（秒），默认 60 秒
+
+        Yields:
+            剖析状态或结果摘要
+        """
+        async for result in profile_command(self, event, action, duration):
+            yield result
+
     async def close(self) -> None:
         """清理插件资源
 
-        在插件卸载时调用，关闭所有客户端连接和释放资源。
+        在插件卸载时调用：停止接受新任务，在宽限期内等待执行中的任务完成，
+        取消并记录剩余任务，停止任务队列工作进程，
+        等待后台任务结束后再关闭所有客户端连接。
         """
         self.debug_log("开始清理插件资源")
+        start = time.monotonic()
+        drained, abandoned = await self.scheduler.drain(self.shutdown_grace)
+        journal = None
+        if abandoned:
+            try:
+                journal = await asyncio.to_thread(write_shutdown_journal, abandoned)
+            except OSError as e:
+                logger.warning(f"记录被取消的任务失败: {e}")
+        if self.job_dispatcher is not None:
+            # 排空后仍在等待的队列任务一并取消，工作进程把执行中的其他实例任务放回队列
+            await self.job_dispatcher.close()
+            await self.worker_pool.close(SHUTDOWN_CANCEL_TIMEOUT)
+        background = await self.api_client.drain_background_tasks(SHUTDOWN_CANCEL_TIMEOUT)
+
+        await self.profiler.close()
+        await self.loop_watchdog.close()
+        await self.metrics_exporter.close()
+        await self.tracer.close()
+        # 连接池最后关闭，确保任务和后台任务不会用到已关闭的连接
         await self.api_client.close()
+        if self.shared_state is not None:
+            await asyncio.to_thread(self.shared_state.close)
+        logger.info(format_shutdown_summary(
+            time.monotonic() - start, drained, abandoned, background, journal
+        ))
         self.debug_log("插件资源清理完成")
\ No newline at end of file